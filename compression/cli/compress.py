@@ -9,6 +9,8 @@ from transformers import AutoTokenizer
 from transformers.utils import logging
 
 from deltazip import AutoDeltaZipModelForCausalLM, BaseCompressionConfig
+from deltazip.modeling._hessian_cache import HessianCache, checkpoint_fingerprint
+from deltazip.modeling._streaming import SafetensorsIndex
 from deltazip.utils.generate import generate
 from cli.utils import generate_readme, upload_and_delete, update_chat_template
 
@@ -49,12 +51,14 @@ def main(args):
         args.target_model, 
         compress_config=compress_config,
         torch_dtype=torch.bfloat16,
+        streaming=args.streaming,
     )
     if args.seq_len <0:
         args.seq_len = get_max_sequence_length(target_model.config)
         print(f"[info] set sequence length to {args.seq_len}")
         
-    target_model = target_model.cuda()
+    if not args.streaming:
+        target_model = target_model.cuda()
     ignore_keywords = [
         'norm',
         'embed',
@@ -66,12 +70,16 @@ def main(args):
     target_model.requires_grad_(False)
     if args.base_model != "" and args.delta != "":
         print("[info] base model is defined, delta mode enabled")
-        base_model = AutoDeltaZipModelForCausalLM.from_pretrained(
-            args.base_model,
-            compress_config=compress_config,
-            torch_dtype=torch.float16,
-        )
-        base_model.requires_grad_(False)
+        if args.streaming:
+            # base weights are read from the checkpoint when they are subtracted
+            base_model = SafetensorsIndex(args.base_model)
+        else:
+            base_model = AutoDeltaZipModelForCausalLM.from_pretrained(
+                args.base_model,
+                compress_config=compress_config,
+                torch_dtype=torch.float16,
+            )
+            base_model.requires_grad_(False)
     torch.cuda.empty_cache()
 
     cal_ds = datasets.load_dataset(args.dataset, split=args.ds_split)
@@ -99,17 +107,43 @@ def main(args):
         
     cal_ds = cal_ds.map(preprocess)
     examples = cal_ds.map(tokenize, remove_columns=cal_ds.column_names)
+
+    hessian_cache = None
+    if args.hessian_cache_dir:
+        # everything the Hessians depend on, but not the compression config
+        delta_mode = args.base_model != "" and args.delta != ""
+        hessian_cache = HessianCache(
+            args.hessian_cache_dir,
+            key={
+                "target_model": args.target_model,
+                "target_checkpoint": checkpoint_fingerprint(args.target_model),
+                "base_model": args.base_model if delta_mode else "",
+                "base_checkpoint": (
+                    checkpoint_fingerprint(args.base_model) if delta_mode else ""
+                ),
+                "dataset": args.dataset,
+                "ds_split": args.ds_split,
+                "seq_len": args.seq_len,
+                "n_samples": args.n_samples,
+            },
+        )
     
     if args.base_model != "" and args.delta != "":
         target_model.lossy_compress(
             examples,
-            batch_size=1,
+            batch_size=args.batch_size,
             base_model=base_model,
+            checkpoint_dir=args.checkpoint_dir or None,
+            resume=args.resume,
+            hessian_cache=hessian_cache,
         )
     else:
         target_model.lossy_compress(
             examples,
-            batch_size=1,
+            batch_size=args.batch_size,
+            checkpoint_dir=args.checkpoint_dir or None,
+            resume=args.resume,
+            hessian_cache=hessian_cache,
         )
     # write to folder
     os.makedirs(args.outdir, exist_ok=True)
@@ -141,7 +175,7 @@ def main(args):
         
     compressed_modules = []
     if args.base_model != "" and args.delta != "":
-        for x in base_model.inside_layer_modules:
+        for x in target_model.inside_layer_modules:
             compressed_modules.extend(x)
         for name, param in target_model.named_parameters():
             if any([keyword in name for keyword in not_save_keywords]):
@@ -215,6 +249,12 @@ if __name__ == "__main__":
     parser.add_argument("--sparsity", type=float, default=0.5)
     parser.add_argument("--bits", type=int, default=4)
     parser.add_argument("--seq-len", type=int, default=2048)
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="How many calibration samples to run through a layer at once, samples of similar length are batched together.",
+    )
     parser.add_argument("--block-size", type=int, default=128)
     parser.add_argument("--prunen", type=int, default=0)
     parser.add_argument("--prunem", type=int, default=0)
@@ -233,5 +273,35 @@ if __name__ == "__main__":
     parser.add_argument("--test-generate", action="store_true", default=False)
     parser.add_argument("--upload", action="store_true", default=False)
     parser.add_argument("--org-id", type=str, default="deltazip")
+    parser.add_argument(
+        "--checkpoint-dir",
+        type=str,
+        default="",
+        help="Write a checkpoint to this directory after every compressed layer.",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        default=False,
+        help="Resume from the last finished layer in --checkpoint-dir.",
+    )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        default=False,
+        help="Read the weights of each layer from the checkpoints only when the layer is compressed, instead of loading the target and base models up front. Finished layers are kept in host memory, which grows to the size of the full model, unless --checkpoint-dir is set: then they are read back from the per-layer checkpoints when the model is saved.",
+    )
+    parser.add_argument(
+        "--hessian-cache-dir",
+        type=str,
+        default="",
+        help="Cache the per-layer Hessians of the calibration set in this directory, to reuse them across compression configs. Layers are then calibrated on the outputs of the uncompressed layers, all modules of a layer at once (true_sequential is off).",
+    )
     args = parser.parse_args()
+    if args.streaming and args.test_generate:
+        parser.error("--test-generate needs the full base model, it cannot be used with --streaming")
+    if args.resume and not args.checkpoint_dir:
+        parser.error("--resume requires --checkpoint-dir")
+    if args.hessian_cache_dir and args.checkpoint_dir:
+        parser.error("--hessian-cache-dir cannot be combined with --checkpoint-dir")
     main(args)
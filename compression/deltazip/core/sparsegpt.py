@@ -16,30 +16,44 @@ torch.backends.cudnn.allow_tf32 = False
 
 
 class SparseGPT:
-    def __init__(self, layer):
+    def __init__(self, layer, H=None, nsamples=0):
+        """`H` and `nsamples` continue from a Hessian accumulated before, e.g.
+        a cached one."""
         self.layer = layer
         self.dev = self.layer.weight.device
         self.rows = layer.weight.data.shape[0]
         self.columns = layer.weight.data.shape[1]
-        self.H = torch.zeros((self.columns, self.columns), device=self.dev)
-        self.nsamples = 0
+        if H is None:
+            self.H = torch.zeros((self.columns, self.columns), device=self.dev)
+        else:
+            assert H.shape == (self.columns, self.columns), "H does not match layer"
+            self.H = H.to(self.dev, torch.float32)
+        self.nsamples = nsamples
 
-    def add_batch(self, inp, out):
+    def add_batch(self, inp, out, mask=None):
+        """Accumulates the Hessian of a batch of sequences, `mask` (batch, seq)
+        marks the tokens to use, padding tokens are left out."""
         self.inp1 = inp
         self.out1 = out
         if len(inp.shape) == 2:
             inp = inp.unsqueeze(0)
         tmp = inp.shape[0]
         if isinstance(self.layer, nn.Linear):
-            if len(inp.shape) == 3:
+            if mask is not None:
+                inp = inp[mask.to(inp.device, torch.bool)]
+            elif len(inp.shape) == 3:
                 inp = inp.reshape((-1, inp.shape[-1]))
             inp = inp.t()
         self.H *= self.nsamples / (self.nsamples + tmp)
         self.nsamples += tmp
-        inp = math.sqrt(2 / self.nsamples) * inp.float()
-        self.H += inp.matmul(inp.t())
-        sparsity_H = calculate_sparsity(self.H)
-        if sparsity_H == 1:
+        # one GEMM for all tokens of the batch
+        inp = inp.float()
+        self.H.addmm_(inp, inp.t(), alpha=2 / self.nsamples)
+
+    def check_hessian(self):
+        """Checks the accumulated Hessian once all batches are in, instead of
+        synchronizing with the device after every batch."""
+        if self.nsamples == 0 or not torch.count_nonzero(self.H).item():
             raise ValueError("sparsity of H == 1, something is off, aborting")
 
     def fasterprune(
@@ -61,6 +75,7 @@ class SparseGPT:
             ), "base_weight shape should be the same as W"
             W -= base_weight
         before_sparsity = calculate_sparsity(W)
+        self.check_hessian()
         if hasattr(self, "quantizer"):
             if not self.quantizer.ready():
                 self.quantizer.find_params(W, weight=True)
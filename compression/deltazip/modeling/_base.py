@@ -20,6 +20,13 @@ from transformers.modeling_utils import no_init_weights
 from transformers.utils.generic import ContextManagers
 
 from ._const import *
+from ._checkpoint import LayerCheckpointer
+from ._hessian_cache import HessianCache
+from ._streaming import (
+    BaseWeightProvider,
+    SafetensorsIndex,
+    move_buffers_to_device,
+)
 from ._utils import (
     pack_model,
     get_module_by_name,
@@ -183,6 +190,9 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         self.compress_config = compress_config
         self.config = self.model.config
         self.is_delta = False
+        # set for models created with `streaming=True`, whose weights are read
+        # from the checkpoint one layer at a time
+        self.weight_index: Optional[SafetensorsIndex] = None
         
     @property
     def compressed(self):
@@ -236,12 +246,24 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         pad_token_id = self.config.pad_token_id
         if not pad_token_id:
             pad_token_id = self.config.eos_token_id
+        if batch_size > 1:
+            # bucket examples of similar length together to keep padding low,
+            # longest first so that running out of memory happens early
+            new_examples.sort(
+                key=lambda example: len(example["input_ids"][0]), reverse=True
+            )
         new_examples = [
             collate_data(new_examples[start: start + batch_size], pad_token_id)
             for start in range(0, len(new_examples), batch_size)
         ]
         for new_example in new_examples:
             del new_example["labels"]
+            attention_mask = new_example["attention_mask"]
+            if not attention_mask.all():
+                # examples are padded on the left, start positions after padding
+                new_example["position_ids"] = (
+                    attention_mask.cumsum(-1) - 1
+                ).clamp(min=0)
 
         return new_examples
 
@@ -267,14 +289,27 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         autotune_warmup_after_quantized: bool = False,
         cache_examples_on_gpu: bool = False,
         base_model=None,
+        checkpoint_dir: Optional[str] = None,
+        resume: bool = False,
+        hessian_cache: Optional[HessianCache] = None,
     ):
         assert self.compressed == False, "Model is already compressed."
+        if resume and checkpoint_dir is None:
+            raise ValueError("resume requires a checkpoint_dir")
+        if hessian_cache is not None and checkpoint_dir is not None:
+            raise ValueError(
+                "a hessian_cache continues where it stopped by itself, it cannot "
+                "be combined with a checkpoint_dir"
+            )
         logger.info(f"Compression Config: {self.compress_config}")
         device_map = self.hf_device_map
         if base_model is None:
             self.is_delta = False
+            base_weights = None
         else:
             self.is_delta = True
+            # the same precision as a base model loaded with from_pretrained
+            base_weights = BaseWeightProvider.of(base_model, dtype=torch.float16)
         if device_map:
             for name, device in device_map.items():
                 if device == "cpu":
@@ -289,6 +324,12 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         layer_outputs = []
 
         examples = self._prepare_examples_for_compression(examples, batch_size)
+        # tokens of every batch that go into the Hessians, None if unpadded
+        token_masks = [
+            None if example["attention_mask"].all() else example["attention_mask"]
+            for example in examples
+        ]
+        current_token_mask = [None]
 
         class LayerHijacker(nn.Module):
             """
@@ -336,12 +377,21 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         num_batches = len(examples)
         layers = get_module_by_name(self.model, self.layers_block_name)
 
+        streaming = self.weight_index is not None
+        streaming_dtype = self.model.dtype
         force_layer_back_to_cpu = False
         if get_device(layers[0]) == CPU:
             layers[0] = layers[0].to(CUDA_0)
             force_layer_back_to_cpu = True
 
         cur_layer_device = get_device(layers[0])
+        if streaming:
+            # layers stay on the meta device until they are compressed.
+            # Afterwards they are kept on cpu, or, with a checkpoint_dir, go
+            # back to meta and are read from their checkpoints at the end
+            cur_layer_device = CUDA_0
+            force_layer_back_to_cpu = True
+            move_buffers_to_device(self.model, cur_layer_device)
         ori_outside_layer_module_devices = {}
         for module_name in self.outside_layer_modules:
             module = get_module_by_name(self.model, module_name)
@@ -350,7 +400,11 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                 continue
 
             ori_outside_layer_module_devices[module_name] = get_device(module)
-            if module is not None:
+            if streaming:
+                self.weight_index.load_module(
+                    module, module_name, cur_layer_device, streaming_dtype
+                )
+            elif module is not None:
                 move_to_device(module, cur_layer_device)
 
         # get inputs for first layer
@@ -366,8 +420,9 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                 pass
 
         layers[0] = layers[0].module
-        move_to_device(
-            layers[0], CPU if force_layer_back_to_cpu else cur_layer_device)
+        if not streaming:
+            move_to_device(
+                layers[0], CPU if force_layer_back_to_cpu else cur_layer_device)
         for module_name in self.outside_layer_modules:
             module = get_module_by_name(self.model, module_name)
             if module is not None:
@@ -383,23 +438,94 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         inside_layer_modules = self.inside_layer_modules
         if not self.compress_config.true_sequential:
             inside_layer_modules = [sum(inside_layer_modules, [])]
+        num_cached_layers = 0
+        # the outputs of a layer for the next one are computed after it is
+        # compressed, unless the Hessians are cached
+        num_output_batches = num_batches
+        if hessian_cache is not None:
+            # calibrate all modules of a layer in one pass, on the outputs of
+            # the uncompressed layer before it, which are collected in the
+            # same pass
+            if self.compress_config.true_sequential:
+                logger.warning(
+                    "true_sequential is ignored with a hessian_cache: every "
+                    "layer is calibrated on the outputs of the uncompressed "
+                    "layer before it, so results differ from runs without "
+                    "the cache"
+                )
+            inside_layer_modules = [sum(inside_layer_modules, [])]
+            num_cached_layers = hessian_cache.num_cached_layers()
+            num_output_batches = 0
         self.compressors = {}
         compressed_ws = {}
-        for i in range(len(layers)):
+
+        checkpointer = None
+        first_layer = 0
+        if checkpoint_dir is not None:
+            checkpointer = LayerCheckpointer(
+                checkpoint_dir,
+                meta={
+                    "model": self.config._name_or_path,
+                    "base_model": None
+                    if base_weights is None
+                    else base_weights.name_or_path,
+                    "compress_config": self.compress_config.to_dict(),
+                    "num_layers": len(layers),
+                    "batch_size": batch_size,
+                    "num_batches": num_batches,
+                },
+            )
+            first_layer, resumed_inputs = checkpointer.start(resume)
+            if resumed_inputs is not None:
+                layer_inputs = [
+                    move_to_device(
+                        inp, cur_layer_device if cache_examples_on_gpu else CPU
+                    )
+                    for inp in resumed_inputs
+                ]
+            for i in range(first_layer):
+                self.compressors.update(checkpointer.load_compressors(i))
+
+        for i in range(first_layer, len(layers)):
             layer = layers[i]
             force_layer_back_to_cpu = False
 
+            if streaming:
+                self.weight_index.load_module(
+                    layer, f"{self.layers_block_name}.{i}", CUDA_0, streaming_dtype
+                )
+                force_layer_back_to_cpu = True
             if get_device(layer) == CPU:
                 move_to_device(layer, CUDA_0)
                 force_layer_back_to_cpu = True
             cur_layer_device = get_device(layer)
+            if base_weights is not None:
+                # read the base weights of the next layer while this one is
+                # compressed
+                base_weights.prefetch(
+                    [
+                        f"{self.layers_block_name}.{k}.{name}.weight"
+                        for k in range(i, min(i + 2, len(layers)))
+                        for name in sum(inside_layer_modules, [])
+                    ],
+                    cur_layer_device,
+                )
+            layer_cached = i < num_cached_layers
+            num_calibration_batches = 0 if layer_cached else num_batches
+            if layer_cached:
+                hessians = hessian_cache.load_layer(i)
+            elif i > 0 and i == num_cached_layers:
+                layer_inputs = hessian_cache.load_inputs(i)
 
             full = find_layers(layer)
             for names in inside_layer_modules:
                 subset = {n: full[n] for n in names}
                 sparsegpt = {}
                 for name in subset:
-                    sparsegpt[name] = SparseGPT(subset[name])
+                    if layer_cached:
+                        sparsegpt[name] = SparseGPT(subset[name], *hessians[name])
+                    else:
+                        sparsegpt[name] = SparseGPT(subset[name])
                     if self.compress_config.bits < 16:
                         sparsegpt[name].quantizer = Quantizer()
                         sparsegpt[name].quantizer.configure(
@@ -411,7 +537,9 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
 
                 def add_batch(name):
                     def tmp(_, inp, out):
-                        sparsegpt[name].add_batch(inp[0].data, out.data)
+                        sparsegpt[name].add_batch(
+                            inp[0].data, out.data, current_token_mask[0]
+                        )
 
                     return tmp
 
@@ -420,7 +548,8 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                     handles.append(
                         subset[name].register_forward_hook(add_batch(name)))
 
-                for j in range(num_batches):
+                for j in range(num_calibration_batches):
+                    current_token_mask[0] = token_masks[j]
                     layer_input = move_to_device(
                         layer_inputs[j], cur_layer_device)
                     
@@ -442,9 +571,25 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                             )
                         else:
                             additional_layer_inputs[k] = v
-                    layer(layer_input, **additional_layer_inputs)
+                    layer_output = layer(layer_input, **additional_layer_inputs)
+                    if hessian_cache is not None:
+                        layer_outputs.append(
+                            move_to_device(
+                                layer_output[0],
+                                cur_layer_device if cache_examples_on_gpu else CPU,
+                            )
+                        )
                 for h in handles:
                     h.remove()
+                if hessian_cache is not None and not layer_cached:
+                    hessian_cache.save_layer(
+                        i,
+                        {
+                            name: (sparsegpt[name].H, sparsegpt[name].nsamples)
+                            for name in subset
+                        },
+                        layer_outputs if i + 1 < len(layers) else [],
+                    )
 
                 # starting compression
                 for name in subset:
@@ -452,11 +597,10 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                         f"Compression {name} in layer {i+1}/{len(layers)} - sparsity: {self.compress_config.sparsity}, bits: {self.compress_config.bits}"
                     )
                     if base_model is not None:
-                        base_weight = base_model.model.state_dict()[
-                            f"{self.layers_block_name}.{i}.{name}.weight"
-                        ]
-                        base_weight = move_to_device(
-                            base_weight, cur_layer_device)
+                        base_weight = base_weights.get(
+                            f"{self.layers_block_name}.{i}.{name}.weight",
+                            cur_layer_device,
+                        )
                     scale, zero, g_idx, avg_loss, compressed_w = sparsegpt[
                         name
                     ].fasterprune(
@@ -499,7 +643,7 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                         if base_model is not None:
                             del base_weight
 
-            for j in range(num_batches):
+            for j in range(num_output_batches):
                 layer_input = move_to_device(layer_inputs[j], cur_layer_device)
                 layer_attention_mask = move_to_device(
                     attention_masks[j], cur_layer_device
@@ -524,15 +668,43 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                 )
                 layer_outputs.append(layer_output)
 
-            layers[i] = move_to_device(
-                layer, CPU if force_layer_back_to_cpu else cur_layer_device
-            )
+            if not (streaming and checkpointer is not None):
+                layers[i] = move_to_device(
+                    layer, CPU if force_layer_back_to_cpu else cur_layer_device
+                )
             del layer
             del sparsegpt
             del layer_inputs
             layer_inputs, layer_outputs = layer_outputs, []
+            if checkpointer is not None:
+                # flush the weights the modules end up with to disk: the
+                # compressed delta, or the compressed weight already in place
+                prefix = f"{self.layers_block_name}.{i}"
+                layer_ws = {
+                    f"{prefix}.{name}": compressed_ws.pop(
+                        f"{prefix}.{name}", module.weight.data
+                    )
+                    for name, module in find_layers(layers[i]).items()
+                    if name in sum(inside_layer_modules, [])
+                }
+                checkpointer.save(
+                    i,
+                    {
+                        k: v
+                        for k, v in self.compressors.items()
+                        if k.startswith(f"{prefix}.")
+                    },
+                    layer_ws,
+                    layer_inputs,
+                )
+                del layer_ws
+                if streaming:
+                    # host memory holds about one layer and the activations
+                    layers[i] = layers[i].to("meta")
             torch.cuda.empty_cache()
 
+        if base_weights is not None:
+            base_weights.close()
         self.use_triton = use_triton
         self.use_cuda_fp16 = use_cuda_fp16
         self.autotune_warmup_after_quantized = autotune_warmup_after_quantized
@@ -544,14 +716,16 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                 self.model, device_map, offload_buffers=True
             )
         logger.info("Compress finished... moving compressed delta back")
-        if base_model is not None:
+        if base_model is not None or checkpointer is not None:
             for i in range(len(layers)):
+                if checkpointer is not None:
+                    compressed_ws = checkpointer.load_weights(i)
                 # move compressed weights back
                 full = find_layers(layers[i])
                 for names in inside_layer_modules:
                     subset = {n: full[n] for n in names}
                     for name in subset:
-                        if self.compress_config.bits < 16:
+                        if f"{self.layers_block_name}.{i}.{name}" in compressed_ws:
                             finetuned_weight = subset[name].weight.data
                             delta_only = compressed_ws[
                                 f"{self.layers_block_name}.{i}.{name}"
@@ -573,6 +747,9 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
                                     f"{self.layers_block_name}.{i}.{name}"
                                 ])
 
+        if streaming:
+            # embeddings, norms and any layer left on meta by a resumed run
+            self.weight_index.load_missing(self.model, CPU, streaming_dtype)
         for name, param in self.model.named_parameters():
             print(f"{name}: {param.device}")
         self.model.config.use_cache = forward_pass_use_cache
@@ -685,9 +862,12 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         compress_config: BaseCompressionConfig,
         max_memory: Optional[dict] = None,
         device_map: Optional[str] = None,
+        streaming: bool = False,
         **model_init_kwargs,
     ):
-        """load un-quantized pretrained model to cpu"""
+        """load un-quantized pretrained model to cpu, or with `streaming`, create
+        it on the meta device and read its weights layer by layer during
+        compression"""
 
         if not torch.cuda.is_available():
             raise EnvironmentError(
@@ -710,6 +890,20 @@ class BaseDeltaZipModelForCausalLM(nn.Module, PushToHubMixin):
         model_init_kwargs["torch_dtype"] = torch.float16
         model_init_kwargs["trust_remote_code"] = True
 
+        if streaming:
+            with accelerate.init_empty_weights(include_buffers=False):
+                model = AutoModelForCausalLM.from_config(
+                    config,
+                    torch_dtype=model_init_kwargs["torch_dtype"],
+                    trust_remote_code=True,
+                )
+            model.eval()
+            deltazip_model = cls(model, False, compress_config)
+            deltazip_model.weight_index = SafetensorsIndex(
+                pretrained_model_name_or_path
+            )
+            return deltazip_model
+
         if max_memory:
             if "disk" in max_memory:
                 raise NotImplementedError("disk offload not support yet.")
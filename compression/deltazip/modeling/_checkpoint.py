@@ -0,0 +1,115 @@
+import json
+import os
+from os.path import isfile, join
+from typing import Dict, List, Optional, Tuple
+
+import torch
+from loguru import logger
+
+from ..core.quant import Quantizer
+from ._const import CPU
+
+META_FILE = "meta.json"
+INPUTS_FILE = "inputs.pt"
+
+
+def _atomic_save(obj, path: str):
+    # a crash while writing must not leave a truncated checkpoint behind
+    tmp_path = path + ".tmp"
+    torch.save(obj, tmp_path)
+    os.replace(tmp_path, path)
+
+
+class LayerCheckpointer:
+    """Per-layer checkpoints of `lossy_compress`.
+
+    Every finished layer writes the quantizer parameters and compressed weights
+    of its modules to `layer_{i}.pt`, and the inputs of the next layer replace
+    `inputs.pt`. A resumed run with the same `meta` starts after the last layer
+    whose outputs were written. Compressed weights stay on disk until the end
+    of the run, instead of being held in host memory for every layer.
+    """
+
+    def __init__(self, checkpoint_dir: str, meta: dict):
+        self.checkpoint_dir = checkpoint_dir
+        self.meta = meta
+        os.makedirs(checkpoint_dir, exist_ok=True)
+
+    def _layer_path(self, layer_idx: int) -> str:
+        return join(self.checkpoint_dir, f"layer_{layer_idx}.pt")
+
+    def start(self, resume: bool) -> Tuple[int, Optional[List[torch.Tensor]]]:
+        """Returns the index of the first layer to compress and its inputs,
+        which are None when compression starts from the first layer."""
+        meta_path = join(self.checkpoint_dir, META_FILE)
+        inputs_path = join(self.checkpoint_dir, INPUTS_FILE)
+        if not resume or not isfile(meta_path):
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+            if isfile(inputs_path):
+                os.remove(inputs_path)
+            return 0, None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta != self.meta:
+            raise ValueError(
+                f"checkpoints in {self.checkpoint_dir} were written with {meta}, "
+                f"cannot resume with {self.meta}"
+            )
+        if not isfile(inputs_path):
+            return 0, None
+        inputs = torch.load(inputs_path, map_location=CPU)
+        logger.info(
+            f"Resuming compression at layer {inputs['next_layer']} from {self.checkpoint_dir}"
+        )
+        return inputs["next_layer"], inputs["layer_inputs"]
+
+    def save(
+        self,
+        layer_idx: int,
+        compressors: Dict[str, tuple],
+        compressed_ws: Dict[str, torch.Tensor],
+        next_layer_inputs: List[torch.Tensor],
+    ):
+        _atomic_save(
+            {
+                "compressors": {
+                    name: {
+                        "quantizer": {
+                            k: v.to(CPU) for k, v in quantizer.state_dict().items()
+                        },
+                        "scale": scale.to(CPU),
+                        "zero": zero.to(CPU),
+                        "g_idx": g_idx.to(CPU),
+                    }
+                    for name, (quantizer, scale, zero, g_idx) in compressors.items()
+                },
+                "weights": {name: w.to(CPU) for name, w in compressed_ws.items()},
+            },
+            self._layer_path(layer_idx),
+        )
+        _atomic_save(
+            {
+                "next_layer": layer_idx + 1,
+                "layer_inputs": [inp.to(CPU) for inp in next_layer_inputs],
+            },
+            join(self.checkpoint_dir, INPUTS_FILE),
+        )
+
+    def load_compressors(self, layer_idx: int) -> Dict[str, tuple]:
+        compressors = {}
+        checkpoint = torch.load(self._layer_path(layer_idx), map_location=CPU)
+        for name, params in checkpoint["compressors"].items():
+            quantizer = Quantizer()
+            for k, v in params["quantizer"].items():
+                setattr(quantizer, k, v)
+            compressors[name] = (
+                quantizer,
+                params["scale"],
+                params["zero"],
+                params["g_idx"],
+            )
+        return compressors
+
+    def load_weights(self, layer_idx: int) -> Dict[str, torch.Tensor]:
+        return torch.load(self._layer_path(layer_idx), map_location=CPU)["weights"]
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from glob import glob
+from os.path import basename, isdir, isfile, join
+from typing import Dict, List, Tuple
+
+import torch
+from loguru import logger
+
+from ._checkpoint import _atomic_save
+from ._const import CPU
+
+KEY_FILE = "key.json"
+# files that identify the weights of a local checkpoint
+CHECKPOINT_PATTERNS = ["*.safetensors", "*.bin", "*.index.json", "config.json"]
+
+
+def checkpoint_fingerprint(model_name_or_path: str) -> str:
+    """Identifies the contents of a checkpoint, so that a cache keyed by it is
+    not reused once the checkpoint is retrained or replaced.
+
+    A local checkpoint is identified by the names, sizes and modification
+    times of its weight files, a hub checkpoint by the commit of its snapshot.
+    """
+    if not isdir(model_name_or_path):
+        from huggingface_hub import snapshot_download
+
+        # snapshots are stored in a directory named after the commit
+        snapshot = snapshot_download(model_name_or_path, allow_patterns=["*.json"])
+        return basename(snapshot)
+    files = sorted(
+        {
+            path
+            for pattern in CHECKPOINT_PATTERNS
+            for path in glob(join(model_name_or_path, pattern))
+        }
+    )
+    if not files:
+        raise FileNotFoundError(f"no weights in {model_name_or_path}")
+    stats = [
+        (basename(path), os.stat(path).st_size, os.stat(path).st_mtime_ns)
+        for path in files
+    ]
+    return hashlib.sha256(json.dumps(stats).encode("utf-8")).hexdigest()[:16]
+
+
+class HessianCache:
+    """Per-layer Hessians of a calibration set, shared by compression runs.
+
+    Entries live in a directory named after the hash of `key`, which holds
+    everything the Hessians depend on: the contents of the target and base
+    model (see `checkpoint_fingerprint`) and the calibration data. The
+    batching is not part of the key, padding tokens are left out of the
+    Hessians. Neither is the compression config: with a cache, every layer is
+    calibrated on the outputs of the uncompressed layer before it, so that the
+    Hessians are the same at every (bits, sparsity, ...) point of a sweep. The
+    first run fills the cache with a single forward pass per layer, later runs
+    only prune and quantize.
+
+    Besides the Hessians of every finished layer, the inputs of the next layer
+    are kept, so that a run interrupted while filling the cache continues
+    where it stopped.
+    """
+
+    def __init__(self, cache_dir: str, key: dict):
+        self.key = key
+        digest = hashlib.sha256(
+            json.dumps(key, sort_keys=True).encode("utf-8")
+        ).hexdigest()[:16]
+        self.cache_dir = join(cache_dir, digest)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        key_path = join(self.cache_dir, KEY_FILE)
+        if not isfile(key_path):
+            with open(key_path, "w", encoding="utf-8") as f:
+                json.dump(key, f, indent=2)
+
+    def _layer_path(self, layer_idx: int) -> str:
+        return join(self.cache_dir, f"layer_{layer_idx}.pt")
+
+    def _inputs_path(self, layer_idx: int) -> str:
+        return join(self.cache_dir, f"inputs_{layer_idx}.pt")
+
+    def num_cached_layers(self) -> int:
+        """Number of consecutive layers, from the first, with cached Hessians."""
+        num_layers = 0
+        while isfile(self._layer_path(num_layers)):
+            num_layers += 1
+        if num_layers:
+            logger.info(
+                f"Found Hessians of {num_layers} layers in {self.cache_dir}"
+            )
+        return num_layers
+
+    def load_layer(self, layer_idx: int) -> Dict[str, Tuple[torch.Tensor, int]]:
+        """Returns the Hessian and number of samples of every module."""
+        hessians = torch.load(self._layer_path(layer_idx), map_location=CPU)
+        return {name: (h["H"], h["nsamples"]) for name, h in hessians.items()}
+
+    def save_layer(
+        self,
+        layer_idx: int,
+        hessians: Dict[str, Tuple[torch.Tensor, int]],
+        next_layer_inputs: List[torch.Tensor],
+    ):
+        # the inputs of the first uncached layer are always on disk: the new
+        # inputs are written before the layer, the old ones removed after it
+        _atomic_save(
+            [inp.to(CPU) for inp in next_layer_inputs],
+            self._inputs_path(layer_idx + 1),
+        )
+        _atomic_save(
+            {
+                name: {"H": H.to(CPU), "nsamples": nsamples}
+                for name, (H, nsamples) in hessians.items()
+            },
+            self._layer_path(layer_idx),
+        )
+        if isfile(self._inputs_path(layer_idx)):
+            os.remove(self._inputs_path(layer_idx))
+
+    def load_inputs(self, layer_idx: int) -> List[torch.Tensor]:
+        return torch.load(self._inputs_path(layer_idx), map_location=CPU)
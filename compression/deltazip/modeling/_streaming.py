@@ -0,0 +1,171 @@
+import json
+from concurrent.futures import Future, ThreadPoolExecutor
+from glob import glob
+from os.path import isdir, isfile, join
+from typing import Dict, List, Optional, Union
+
+import torch
+import torch.nn as nn
+from loguru import logger
+from safetensors import safe_open
+
+INDEX_FILE = "model.safetensors.index.json"
+
+
+class SafetensorsIndex:
+    """Tensors of a safetensors checkpoint, read by name on demand.
+
+    The shards are memory-mapped, so reading the weights of one layer only
+    touches the pages of that layer, and nothing else of the checkpoint is
+    loaded into memory.
+    """
+
+    def __init__(self, model_name_or_path: str):
+        self.name_or_path = model_name_or_path
+        if isdir(model_name_or_path):
+            model_dir = model_name_or_path
+        else:
+            from huggingface_hub import snapshot_download
+
+            model_dir = snapshot_download(
+                model_name_or_path, allow_patterns=["*.safetensors", "*.json"]
+            )
+        if isfile(join(model_dir, INDEX_FILE)):
+            with open(join(model_dir, INDEX_FILE), "r", encoding="utf-8") as f:
+                weight_map = json.load(f)["weight_map"]
+            self.weight_map = {
+                name: join(model_dir, shard) for name, shard in weight_map.items()
+            }
+        else:
+            self.weight_map = {}
+            for shard in sorted(glob(join(model_dir, "*.safetensors"))):
+                with safe_open(shard, framework="pt") as f:
+                    self.weight_map.update({name: shard for name in f.keys()})
+        if not self.weight_map:
+            raise FileNotFoundError(f"no safetensors weights in {model_dir}")
+        self._handles = {}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.weight_map
+
+    def get_tensor(self, name: str) -> torch.Tensor:
+        shard = self.weight_map[name]
+        if shard not in self._handles:
+            self._handles[shard] = safe_open(shard, framework="pt")
+        return self._handles[shard].get_tensor(name)
+
+    def load_module(
+        self,
+        module: nn.Module,
+        prefix: str,
+        device: Union[str, torch.device],
+        dtype: Optional[torch.dtype] = None,
+        only_missing: bool = False,
+    ) -> int:
+        """Reads the parameters and persistent buffers of `module`, named
+        `prefix` in the checkpoint, to `device`. Returns the number of tensors
+        read."""
+        loaded = 0
+        tensors: Dict[str, torch.Tensor] = dict(module.named_parameters())
+        tensors.update(module.named_buffers())
+        for name, current in tensors.items():
+            key = f"{prefix}.{name}" if prefix else name
+            if key not in self or (only_missing and not current.is_meta):
+                continue
+            tensor = self.get_tensor(key)
+            if dtype is not None and tensor.is_floating_point():
+                tensor = tensor.to(dtype)
+            _set_tensor(module, name, tensor.to(device))
+            loaded += 1
+        return loaded
+
+    def load_missing(
+        self,
+        model: nn.Module,
+        device: Union[str, torch.device],
+        dtype: Optional[torch.dtype] = None,
+    ):
+        """Reads every tensor of `model` that is still on the meta device."""
+        loaded = self.load_module(model, "", device, dtype, only_missing=True)
+        if hasattr(model, "tie_weights"):
+            model.tie_weights()
+        logger.info(f"Loaded {loaded} remaining tensors from {self.name_or_path}")
+
+
+def _set_tensor(module: nn.Module, name: str, tensor: torch.Tensor):
+    owner_name, _, attr = name.rpartition(".")
+    owner = module.get_submodule(owner_name)
+    if attr in owner._parameters:
+        owner._parameters[attr] = nn.Parameter(tensor, requires_grad=False)
+    else:
+        owner._buffers[attr] = tensor
+
+
+
+def move_buffers_to_device(model: nn.Module, device: Union[str, torch.device]):
+    """Moves the buffers that were created with the empty model, such as
+    rotary embedding frequencies, which are not part of the checkpoint."""
+    for module in model.modules():
+        for name, buffer in module._buffers.items():
+            if buffer is not None and not buffer.is_meta:
+                module._buffers[name] = buffer.to(device)
+
+
+class BaseWeightProvider:
+    """Base weights to subtract from the target, by name.
+
+    The tensors are indexed once, from the safetensors shards of the base
+    checkpoint or from the state dict of a loaded base model, and are read and
+    moved to the device on a background thread. `prefetch` starts reading the
+    weights of the next layer while the current one is compressed. Floating
+    point weights are cast to `dtype` if given.
+    """
+
+    def __init__(self, base_model, dtype: Optional[torch.dtype] = None):
+        if isinstance(base_model, SafetensorsIndex):
+            self.name_or_path = base_model.name_or_path
+            self._read = base_model.get_tensor
+        else:
+            self.name_or_path = base_model.config._name_or_path
+            # the state dict is built once, not once per module
+            state_dict = base_model.model.state_dict()
+            self._read = state_dict.__getitem__
+        self.dtype = dtype
+        # a single thread reads all tensors, the shards are never read
+        # concurrently
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending: Dict[str, Future] = {}
+
+    @classmethod
+    def of(
+        cls, base_model, dtype: Optional[torch.dtype] = None
+    ) -> "BaseWeightProvider":
+        if isinstance(base_model, cls):
+            return base_model
+        return cls(base_model, dtype)
+
+    def _load(self, name: str, device: Union[str, torch.device]) -> torch.Tensor:
+        tensor = self._read(name)
+        if self.dtype is not None and tensor.is_floating_point():
+            return tensor.to(device, self.dtype, copy=True)
+        return tensor.to(device, copy=True)
+
+    def prefetch(self, names: List[str], device: Union[str, torch.device]):
+        for name in names:
+            if name not in self._pending:
+                self._pending[name] = self._executor.submit(self._load, name, device)
+
+    def get(self, name: str, device: Union[str, torch.device]) -> torch.Tensor:
+        future = self._pending.pop(name, None)
+        if future is None:
+            future = self._executor.submit(self._load, name, device)
+        tensor = future.result()
+        if tensor.device != torch.device(device):
+            tensor = tensor.to(device)
+        return tensor
+
+    def close(self):
+        for future in self._pending.values():
+            future.cancel()
+        self._pending = {}
+        self._executor.shutdown(wait=True)
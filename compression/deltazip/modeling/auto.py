@@ -29,6 +29,7 @@ class AutoDeltaZipModelForCausalLM:
         compress_config: BaseCompressionConfig,
         max_memory: Optional[dict] = None,
         device_map: Optional[str] = None,
+        streaming: bool = False,
         **model_init_kwargs
     ) -> BaseDeltaZipModelForCausalLM:
         model_type = check_and_get_model_type(pretrained_model_name_or_path)
@@ -37,6 +38,7 @@ class AutoDeltaZipModelForCausalLM:
             compress_config=compress_config,
             max_memory=max_memory,
             device_map=device_map,
+            streaming=streaming,
             **model_init_kwargs
         )
 
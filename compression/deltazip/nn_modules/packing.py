@@ -0,0 +1,68 @@
+"""Vectorized packing of quantized weights into int32 words.
+
+`pack_rows` packs along the first axis, in the layout `QuantLinear.unpack`
+reads back: `32 // bits` values per word for 2, 4 and 8 bits, and 32 values
+per 3 words for 3 bits, where the values that straddle two words are split
+across them.
+"""
+import numpy as np
+import torch
+
+SUPPORTED_BITS = [2, 3, 4, 8]
+
+
+def _or_shifted(values: np.ndarray, shifts: np.ndarray) -> np.ndarray:
+    """ORs `values[:, i] << shifts[i]` over i."""
+    return np.bitwise_or.reduce(values << shifts[None, :, None], axis=1)
+
+
+def pack_rows(values: np.ndarray, bits: int) -> np.ndarray:
+    """Packs the rows of `values` (rows, cols) into int32 words of shape
+    (rows // 32 * bits, cols). Trailing rows that do not fill 32 values are
+    dropped."""
+    if bits not in SUPPORTED_BITS:
+        raise NotImplementedError("Only 2,3,4,8 bits are supported.")
+    values = values.astype(np.uint32, copy=False)
+    num_rows = values.shape[0] // 32 * 32
+    cols = values.shape[1]
+    if bits == 3:
+        values = values[:num_rows].reshape(num_rows // 32, 32, cols)
+        shifts = 3 * np.arange(10, dtype=np.uint32)
+        packed = np.empty((num_rows // 32, 3, cols), dtype=np.uint32)
+        packed[:, 0] = _or_shifted(values[:, 0:10], shifts) | (values[:, 10] << 30)
+        packed[:, 1] = (
+            ((values[:, 10] >> 2) & 1)
+            | _or_shifted(values[:, 11:21], shifts + 1)
+            | (values[:, 21] << 31)
+        )
+        packed[:, 2] = ((values[:, 21] >> 1) & 0x3) | _or_shifted(
+            values[:, 22:32], shifts + 2
+        )
+        packed = packed.reshape(num_rows // 32 * 3, cols)
+    else:
+        per_word = 32 // bits
+        values = values[:num_rows].reshape(num_rows // per_word, per_word, cols)
+        packed = _or_shifted(values, bits * np.arange(per_word, dtype=np.uint32))
+    return packed.astype(np.int32)
+
+
+def pack_cols(values: np.ndarray, bits: int) -> np.ndarray:
+    """Packs the columns of `values` (rows, cols) into int32 words of shape
+    (rows, cols // 32 * bits)."""
+    return np.ascontiguousarray(pack_rows(values.T, bits).T)
+
+
+def quantize_weight(
+    weight: torch.Tensor,
+    scales: torch.Tensor,
+    scale_zeros: torch.Tensor,
+    g_idx: torch.Tensor,
+) -> torch.Tensor:
+    """Integer weights (infeatures, outfeatures) of `weight` (outfeatures,
+    infeatures), with per-group `scales` and `scale_zeros` of shape (groups,
+    outfeatures) selected by `g_idx`."""
+    g_idx = g_idx.long()
+    intweight = torch.round(
+        (weight + scale_zeros[g_idx].t()) / scales[g_idx].t()
+    ).to(torch.int)
+    return intweight.t().contiguous()
@@ -0,0 +1,58 @@
+import pytest
+import torch
+
+from deltazip.core.quant import Quantizer
+from deltazip.modeling._checkpoint import LayerCheckpointer
+
+META = {"model": "target", "num_layers": 2}
+
+
+def compressors(prefix):
+    quantizer = Quantizer()
+    quantizer.configure(4, perchannel=True)
+    quantizer.find_params(torch.randn(8, 4), weight=True)
+    return {
+        f"{prefix}.q_proj": (
+            quantizer,
+            quantizer.scale,
+            quantizer.zero,
+            torch.zeros(4, dtype=torch.int32),
+        )
+    }
+
+
+def test_resume_after_last_finished_layer(tmp_path):
+    checkpointer = LayerCheckpointer(str(tmp_path), META)
+    assert checkpointer.start(resume=True) == (0, None)
+
+    layer_compressors = compressors("layers.0")
+    weights = {"layers.0.q_proj": torch.randn(8, 4)}
+    inputs = [torch.randn(1, 3, 4), torch.randn(1, 5, 4)]
+    checkpointer.save(0, layer_compressors, weights, inputs)
+
+    resumed = LayerCheckpointer(str(tmp_path), META)
+    first_layer, resumed_inputs = resumed.start(resume=True)
+    assert first_layer == 1
+    assert all(torch.equal(a, b) for a, b in zip(resumed_inputs, inputs))
+    assert torch.equal(
+        resumed.load_weights(0)["layers.0.q_proj"], weights["layers.0.q_proj"]
+    )
+
+    quantizer, scale, zero, g_idx = resumed.load_compressors(0)["layers.0.q_proj"]
+    expected = layer_compressors["layers.0.q_proj"]
+    assert torch.equal(quantizer.scale, expected[0].scale)
+    assert torch.equal(quantizer.maxq, expected[0].maxq)
+    assert torch.equal(scale, expected[1]) and torch.equal(g_idx, expected[3])
+
+
+def test_start_without_resume_discards_inputs(tmp_path):
+    checkpointer = LayerCheckpointer(str(tmp_path), META)
+    checkpointer.start(resume=False)
+    checkpointer.save(0, {}, {}, [torch.zeros(1)])
+    assert checkpointer.start(resume=False) == (0, None)
+
+
+def test_resume_with_other_meta(tmp_path):
+    LayerCheckpointer(str(tmp_path), META).start(resume=False)
+    with pytest.raises(ValueError):
+        LayerCheckpointer(str(tmp_path), {**META, "num_layers": 3}).start(resume=True)
@@ -0,0 +1,62 @@
+import os
+
+import torch
+import torch.nn as nn
+
+from deltazip.core.sparsegpt import SparseGPT
+from deltazip.modeling._hessian_cache import HessianCache, checkpoint_fingerprint
+
+KEY = {"target_model": "target", "dataset": "data", "n_samples": 2}
+
+
+def test_cache_is_keyed(tmp_path):
+    cache = HessianCache(str(tmp_path), KEY)
+    reordered = HessianCache(str(tmp_path), dict(reversed(KEY.items())))
+    assert reordered.cache_dir == cache.cache_dir
+    other = HessianCache(str(tmp_path), {**KEY, "n_samples": 4})
+    assert other.cache_dir != cache.cache_dir
+
+
+def test_fingerprint_follows_checkpoint_contents(tmp_path):
+    weights = tmp_path / "model.safetensors"
+    weights.write_bytes(b"weights")
+    fingerprint = checkpoint_fingerprint(str(tmp_path))
+    assert checkpoint_fingerprint(str(tmp_path)) == fingerprint
+    # a retrained checkpoint at the same path gets a new cache entry
+    weights.write_bytes(b"retrained weights")
+    assert checkpoint_fingerprint(str(tmp_path)) != fingerprint
+
+
+def test_layers_and_inputs(tmp_path):
+    cache = HessianCache(str(tmp_path), KEY)
+    assert cache.num_cached_layers() == 0
+
+    hessians = {"mlp.up_proj": (torch.eye(4), 2)}
+    inputs = [torch.randn(1, 3, 4)]
+    cache.save_layer(0, hessians, inputs)
+    cache.save_layer(1, hessians, [torch.randn(1, 3, 4)])
+
+    cache = HessianCache(str(tmp_path), KEY)
+    assert cache.num_cached_layers() == 2
+    H, nsamples = cache.load_layer(0)["mlp.up_proj"]
+    assert torch.equal(H, torch.eye(4)) and nsamples == 2
+    # only the inputs of the first layer without Hessians are kept
+    assert cache.load_inputs(2)[0].shape == (1, 3, 4)
+    assert not os.path.exists(os.path.join(cache.cache_dir, "inputs_1.pt"))
+
+
+def test_sparsegpt_continues_from_cached_hessian():
+    torch.manual_seed(0)
+    layer = nn.Linear(4, 4, bias=False)
+    first, second = torch.randn(1, 3, 4), torch.randn(1, 5, 4)
+
+    expected = SparseGPT(layer)
+    expected.add_batch(first, None)
+    expected.add_batch(second, None)
+
+    cached = SparseGPT(layer)
+    cached.add_batch(first, None)
+    resumed = SparseGPT(layer, cached.H.clone(), cached.nsamples)
+    resumed.add_batch(second, None)
+    assert resumed.nsamples == expected.nsamples
+    torch.testing.assert_close(resumed.H, expected.H)
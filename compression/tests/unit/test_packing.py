@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+import torch
+import torch.nn as nn
+
+from deltazip.nn_modules.packing import pack_cols, pack_rows, quantize_weight
+from deltazip.nn_modules.qlinear import QuantLinear
+
+
+def pack_rows_loop(intweight, bits):
+    """The per-row packing loop `QuantLinear.pack` used to run."""
+    i = 0
+    row = 0
+    qweight = np.zeros(
+        (intweight.shape[0] // 32 * bits, intweight.shape[1]), dtype=np.uint32
+    )
+    while row < qweight.shape[0]:
+        if bits in [2, 4, 8]:
+            for j in range(i, i + (32 // bits)):
+                qweight[row] |= intweight[j] << (bits * (j - i))
+            i += 32 // bits
+            row += 1
+        else:
+            for j in range(i, i + 10):
+                qweight[row] |= intweight[j] << (3 * (j - i))
+            i += 10
+            qweight[row] |= intweight[i] << 30
+            row += 1
+            qweight[row] |= (intweight[i] >> 2) & 1
+            i += 1
+            for j in range(i, i + 10):
+                qweight[row] |= intweight[j] << (3 * (j - i) + 1)
+            i += 10
+            qweight[row] |= intweight[i] << 31
+            row += 1
+            qweight[row] |= (intweight[i] >> 1) & 0x3
+            i += 1
+            for j in range(i, i + 10):
+                qweight[row] |= intweight[j] << (3 * (j - i) + 2)
+            i += 10
+            row += 1
+    return qweight.astype(np.int32)
+
+
+def quantized_linear(bits, infeatures=128, outfeatures=64, group_size=32):
+    """A linear layer whose weights are exactly representable with `bits`."""
+    torch.manual_seed(bits)
+    num_groups = infeatures // group_size
+    g_idx = torch.arange(infeatures, dtype=torch.int32) // group_size
+    scales = torch.rand(outfeatures, num_groups).half().float() + 0.5
+    zeros = torch.randint(1, 2**bits + 1, (outfeatures, num_groups)).float()
+    intweight = torch.randint(0, 2**bits, (outfeatures, infeatures)).float()
+    # the way unpack dequantizes, with half precision scales
+    weight = scales.half()[:, g_idx.long()] * (
+        intweight - zeros[:, g_idx.long()]
+    ).half()
+    linear = nn.Linear(infeatures, outfeatures, bias=False)
+    linear.weight.data = weight
+    return linear, scales, zeros, g_idx
+
+
+@pytest.mark.parametrize("bits", [2, 3, 4, 8])
+def test_pack_rows_matches_loop(bits):
+    rng = np.random.default_rng(bits)
+    values = rng.integers(0, 2**bits, size=(96, 40), dtype=np.uint32)
+    assert np.array_equal(pack_rows(values, bits), pack_rows_loop(values, bits))
+    assert np.array_equal(
+        pack_cols(values.T, bits), pack_rows_loop(values, bits).T
+    )
+
+
+@pytest.mark.parametrize("bits", [2, 3, 4, 8])
+def test_pack_unpack_round_trip(bits):
+    linear, scales, zeros, g_idx = quantized_linear(bits)
+    qlinear = QuantLinear(bits, linear.in_features, linear.out_features, bias=False)
+    qlinear.pack(linear, scales, zeros.clone(), g_idx)
+    restored = qlinear.unpack()
+    assert torch.equal(restored.weight.data, linear.weight.data.float())
+
+
+def test_quantize_weight_matches_loop():
+    linear, scales, zeros, g_idx = quantized_linear(4)
+    W = linear.weight.data.float() + torch.randn_like(linear.weight.data.float()) * 0.01
+    scales, zeros = scales.t().contiguous(), zeros.t().contiguous()
+    scale_zeros = zeros * scales
+    scales = scales.half()
+    expected = torch.cat(
+        [
+            torch.round(
+                (W[:, idx] + scale_zeros[g_idx[idx]]) / scales[g_idx[idx]]
+            ).to(torch.int)[:, None]
+            for idx in range(W.shape[1])
+        ],
+        dim=1,
+    ).t()
+    assert torch.equal(quantize_weight(W, scales, scale_zeros, g_idx), expected)
+
+
+def test_unsupported_bits():
+    with pytest.raises(NotImplementedError):
+        pack_rows(np.zeros((32, 4), dtype=np.uint32), 5)
@@ -0,0 +1,49 @@
+import pytest
+import torch
+import torch.nn as nn
+
+from deltazip.core.sparsegpt import SparseGPT
+
+
+def hessian_per_sample(layer, samples):
+    """The Hessian accumulated one unpadded sample at a time."""
+    sparsegpt = SparseGPT(layer)
+    for sample in samples:
+        sparsegpt.add_batch(sample.unsqueeze(0), None)
+    return sparsegpt
+
+
+def test_padded_batch_matches_per_sample():
+    torch.manual_seed(0)
+    layer = nn.Linear(16, 8, bias=False)
+    lengths = [7, 5, 3, 7]
+    samples = [torch.randn(length, 16) for length in lengths]
+
+    # left padded like collate_data
+    max_len = max(lengths)
+    batch = torch.zeros(len(samples), max_len, 16)
+    mask = torch.zeros(len(samples), max_len, dtype=torch.long)
+    for i, sample in enumerate(samples):
+        batch[i, max_len - len(sample):] = sample
+        batch[i, : max_len - len(sample)] = 100.0
+        mask[i, max_len - len(sample):] = 1
+
+    expected = hessian_per_sample(layer, samples)
+    batched = SparseGPT(layer)
+    batched.add_batch(batch[:2], None, mask[:2])
+    batched.add_batch(batch[2:], None, mask[2:])
+
+    assert batched.nsamples == expected.nsamples == len(samples)
+    torch.testing.assert_close(batched.H, expected.H)
+
+
+def test_check_hessian():
+    layer = nn.Linear(4, 4, bias=False)
+    sparsegpt = SparseGPT(layer)
+    with pytest.raises(ValueError):
+        sparsegpt.check_hessian()
+    sparsegpt.add_batch(torch.zeros(1, 3, 4), None)
+    with pytest.raises(ValueError):
+        sparsegpt.check_hessian()
+    sparsegpt.add_batch(torch.ones(1, 3, 4), None)
+    sparsegpt.check_hessian()
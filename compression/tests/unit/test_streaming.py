@@ -0,0 +1,97 @@
+import json
+
+import pytest
+import torch
+import torch.nn as nn
+from safetensors.torch import save_file
+
+from deltazip.modeling._streaming import BaseWeightProvider, SafetensorsIndex
+
+
+class TinyModel(nn.Module):
+    def __init__(self):
+        super().__init__()
+        self.embed = nn.Embedding(8, 4)
+        self.layers = nn.ModuleList([nn.Linear(4, 4) for _ in range(2)])
+        self.norm = nn.LayerNorm(4)
+
+
+def empty_model():
+    with torch.device("meta"):
+        return TinyModel()
+
+
+@pytest.fixture(params=["single", "sharded"])
+def checkpoint(request, tmp_path):
+    torch.manual_seed(0)
+    state_dict = TinyModel().state_dict()
+    if request.param == "single":
+        save_file(state_dict, str(tmp_path / "model.safetensors"))
+    else:
+        weight_map = {}
+        first_shard = ["embed.weight", "layers.0.weight", "layers.0.bias"]
+        for shard, keys in enumerate([first_shard, None]):
+            keys = keys or [k for k in state_dict if k not in weight_map]
+            shard_name = f"model-{shard}.safetensors"
+            save_file({k: state_dict[k] for k in keys}, str(tmp_path / shard_name))
+            weight_map.update({k: shard_name for k in keys})
+        with open(tmp_path / "model.safetensors.index.json", "w") as f:
+            json.dump({"weight_map": weight_map}, f)
+    return str(tmp_path), state_dict
+
+
+def test_load_layer_by_layer(checkpoint):
+    path, state_dict = checkpoint
+    index = SafetensorsIndex(path)
+    model = empty_model()
+
+    assert index.load_module(model.layers[1], "layers.1", "cpu", torch.float16) == 2
+    assert model.layers[1].weight.dtype == torch.float16
+    assert torch.equal(model.layers[1].weight, state_dict["layers.1.weight"].half())
+    assert model.layers[0].weight.is_meta and model.embed.weight.is_meta
+
+    index.load_missing(model, "cpu")
+    for name, tensor in model.state_dict().items():
+        assert not tensor.is_meta
+        if name.startswith("layers.1"):
+            continue
+        assert torch.equal(tensor, state_dict[name])
+
+
+def test_missing_checkpoint(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        SafetensorsIndex(str(tmp_path))
+
+
+def test_base_weight_provider(checkpoint):
+    path, state_dict = checkpoint
+    provider = BaseWeightProvider.of(SafetensorsIndex(path))
+    assert BaseWeightProvider.of(provider) is provider
+
+    provider.prefetch(["layers.0.weight", "layers.1.weight"], "cpu")
+    for name in ["layers.0.weight", "layers.1.weight", "embed.weight"]:
+        assert torch.equal(provider.get(name, "cpu"), state_dict[name])
+    assert not provider._pending
+    provider.close()
+
+
+def test_base_weight_provider_casts(checkpoint):
+    path, state_dict = checkpoint
+    provider = BaseWeightProvider.of(SafetensorsIndex(path), dtype=torch.float16)
+    weight = provider.get("layers.0.weight", "cpu")
+    assert weight.dtype == torch.float16
+    assert torch.equal(weight, state_dict["layers.0.weight"].half())
+    provider.close()
+
+
+def test_base_weight_provider_of_loaded_model():
+    base_model = nn.Module()
+    base_model.model = TinyModel()
+    base_model.config = type("Config", (), {"_name_or_path": "base"})()
+    provider = BaseWeightProvider(base_model)
+    weight = provider.get("layers.1.weight", "cpu")
+    assert provider.name_or_path == "base"
+    assert torch.equal(weight, base_model.model.layers[1].weight)
+    # a copy, subtracting from it leaves the base model untouched
+    assert weight.data_ptr() != base_model.model.layers[1].weight.data_ptr()
+    provider.close()
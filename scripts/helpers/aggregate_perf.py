@@ -1,7 +1,25 @@
+"""
+Aggregates benchmark results: latency percentiles, SLO attainment and where
+the time of a request went (queueing, CPU loading, GPU loading, inference).
+
+Result files are streamed line by line, only the per-request latencies are
+kept in memory.
+
+Example:
+python scripts/helpers/aggregate_perf.py --dir .artifact/benchmarks/results --slo-ttft 1 5 --slo-e2e 30 --by window --window 60
+"""
 import os
 import json
+import math
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Tuple
 from tabulate import tabulate
 
+PERCENTILES = [50, 90, 99]
+LATENCY_METRICS = ["ttft", "tpot", "e2e"]
+BREAKDOWN_METRICS = ["queueing", "cpu_loading", "gpu_loading", "inference"]
+
+
 def get_sysname(meta_info):
     sys_info = meta_info['sys_info']
     if 'delta_modules' in sys_info and len(sys_info['delta_modules']) > 0:
@@ -11,46 +29,195 @@ def get_sysname(meta_info):
     else:
         raise ValueError("Unknown system")
 
-def calculate_average_latency(data):
-    data = [x['response'] for x in data]
-    latencies = [x['metrics'][0]['finished_time'] - x['metrics'][0]['arrival_time'] for x in data]
-    return sum(latencies) / len(latencies)
 
-def calculate_ttft(data):
-    data = [x['response'] for x in data]
-    latencies = [x['metrics'][0]['first_token_time'] - x['metrics'][0]['arrival_time'] for x in data]
-    return sum(latencies) / len(latencies)
+def iter_results(path: str) -> Iterator[dict]:
+    """Yields the meta info line, then one result per line."""
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def request_latencies(result: dict) -> Optional[Dict[str, float]]:
+    """Latencies of one request from its server-side RequestMetrics, None if
+    the request failed."""
+    response = result['response']
+    if 'metrics' not in response or not response['metrics']:
+        return None
+    metric = response['metrics'][0]
+    arrival = metric['arrival_time']
+    first_scheduled = metric['first_scheduled_time']
+    first_token = metric['first_token_time']
+    finished = metric['finished_time']
+    # loading starts when the engine says so, as in the engine metrics, and
+    # may overlap with queueing
+    start_loading = metric.get('start_loading_time') or first_scheduled
+    # loading times are set after the delta reached the CPU, then the GPU;
+    # requests that needed no delta have neither
+    cpu_loaded = metric.get('cpu_loading_time')
+    cpu_loading = 0.0 if cpu_loaded is None else cpu_loaded - start_loading
+    cpu_loaded = first_scheduled if cpu_loaded is None else cpu_loaded
+    gpu_loaded = metric.get('gpu_loading_time')
+    gpu_loaded = cpu_loaded if gpu_loaded is None else gpu_loaded
+    num_tokens = response.get('usage', {}).get('completion_tokens', 0)
+    if num_tokens > 1:
+        tpot = (finished - first_token) / (num_tokens - 1)
+    else:
+        tpot = result.get('tpot', 0.0)
+    return {
+        'arrival': arrival,
+        'finished': finished,
+        'ttft': first_token - arrival,
+        'tpot': tpot,
+        'e2e': finished - arrival,
+        'queueing': first_scheduled - arrival,
+        'cpu_loading': cpu_loading,
+        'gpu_loading': gpu_loaded - cpu_loaded,
+        'inference': finished - gpu_loaded,
+    }
+
+
+class LatencyStats:
+    """Latencies of a group of requests."""
+
+    def __init__(self):
+        self.values: Dict[str, List[float]] = {
+            k: [] for k in LATENCY_METRICS + BREAKDOWN_METRICS
+        }
+        self.count = 0
+        self.failed = 0
+        self.first_arrival = math.inf
+        self.last_finished = -math.inf
+
+    def add(self, latencies: Optional[Dict[str, float]]):
+        if latencies is None:
+            self.failed += 1
+            return
+        self.count += 1
+        for k, v in self.values.items():
+            v.append(latencies[k])
+        self.first_arrival = min(self.first_arrival, latencies['arrival'])
+        self.last_finished = max(self.last_finished, latencies['finished'])
+
+    def percentile(self, metric: str, q: float) -> float:
+        return float(np.percentile(self.values[metric], q)) if self.count else math.nan
+
+    def mean(self, metric: str) -> float:
+        return float(np.mean(self.values[metric])) if self.count else math.nan
+
+    def throughput(self) -> float:
+        if not self.count:
+            return math.nan
+        return self.count / (self.last_finished - self.first_arrival)
+
+    def attainment(self, slos: Dict[str, float]) -> float:
+        """Fraction of requests that met every SLO in `slos`."""
+        if not self.count:
+            return math.nan
+        met = np.ones(self.count, dtype=bool)
+        for metric, threshold in slos.items():
+            met &= np.asarray(self.values[metric]) <= threshold
+        return float(met.mean())
+
+    def summary(self, slos: List[Tuple[str, float]]) -> dict:
+        row = {'requests': self.count}
+        if self.failed:
+            row['failed'] = self.failed
+        row['throughput'] = f"{self.throughput():.4f}"
+        row['avg_latency'] = f"{self.mean('e2e'):.2f}"
+        row['avg_ttft'] = f"{self.mean('ttft'):.2f}"
+        for metric in LATENCY_METRICS:
+            for q in PERCENTILES:
+                row[f"p{q}_{metric}"] = f"{self.percentile(metric, q):.3f}"
+        for metric in BREAKDOWN_METRICS:
+            row[f"avg_{metric}"] = f"{self.mean(metric):.3f}"
+        for metric, threshold in slos:
+            row[f"slo_{metric}<={threshold:g}"] = (
+                f"{self.attainment({metric: threshold}):.2%}"
+            )
+        if len(slos) > 1:
+            # the strictest threshold of every metric, met together
+            strictest: Dict[str, float] = {}
+            for metric, threshold in slos:
+                strictest[metric] = min(threshold, strictest.get(metric, math.inf))
+            row['slo_all'] = f"{self.attainment(strictest):.2%}"
+        return row
+
+
+def aggregate_file(path: str, window: Optional[float]):
+    """Streams one result file into overall, per-delta and per-window stats."""
+    results = iter_results(path)
+    meta_info = next(results)
+    overall = LatencyStats()
+    per_delta: Dict[str, LatencyStats] = {}
+    per_window: Dict[int, LatencyStats] = {}
+    for result in results:
+        latencies = request_latencies(result)
+        overall.add(latencies)
+        # the requested model, failed requests have none in their response
+        model = result.get('model') or result['response'].get('model', 'unknown')
+        per_delta.setdefault(model, LatencyStats()).add(latencies)
+        if window and latencies is not None:
+            bucket = int(latencies['arrival'] // window)
+            per_window.setdefault(bucket, LatencyStats()).add(latencies)
+    return meta_info, overall, per_delta, per_window
+
+
+def parse_slos(args) -> List[Tuple[str, float]]:
+    slos = []
+    for metric in LATENCY_METRICS:
+        for threshold in getattr(args, f"slo_{metric}") or []:
+            slos.append((metric, threshold))
+    return slos
 
-def calculate_throughput(data):
-    data = [x['response'] for x in data]
-    max_finished_time = max([x['metrics'][0]['finished_time'] for x in data])
-    min_arrival_time = min([x['metrics'][0]['arrival_time'] for x in data])
-    total_time = max_finished_time - min_arrival_time
-    return len(data) / total_time
 
 def aggregate_perf(args):
-    results = [x for x in os.listdir(args.dir) if x.endswith('.jsonl')]
+    results = sorted(x for x in os.listdir(args.dir) if x.endswith('.jsonl'))
+    slos = parse_slos(args)
     perfs = []
+    breakdowns = []
     for res in results:
-        with open(os.path.join(args.dir, res)) as f:
-            data = [json.loads(line) for line in f]
-            meta_info, data = data[0], data[1:]
-            sysname = get_sysname(meta_info)
-            avg_latency = calculate_average_latency(data)
-            avg_ttft = calculate_ttft(data)
-            throughput = calculate_throughput(data)
-            perfs.append({
-                'sysname': sysname,
-                'avg_latency': f"{avg_latency:.2f}",
-                'avg_ttft': f"{avg_ttft:.2f}",
-                'throughput': f"{throughput:.4f}"
-            })
-    table = tabulate(perfs, headers='keys', tablefmt='pretty')
-
-    print(table)
+        meta_info, overall, per_delta, per_window = aggregate_file(
+            os.path.join(args.dir, res), args.window
+        )
+        sysname = get_sysname(meta_info)
+        perfs.append({'sysname': sysname, **overall.summary(slos)})
+        if args.by == 'delta':
+            for model in sorted(per_delta):
+                breakdowns.append(
+                    {'sysname': sysname, 'model': model, **per_delta[model].summary(slos)}
+                )
+        elif args.by == 'window':
+            if not per_window:
+                continue
+            start = min(per_window)
+            for bucket in sorted(per_window):
+                breakdowns.append(
+                    {
+                        'sysname': sysname,
+                        'window_start': (bucket - start) * args.window,
+                        **per_window[bucket].summary(slos),
+                    }
+                )
+    print(tabulate(perfs, headers='keys', tablefmt='pretty'))
+    if breakdowns:
+        print(tabulate(breakdowns, headers='keys', tablefmt='pretty'))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'overall': perfs, 'breakdown': breakdowns}, f, indent=2)
+
+
 if __name__=="__main__":
     import argparse
     parser = argparse.ArgumentParser(description='Aggregate performance results')
     parser.add_argument('--dir', type=str, required=True, help='Directory containing performance results')
+    parser.add_argument('--slo-ttft', type=float, nargs='*', help='TTFT SLO thresholds (s)')
+    parser.add_argument('--slo-tpot', type=float, nargs='*', help='TPOT SLO thresholds (s)')
+    parser.add_argument('--slo-e2e', type=float, nargs='*', help='End-to-end latency SLO thresholds (s)')
+    parser.add_argument('--by', type=str, choices=['delta', 'window'], default=None, help='Also break results down per delta or per time window')
+    parser.add_argument('--window', type=float, default=None, help='Time window length (s) of the per-window breakdown')
+    parser.add_argument('--output', type=str, default=None, help='Also write the tables to this json file')
     args = parser.parse_args()
-    aggregate_perf(args)
\ No newline at end of file
+    if args.by == 'window' and not args.window:
+        parser.error("--by window requires --window")
+    aggregate_perf(args)
@@ -42,13 +42,25 @@ if __name__ == "__main__":
     )
     parser.add_argument("--endpoints", default=["http://localhost:8000"], nargs="+")
     parser.add_argument("--output", type=str, default="outputs/")
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Wait for whole responses, without client-side TTFT/TPOT",
+    )
     args = parser.parse_args()
 
     endpoints, workload, warmup, sysinfo = before_benchmark(args)
     workload_annotation = args.workload.split("/")[-1].split(".")[0]
     annotations = generate_annotation(args.endpoints, sysinfo, workload_annotation)
 
-    outputs = run(endpoints, workload, warmup, sysinfo["model"], sysinfo)
+    outputs = run(
+        endpoints,
+        workload,
+        warmup,
+        sysinfo["model"],
+        sysinfo,
+        stream=not args.no_stream,
+    )
     new_unique_name = str(uuid.uuid4())
     output_file = os.path.join(args.output, f"{new_unique_name}.jsonl")
 
@@ -1,14 +1,13 @@
 import copy
+import json
+import httpx
+import asyncio
 import requests
-import threading
 import numpy as np
-import sched, time
 from typing import List
 from timeit import default_timer as timer
 
-s = sched.scheduler(time.monotonic, time.sleep)
-threads = []
-inference_results = []
+DEFAULT_TIMEOUT = 12000
 
 
 def parse_annotation(annotations):
@@ -20,75 +19,111 @@ def parse_annotation(annotations):
     return annos
 
 
-def request_thread(
-    endpoint,
-    req,
-    start_time,
-    global_start_time,
-):
-    global inference_results
-    res = requests.post(endpoint + "/v1/completions", json=req)
+def _assemble_response(chunks):
+    """Merges streamed chunks into the shape of a non-streaming response."""
+    texts = {}
+    finish_reasons = {}
+    response = {}
+    for chunk in chunks:
+        for choice in chunk.get("choices", []):
+            index = choice["index"]
+            texts[index] = texts.get(index, "") + choice.get("text", "")
+            finish_reasons[index] = choice.get("finish_reason")
+        for key in ("id", "object", "created", "model", "usage", "metrics"):
+            if chunk.get(key) is not None:
+                response[key] = chunk[key]
+    response["choices"] = [
+        {"index": index, "text": texts[index], "finish_reason": finish_reasons[index]}
+        for index in sorted(texts)
+    ]
+    return response
+
+
+async def request_coroutine(client, endpoint, req, start_time, stream):
+    """Issues one request, timing the first and every following token."""
+    payload = dict(req, stream=stream)
+    token_times = []
+    chunks = []
+    response = None
+    try:
+        async with client.stream("POST", endpoint + "/v1/completions", json=payload) as res:
+            if res.status_code != 200:
+                text = (await res.aread()).decode(errors="replace")
+                print(f"Failed to issue request: {text}", flush=True)
+                response = {"error": text, "status_code": res.status_code}
+            elif not stream:
+                response = json.loads(await res.aread())
+            else:
+                async for line in res.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    data = line[len("data: ") :]
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    if any(choice.get("text") for choice in chunk.get("choices", [])):
+                        token_times.append(timer())
+                    chunks.append(chunk)
+    except httpx.HTTPError as e:
+        # connection resets and timeouts fail this request only
+        print(f"Failed to issue request: {e!r}", flush=True)
+        response = {"error": str(e) or repr(e)}
+        token_times = []
     end_time = timer()
-    if res.status_code != 200:
-        print(f"Failed to issue request: {res.text}", flush=True)
-    res = {
-        "response": res.json(),
+    if response is None:
+        response = _assemble_response(chunks)
+    result = {
+        "model": req.get("model"),
+        "response": response,
         "end_at": end_time,
         "start_at": start_time,
     }
-    inference_results.append(res)
-    return res
-
-
-def async_issue_requests(endpoint, reqs, global_start_time):
-    global threads
-    for req in reqs:
-        start_time = timer()
-        thread = threading.Thread(
-            target=request_thread,
-            args=(
-                endpoint,
-                req,
-                start_time,
-                global_start_time,
-            ),
+    if token_times:
+        # client-side latencies, including network and proxy overheads
+        result["ttft"] = token_times[0] - start_time
+        result["tpot"] = (
+            (token_times[-1] - token_times[0]) / (len(token_times) - 1)
+            if len(token_times) > 1
+            else 0.0
         )
-        threads.append(thread)
-        thread.start()
+        result["num_chunks"] = len(token_times)
+    return result
 
 
-def issue_queries(endpoint, queries):
-    print("Issuing queries", flush=True)
-    time_step = 0.1
-    global threads
-    global inference_results
-    time_range = [x["timestamp"] for x in queries]
-    max_time = max(time_range) + 1
-    # execute for one more second
-    start = timer()
-    for time in np.arange(0, max_time, time_step):
-        sub_queries = [
-            x
-            for x in queries
-            if x["timestamp"] <= time and x["timestamp"] > time - time_step
-        ]
-        if len(sub_queries) > 0:
-            print(f"sending {len(sub_queries)} queries at {time}", flush=True)
-            s.enter(
-                time,
-                1,
-                async_issue_requests,
-                argument=(
-                    endpoint,
-                    sub_queries,
-                    start,
-                ),
+async def async_issue_queries(endpoint, queries, stream=True):
+    """Open-loop load: every query is sent at its timestamp, regardless of how
+    many earlier ones are still in flight."""
+    queries = sorted(queries, key=lambda x: x["timestamp"])
+    # one pooled client; no connection limit so that the client never queues
+    async with httpx.AsyncClient(
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(max_connections=None, max_keepalive_connections=None),
+    ) as client:
+        tasks = []
+        start = timer()
+        for query in queries:
+            delay = start + query["timestamp"] - timer()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            start_time = timer()
+            task = asyncio.create_task(
+                request_coroutine(client, endpoint, query, start_time, stream)
             )
-    s.run(blocking=True)
-    print(f"total threads: {len(threads)}", flush=True)
-    [thread.join() for thread in threads]
-    end = timer()
-    return {"results": inference_results, "total_elapsed": end - start}
+            tasks.append((query, start_time, task))
+        print(f"Issued {len(tasks)} queries", flush=True)
+        results = []
+        for query, start_time, task in tasks:
+            result = await task
+            # how late the query was sent relative to its timestamp
+            result["dispatch_lag"] = start_time - start - query["timestamp"]
+            results.append(result)
+        end = timer()
+    return {"results": results, "total_elapsed": end - start}
+
+
+def issue_queries(endpoint, queries, stream=True):
+    print("Issuing queries", flush=True)
+    return asyncio.run(async_issue_queries(endpoint, queries, stream=stream))
 
 
 def warmup(endpoint: str, workload: List, base_model: str, warmup_strategy: str):
@@ -111,12 +146,11 @@ def run(
     warmup_strategy: str,
     base_model: str,
     sysinfo: dict,
+    stream: bool = True,
 ):
-    global inference_results
     warmup(endpoints[0], workload, base_model, warmup_strategy)
-    issue_queries(endpoints[0], workload)
-    return inference_results
+    return issue_queries(endpoints[0], workload, stream=stream)["results"]
 
 
 def get_sys_info(endpoint: str):
-    return requests.get(endpoint + "/sysinfo").json()
\ No newline at end of file
+    return requests.get(endpoint + "/sysinfo").json()
@@ -0,0 +1,226 @@
+"""
+Synthesizes multi-model workloads in the jsonl format read by bench.py.
+
+Example:
+python scripts/helpers/generate_workload.py --num-deltas 32 --arrival gamma --rate 2.0 --cv 4 --popularity zipf --alpha 1.2 --drift-interval 60 --duration 300 --output scripts/workload/zipf.ar=2.0.jsonl
+"""
+import json
+import argparse
+import numpy as np
+from typing import List, Optional
+
+# words used to pad synthetic prompts, roughly one token each
+FILLER_WORDS = ["the", "model", "delta", "cache", "token", "request", "load", "serve"]
+
+
+def parse_length_dist(spec: str):
+    """Parses `const:N`, `uniform:LOW,HIGH`, `normal:MEAN,STD` or
+    `lognormal:MEAN,SIGMA` (MEAN in tokens) into a sampler."""
+    name, _, params = spec.partition(":")
+    values = [float(x) for x in params.split(",")] if params else []
+    if name == "const" and len(values) == 1:
+        return lambda rng, n: np.full(n, values[0])
+    if name == "uniform" and len(values) == 2:
+        return lambda rng, n: rng.uniform(values[0], values[1], n)
+    if name == "normal" and len(values) == 2:
+        return lambda rng, n: rng.normal(values[0], values[1], n)
+    if name == "lognormal" and len(values) == 2:
+        mean, sigma = values
+        mu = np.log(mean) - sigma**2 / 2
+        return lambda rng, n: rng.lognormal(mu, sigma, n)
+    raise ValueError(f"Invalid length distribution: {spec}")
+
+
+def sample_lengths(rng, spec: str, n: int, min_len: int, max_len: int):
+    lengths = parse_length_dist(spec)(rng, n)
+    return np.clip(np.rint(lengths), min_len, max_len).astype(int)
+
+
+def poisson_arrivals(rng, rate: float, duration: float) -> np.ndarray:
+    return gamma_arrivals(rng, rate, 1.0, duration)
+
+
+def gamma_arrivals(rng, rate: float, cv: float, duration: float) -> np.ndarray:
+    """Arrivals with Gamma inter-arrival times of mean 1/rate and coefficient
+    of variation `cv`; cv=1 is Poisson, cv>1 is bursty."""
+    shape = 1.0 / cv**2
+    scale = 1.0 / (rate * shape)
+    # draw in chunks until the duration is covered
+    timestamps = []
+    now = 0.0
+    while now < duration:
+        gaps = rng.gamma(shape, scale, max(int(rate * duration), 16))
+        chunk = now + np.cumsum(gaps)
+        timestamps.append(chunk[chunk < duration])
+        now = chunk[-1]
+    return np.concatenate(timestamps)
+
+
+def trace_arrivals(path: str, speedup: float, duration: Optional[float]):
+    """Replays the timestamps of a jsonl trace, compressed by `speedup`."""
+    with open(path, "r") as f:
+        timestamps = np.array([json.loads(line)["timestamp"] for line in f])
+    timestamps = np.sort(timestamps - timestamps.min()) / speedup
+    if duration is not None:
+        timestamps = timestamps[timestamps < duration]
+    return timestamps
+
+
+def popularity(num_deltas: int, kind: str, alpha: float) -> np.ndarray:
+    """Probability of each popularity rank."""
+    if kind == "uniform":
+        weights = np.ones(num_deltas)
+    elif kind == "zipf":
+        weights = 1.0 / np.arange(1, num_deltas + 1) ** alpha
+    else:
+        raise ValueError(f"Unknown popularity: {kind}")
+    return weights / weights.sum()
+
+
+def assign_models(
+    rng,
+    timestamps: np.ndarray,
+    num_deltas: int,
+    probs: np.ndarray,
+    drift_interval: Optional[float],
+    drift: str,
+) -> List[int]:
+    """Samples a delta per arrival. Popularity ranks map to deltas through a
+    permutation that changes every `drift_interval` seconds: `rotate` shifts
+    every delta down one rank, `shuffle` draws a new permutation."""
+    ranks = rng.choice(num_deltas, size=len(timestamps), p=probs)
+    permutation = np.arange(num_deltas)
+    epoch = 0
+    models = []
+    for timestamp, rank in zip(timestamps, ranks):
+        if drift_interval:
+            while timestamp >= (epoch + 1) * drift_interval:
+                epoch += 1
+                if drift == "rotate":
+                    permutation = np.roll(permutation, 1)
+                elif drift == "shuffle":
+                    permutation = rng.permutation(num_deltas)
+        models.append(int(permutation[rank]) + 1)
+    return models
+
+
+def load_prompts(path: str) -> List[str]:
+    with open(path, "r") as f:
+        if path.endswith(".jsonl"):
+            return [json.loads(line)["prompt"] for line in f]
+        return [line.rstrip("\n") for line in f if line.strip()]
+
+
+def synthetic_prompt(rng, num_tokens: int) -> str:
+    words = rng.choice(FILLER_WORDS, size=max(num_tokens, 1))
+    return f"USER: {' '.join(words)}\nASSISTANT:"
+
+
+def generate(args) -> List[dict]:
+    rng = np.random.default_rng(args.seed)
+    duration = args.duration or 60.0
+    if args.arrival == "poisson":
+        timestamps = poisson_arrivals(rng, args.rate, duration)
+    elif args.arrival == "gamma":
+        timestamps = gamma_arrivals(rng, args.rate, args.cv, duration)
+    else:
+        timestamps = trace_arrivals(args.trace, args.trace_speedup, args.duration)
+    n = len(timestamps)
+    models = assign_models(
+        rng,
+        timestamps,
+        args.num_deltas,
+        popularity(args.num_deltas, args.popularity, args.alpha),
+        args.drift_interval,
+        args.drift,
+    )
+    is_base = rng.random(n) < args.base_model_ratio
+    output_lens = sample_lengths(
+        rng, args.output_len, n, args.min_output_len, args.max_output_len
+    )
+    if args.prompts:
+        prompts = load_prompts(args.prompts)
+        prompts = [prompts[i] for i in rng.integers(0, len(prompts), n)]
+    else:
+        prompt_lens = sample_lengths(
+            rng, args.prompt_len, n, args.min_prompt_len, args.max_prompt_len
+        )
+        prompts = [synthetic_prompt(rng, length) for length in prompt_lens]
+    return [
+        {
+            "id": i,
+            "prompt": prompts[i],
+            "timestamp": float(timestamps[i]),
+            "model": "base-model" if is_base[i] else f"delta-{models[i]}",
+            "min_tokens": int(output_lens[i]),
+            "max_tokens": int(output_lens[i]),
+            "ignore_eos": True,
+        }
+        for i in range(n)
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Synthesize a multi-model workload")
+    parser.add_argument("--output", type=str, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=None,
+        help="Seconds of arrivals, default 60 (or the whole trace when replaying)",
+    )
+    # arrivals
+    parser.add_argument(
+        "--arrival", type=str, default="poisson", choices=["poisson", "gamma", "trace"]
+    )
+    parser.add_argument("--rate", type=float, default=1.0, help="Requests/second")
+    parser.add_argument(
+        "--cv", type=float, default=2.0, help="Inter-arrival CV for gamma arrivals"
+    )
+    parser.add_argument("--trace", type=str, help="jsonl trace to replay arrivals of")
+    parser.add_argument("--trace-speedup", type=float, default=1.0)
+    # popularity
+    parser.add_argument("--num-deltas", type=int, default=8)
+    parser.add_argument(
+        "--popularity", type=str, default="zipf", choices=["zipf", "uniform"]
+    )
+    parser.add_argument("--alpha", type=float, default=1.0, help="Zipf exponent")
+    parser.add_argument(
+        "--drift-interval",
+        type=float,
+        default=None,
+        help="Seconds between popularity changes, no drift if unset",
+    )
+    parser.add_argument(
+        "--drift", type=str, default="rotate", choices=["rotate", "shuffle"]
+    )
+    parser.add_argument(
+        "--base-model-ratio",
+        type=float,
+        default=0.0,
+        help="Fraction of requests to the base model",
+    )
+    # lengths
+    parser.add_argument(
+        "--prompts",
+        type=str,
+        default=None,
+        help="jsonl (with a prompt field) or text file to sample prompts from",
+    )
+    parser.add_argument("--prompt-len", type=str, default="lognormal:128,0.8")
+    parser.add_argument("--min-prompt-len", type=int, default=4)
+    parser.add_argument("--max-prompt-len", type=int, default=2048)
+    parser.add_argument("--output-len", type=str, default="lognormal:192,0.6")
+    parser.add_argument("--min-output-len", type=int, default=1)
+    parser.add_argument("--max-output-len", type=int, default=1024)
+    args = parser.parse_args()
+    if args.arrival == "trace" and args.trace is None:
+        parser.error("--arrival trace requires --trace")
+
+    workload = generate(args)
+    with open(args.output, "w") as f:
+        for job in workload:
+            f.write(json.dumps(job))
+            f.write("\n")
+    print(f"{len(workload)} requests written to {args.output}", flush=True)
@@ -0,0 +1,391 @@
+"""Stage-by-stage timing of the delta load path.
+
+Writes synthetic checkpoints in the compressed (marlin 2:4) layout and times
+each stage of loading one rank's tensors, as `DeltaModel.from_checkpoint`
+and `set_delta` do:
+
+    open      safe_open and header parse, listing the rank-local keys
+    read      get_tensor of every rank-local tensor
+    pin       pin_memory of the tensors
+    assemble  DeltaLayerWeights construction
+    set_delta copies into preallocated slot buffers
+
+for every combination of model size, bit width, TP size and checkpoint
+layout (monolithic file or per-rank shards). Without CUDA, or with
+--cpu-only, pinning and device copies are replaced by host copies so the
+numbers stay comparable across runs on the same machine.
+
+Results are written as JSON, and `compare` flags stages that got slower
+than a baseline:
+
+    python benchmarks/benchmark_delta_load.py run --sizes tiny 1b --bits 2 4 --tp-sizes 1 2 --output current.json
+    python benchmarks/benchmark_delta_load.py compare baseline.json current.json --threshold 0.1
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+from timeit import default_timer as timer
+from typing import Dict, List, Tuple
+
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+from vllm.delta.config import CompressionConfig
+from vllm.delta.loader import assemble_delta_weights, is_rank_local
+from vllm.delta.shards import (
+    MONOLITHIC_FILENAME,
+    convert_to_rank_shards,
+    get_delta_tensor_filename,
+)
+
+STAGES = ["open", "read", "pin", "assemble", "set_delta"]
+# stages whose throughput is reported
+BYTE_STAGES = ["read", "pin", "set_delta"]
+LAYOUTS = ["monolithic", "sharded"]
+
+# hidden size, intermediate size, layers, vocab size
+MODEL_SIZES = {
+    "tiny": (512, 1408, 4, 1024),
+    "1b": (2048, 5632, 22, 32000),
+    "7b": (4096, 11008, 32, 32000),
+    "13b": (5120, 13824, 40, 32000),
+}
+# (in features, out features, column parallel) per decoder layer projection
+PROJECTIONS = {
+    "self_attn.q_proj": ("hidden", "hidden", True),
+    "self_attn.k_proj": ("hidden", "hidden", True),
+    "self_attn.v_proj": ("hidden", "hidden", True),
+    "self_attn.o_proj": ("hidden", "hidden", False),
+    "mlp.gate_proj": ("hidden", "intermediate", True),
+    "mlp.up_proj": ("hidden", "intermediate", True),
+    "mlp.down_proj": ("intermediate", "hidden", False),
+}
+SPARSE_FACTOR = 2
+
+
+def _random(shape: Tuple[int, ...], dtype: torch.dtype) -> torch.Tensor:
+    if dtype.is_floating_point:
+        return torch.randn(shape, dtype=dtype)
+    return torch.empty(shape, dtype=dtype).random_()
+
+
+def compressed_tensors(
+    in_features: int, out_features: int, bits: int
+) -> Dict[str, torch.Tensor]:
+    """Tensors of one rank of a 2:4 sparse, `bits`-bit quantized linear."""
+    pack_factor = 32 // bits
+    return {
+        "qweight": _random(
+            (in_features // (pack_factor * SPARSE_FACTOR * 2), out_features * 2),
+            torch.int32,
+        ),
+        "scales": _random((1, out_features), torch.float16),
+        "meta": _random(
+            (out_features, in_features // (pack_factor * SPARSE_FACTOR)),
+            torch.int16,
+        ),
+    }
+
+
+def write_checkpoint(
+    path: str, size: str, bits: int, tp_size: int, num_layers: int = None
+) -> None:
+    """Writes a monolithic checkpoint holding the slices of every rank."""
+    hidden, intermediate, layers, vocab = MODEL_SIZES[size]
+    dims = {"hidden": hidden, "intermediate": intermediate}
+    tensors = {}
+    for rank in range(tp_size):
+        for layer in range(num_layers or layers):
+            prefix = f"model.layers.{layer}"
+            for name, (in_dim, out_dim, column) in PROJECTIONS.items():
+                in_features, out_features = dims[in_dim], dims[out_dim]
+                if column:
+                    out_features //= tp_size
+                else:
+                    in_features //= tp_size
+                for tensor_name, tensor in compressed_tensors(
+                    in_features, out_features, bits
+                ).items():
+                    tensors[f"{prefix}.{name}.{rank}.{tensor_name}"] = tensor
+            for norm in ["input_layernorm", "post_attention_layernorm"]:
+                tensors[f"{prefix}.{norm}.{rank}.weight"] = _random(
+                    (hidden,), torch.float16
+                )
+        for name in ["model.embed_tokens", "lm_head"]:
+            tensors[f"{name}.{rank}.weight"] = _random(
+                (vocab // tp_size, hidden), torch.float16
+            )
+        tensors[f"model.norm.{rank}.weight"] = _random((hidden,), torch.float16)
+    os.makedirs(path, exist_ok=True)
+    save_file(tensors, os.path.join(path, MONOLITHIC_FILENAME))
+
+
+def drop_page_cache(path: str) -> None:
+    """Asks the kernel to drop the cached pages of the files under `path`."""
+    for name in os.listdir(path):
+        fd = os.open(os.path.join(path, name), os.O_RDONLY)
+        try:
+            os.fsync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def _synchronize(device: torch.device) -> None:
+    if device.type == "cuda":
+        torch.cuda.synchronize(device)
+
+
+def time_stages(
+    path: str,
+    tp_rank: int,
+    tp_size: int,
+    compress_config: CompressionConfig,
+    device: torch.device,
+) -> Tuple[Dict[str, float], int]:
+    """Loads `tp_rank`'s tensors once, returns seconds per stage and bytes."""
+    times = {}
+    filename = os.path.join(path, get_delta_tensor_filename(path, tp_rank, tp_size))
+    start = timer()
+    with safe_open(filename, "pt") as f:
+        keys = [key for key in f.keys() if is_rank_local(key, tp_rank)]
+        times["open"] = timer() - start
+
+        start = timer()
+        tensors = {key: f.get_tensor(key) for key in keys}
+        times["read"] = timer() - start
+
+    start = timer()
+    if device.type == "cuda":
+        tensors = {key: tensor.pin_memory() for key, tensor in tensors.items()}
+    else:
+        tensors = {key: tensor.clone() for key, tensor in tensors.items()}
+    times["pin"] = timer() - start
+
+    start = timer()
+    modules = assemble_delta_weights(tensors, tp_rank, compress_config)
+    times["assemble"] = timer() - start
+
+    # slot buffers are allocated once by create_delta_weights, not per load
+    copies = [
+        (torch.empty_like(tensor, device=device), tensor)
+        for module in modules.values()
+        for tensor in module.tensors().values()
+    ]
+    _synchronize(device)
+    start = timer()
+    for slot, tensor in copies:
+        slot.copy_(tensor, non_blocking=True)
+    _synchronize(device)
+    times["set_delta"] = timer() - start
+    return times, sum(tensor.nbytes for tensor in tensors.values())
+
+
+def summarize(samples: List[Dict[str, float]], nbytes: int) -> Dict[str, dict]:
+    stages = {}
+    for stage in STAGES:
+        seconds = [sample[stage] for sample in samples]
+        median = statistics.median(seconds)
+        stages[stage] = {
+            "median_ms": median * 1000,
+            "min_ms": min(seconds) * 1000,
+            "max_ms": max(seconds) * 1000,
+        }
+        if stage in BYTE_STAGES and median > 0:
+            stages[stage]["gib_per_s"] = nbytes / median / 2**30
+    return stages
+
+
+def config_key(config: dict) -> Tuple:
+    return (
+        config["size"],
+        config["bits"],
+        config["tp_size"],
+        config["layout"],
+    )
+
+
+def run(args) -> None:
+    cpu_only = args.cpu_only or not torch.cuda.is_available()
+    device = torch.device("cpu" if cpu_only else "cuda")
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="delta-load-bench-")
+    results = []
+    try:
+        for size, bits, tp_size in itertools.product(
+            args.sizes, args.bits, args.tp_sizes
+        ):
+            path = os.path.join(work_dir, f"{size}-{bits}bit-tp{tp_size}")
+            write_checkpoint(path, size, bits, tp_size, args.num_layers)
+            compress_config = CompressionConfig(bits=bits, prunen=2, prunem=4)
+            # the sharded layout is converted from the monolithic file
+            for layout in [layout for layout in LAYOUTS if layout in args.layouts]:
+                if layout == "sharded":
+                    convert_to_rank_shards(path, remove_source=True)
+                for _ in range(args.warmup):
+                    time_stages(path, 0, tp_size, compress_config, device)
+                samples = []
+                for _ in range(args.repeats):
+                    if args.cold:
+                        drop_page_cache(path)
+                    times, nbytes = time_stages(
+                        path, 0, tp_size, compress_config, device
+                    )
+                    samples.append(times)
+                config = {
+                    "size": size,
+                    "bits": bits,
+                    "tp_size": tp_size,
+                    "layout": layout,
+                }
+                result = {
+                    "config": config,
+                    "bytes": nbytes,
+                    "stages": summarize(samples, nbytes),
+                }
+                results.append(result)
+                print(
+                    f"{size:>5} {bits}bit tp={tp_size} {layout:>10} "
+                    f"{nbytes / 2**20:>9.1f} MiB  "
+                    + "  ".join(
+                        f"{stage} {result['stages'][stage]['median_ms']:.2f}ms"
+                        for stage in STAGES
+                    ),
+                    flush=True,
+                )
+            shutil.rmtree(path)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "device": str(device),
+            "gpu": torch.cuda.get_device_name() if device.type == "cuda" else None,
+            "torch": torch.__version__,
+            "python": platform.python_version(),
+            "host": platform.node(),
+            "cold": args.cold,
+            "repeats": args.repeats,
+            "num_layers": args.num_layers,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+def compare(args) -> int:
+    """Prints the change of every stage, returns 1 if any stage regressed by
+    more than the threshold."""
+    with open(args.baseline) as f:
+        baseline_report = json.load(f)
+    with open(args.current) as f:
+        current_report = json.load(f)
+    for field in ["device", "gpu", "cold", "num_layers"]:
+        before = baseline_report["meta"].get(field)
+        after = current_report["meta"].get(field)
+        if before != after:
+            print(f"warning: {field} differs, {before} (baseline) vs {after}")
+    baseline = {config_key(r["config"]): r for r in baseline_report["results"]}
+    current = {config_key(r["config"]): r for r in current_report["results"]}
+    regressions = 0
+    print(f"{'config':<28} {'stage':<10} {'baseline ms':>12} {'current ms':>12} {'change':>8}")
+    for key in sorted(set(baseline) & set(current)):
+        for stage in STAGES:
+            before = baseline[key]["stages"][stage]["median_ms"]
+            after = current[key]["stages"][stage]["median_ms"]
+            # stages that take a fraction of a millisecond are mostly noise
+            if before < args.min_ms and after < args.min_ms:
+                continue
+            change = after / before - 1 if before > 0 else float("inf")
+            flag = ""
+            if change > args.threshold:
+                flag = " REGRESSION"
+                regressions += 1
+            name = "{}/{}bit/tp{}/{}".format(*key)
+            print(
+                f"{name:<28} {stage:<10} {before:>12.2f} {after:>12.2f} "
+                f"{change:>+8.1%}{flag}"
+            )
+    for key in sorted(set(baseline) ^ set(current)):
+        side = "baseline" if key in baseline else "current"
+        print("{}/{}bit/tp{}/{} only in ".format(*key) + side)
+    if regressions:
+        print(f"{regressions} stage(s) slower than the baseline by more than "
+              f"{args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the stages of loading a delta")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark")
+    run_parser.add_argument("--sizes",
+                            type=str,
+                            nargs="+",
+                            choices=list(MODEL_SIZES),
+                            default=["tiny", "1b"])
+    run_parser.add_argument("--bits", type=int, nargs="+", choices=[2, 4, 8],
+                            default=[2, 4])
+    run_parser.add_argument("--tp-sizes", type=int, nargs="+", default=[1, 2])
+    run_parser.add_argument("--layouts",
+                            type=str,
+                            nargs="+",
+                            choices=LAYOUTS,
+                            default=LAYOUTS,
+                            help="sharded runs after monolithic, on the "
+                            "converted checkpoint")
+    run_parser.add_argument("--num-layers",
+                            type=int,
+                            default=None,
+                            help="Decoder layers per checkpoint, defaults to "
+                            "those of the model size")
+    run_parser.add_argument("--repeats", type=int, default=5)
+    run_parser.add_argument("--warmup", type=int, default=1)
+    run_parser.add_argument("--cold",
+                            action="store_true",
+                            help="Drop the checkpoint from the page cache "
+                            "before every repeat")
+    run_parser.add_argument("--cpu-only",
+                            action="store_true",
+                            help="Replace pinning and device copies with host "
+                            "copies even if CUDA is available")
+    run_parser.add_argument("--work-dir",
+                            type=str,
+                            default=None,
+                            help="Where checkpoints are written, a temporary "
+                            "directory by default")
+    run_parser.add_argument("--output", type=str, default=None)
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare results against a baseline")
+    compare_parser.add_argument("baseline", type=str)
+    compare_parser.add_argument("current", type=str)
+    compare_parser.add_argument("--threshold",
+                                type=float,
+                                default=0.1,
+                                help="Relative slowdown that counts as a "
+                                "regression")
+    compare_parser.add_argument("--min-ms",
+                                type=float,
+                                default=1.0,
+                                help="Ignore stages faster than this in both "
+                                "runs")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
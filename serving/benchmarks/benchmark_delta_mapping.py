@@ -0,0 +1,97 @@
+"""Host overhead of converting a DeltaMapping to index tensors per step.
+
+Compares the vectorized `vllm.delta.mapping.convert_mapping` against the
+per-token `list.index` loop it replaced, for growing batch token counts.
+
+    python benchmarks/benchmark_delta_mapping.py --num-slots 8 --num-deltas 8
+"""
+import argparse
+import random
+import time
+from dataclasses import dataclass
+from typing import Tuple
+
+import torch
+
+from vllm.delta.mapping import SlotTable, convert_mapping
+
+
+@dataclass
+class Mapping:
+    index_mapping: Tuple[int, ...]
+    prompt_mapping: Tuple[int, ...]
+
+
+def convert_mapping_loop(mapping, index_to_id, max_models, vocab_size,
+                         extra_vocab_size):
+    indices = list(mapping.index_mapping)
+    embedding_indices = indices.copy()
+    model_indices = indices.copy()
+    prompt_mapping = [
+        index_to_id.index(x) if x > 0 else -1 for x in mapping.prompt_mapping
+    ]
+    for i in range(len(indices)):
+        idx = index_to_id.index(indices[i]) if indices[i] > 0 else -1
+        embedding_indices[i] = idx if indices[i] > 0 else 0
+        indices[i] = i
+        model_indices[i] = idx
+    indices = torch.tensor([indices, model_indices, embedding_indices],
+                           dtype=torch.long)
+    prompt_mapping = torch.tensor(prompt_mapping, dtype=torch.long)
+    embeddings_indices = torch.stack([
+        indices[2] * extra_vocab_size,
+        indices[2] * (vocab_size + extra_vocab_size)
+    ])
+    padded = prompt_mapping.clone()
+    padded[padded == -1] = max_models - 1
+    padded = torch.arange(0, len(padded), dtype=torch.long) + padded * len(padded)
+    return indices[1], prompt_mapping, padded, embeddings_indices
+
+
+def bench(fn, mapping, table, args, iters):
+    for _ in range(3):
+        fn(mapping, table, *args)
+    start = time.perf_counter()
+    for _ in range(iters):
+        fn(mapping, table, *args)
+    return (time.perf_counter() - start) / iters * 1e6
+
+
+def main(args):
+    random.seed(args.seed)
+    delta_ids = list(range(1, args.num_deltas + 1))
+    slot_to_id = delta_ids[:args.num_slots] + [None] * max(
+        0, args.num_slots - args.num_deltas)
+    table = SlotTable.from_list(slot_to_id)
+    ids = [0] + [i for i in slot_to_id if i is not None]
+    conv_args = (args.num_slots + 1, args.vocab_size, 0)
+    print(f"{'tokens':>8} {'loop us/step':>14} {'vectorized us/step':>20} "
+          f"{'speedup':>8}")
+    for num_tokens in args.num_tokens:
+        mapping = Mapping(
+            index_mapping=tuple(random.choice(ids) for _ in range(num_tokens)),
+            prompt_mapping=tuple(
+                random.choice(ids) for _ in range(args.num_seqs)),
+        )
+        loop = bench(convert_mapping_loop, mapping, slot_to_id, conv_args,
+                     args.iters)
+        vectorized = bench(convert_mapping, mapping, table, conv_args,
+                           args.iters)
+        print(f"{num_tokens:>8} {loop:>14.1f} {vectorized:>20.1f} "
+              f"{loop / vectorized:>7.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark DeltaMapping to index tensor conversion")
+    parser.add_argument("--num-slots", type=int, default=8)
+    parser.add_argument("--num-deltas", type=int, default=8)
+    parser.add_argument("--num-seqs", type=int, default=64)
+    parser.add_argument("--vocab-size", type=int, default=32000)
+    parser.add_argument("--num-tokens",
+                        type=int,
+                        nargs="+",
+                        default=[16, 64, 256, 1024, 2048, 4096, 8192])
+    parser.add_argument("--iters", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
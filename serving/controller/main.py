@@ -1,38 +1,212 @@
+import os
+import json
+import asyncio
+import logging
 import httpx
 from fastapi import FastAPI, Request
 from contextlib import asynccontextmanager
 from starlette.background import BackgroundTask
-from fastapi.responses import StreamingResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from .protocols import UpstreamRegistrationRequest
-from .policies.core import uss, UpstreamServer
+from .policies import get_policy
+from .policies.core import uss, UpstreamServer, find_server
+
+logger = logging.getLogger("controller")
 
-app = FastAPI()
 DEFAULT_TIMEOUT = 12000
-upstream_servers = []
+# seconds between two health checks of every upstream
+HEALTH_CHECK_INTERVAL = float(os.environ.get("CONTROLLER_HEALTH_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.environ.get("CONTROLLER_HEALTH_TIMEOUT", "2"))
+MAX_CONNECTIONS = int(os.environ.get("CONTROLLER_MAX_CONNECTIONS", "1024"))
+# seconds between two polls of every upstream's /load, 0 disables polling
+LOAD_POLL_INTERVAL = float(os.environ.get("CONTROLLER_LOAD_INTERVAL", "0"))
+# comma separated host:port list of upstreams to start with
+INITIAL_UPSTREAMS = os.environ.get("CONTROLLER_UPSTREAMS", "")
 
+# hop-by-hop headers are meaningful for a single connection only
+HOP_BY_HOP_HEADERS = {
+    "connection",
+    "keep-alive",
+    "proxy-authenticate",
+    "proxy-authorization",
+    "te",
+    "trailers",
+    "transfer-encoding",
+    "upgrade",
+}
 
-@app.post("/proxy/{path:path}")
-async def reverse_proxy(request: Request):
+POLICY = os.environ.get("CONTROLLER_POLICY", "round-robin")
+POLICY_ARGS = {
+    "round-robin": {},
+    "shortest-queue": {
+        "service_time": float(os.environ.get("CONTROLLER_SERVICE_TIME", "1.0")),
+        "delta_load_time": float(os.environ.get("CONTROLLER_DELTA_LOAD_TIME", "2.0")),
+    },
+    "consistent-hash": {
+        "load_factor": float(os.environ.get("CONTROLLER_HASH_LOAD_FACTOR", "1.25")),
+    },
+}
+
+client: httpx.AsyncClient = None
+policy = get_policy(POLICY, **POLICY_ARGS.get(POLICY, {}))
+
+
+async def check_health(server: UpstreamServer):
+    try:
+        r = await client.get(f"{server.url}/health", timeout=HEALTH_CHECK_TIMEOUT)
+        healthy = r.status_code == 200
+    except httpx.HTTPError:
+        healthy = False
+    if healthy != server.healthy:
+        logger.warning(f"{server.url} is {'healthy' if healthy else 'unhealthy'}")
+    server.healthy = healthy
+
+
+async def health_check_loop():
+    while True:
+        await asyncio.gather(*(check_health(server) for server in list(uss)))
+        await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+
+
+async def poll_load(server: UpstreamServer):
+    if not server.healthy:
+        return
+    try:
+        r = await client.get(f"{server.url}/load", timeout=HEALTH_CHECK_TIMEOUT)
+        r.raise_for_status()
+        load = r.json()
+    except (httpx.HTTPError, ValueError) as e:
+        logger.debug(f"Polling the load of {server.url} failed: {e}")
+        return
+    server.num_running = load.get("num_running", 0)
+    server.num_waiting = load.get("num_waiting", 0)
+    server.deltas = set(load.get("deltas", []))
+
+
+async def load_poll_loop():
+    while True:
+        await asyncio.gather(*(poll_load(server) for server in list(uss)))
+        await asyncio.sleep(LOAD_POLL_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global client
+    # one pooled client, so connections to the upstreams are kept alive
     client = httpx.AsyncClient(
-        base_url="http://127.0.0.1:8000/", timeout=DEFAULT_TIMEOUT
+        timeout=DEFAULT_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=MAX_CONNECTIONS,
+            max_keepalive_connections=MAX_CONNECTIONS,
+        ),
     )
-    # get model from request payload
-    model_name = request.json().get("model")
-    print("requested model:", model_name)
-    path = request.url.path.replace("/proxy/", "/")
-    url = httpx.URL(path=path, query=request.url.query.encode("utf-8"))
+    for url in filter(None, INITIAL_UPSTREAMS.split(",")):
+        if find_server(url) is None:
+            uss.append(UpstreamServer(url=url.strip(), weight=None))
+    tasks = [asyncio.create_task(health_check_loop())]
+    if LOAD_POLL_INTERVAL > 0:
+        tasks.append(asyncio.create_task(load_poll_loop()))
+    yield
+    for task in tasks:
+        task.cancel()
+    await client.aclose()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+def _get_model_name(body: bytes):
+    try:
+        payload = json.loads(body)
+    except (ValueError, UnicodeDecodeError):
+        return None
+    return payload.get("model") if isinstance(payload, dict) else None
+
+
+def _forward_headers(headers):
+    return [
+        (key, value)
+        for key, value in headers.raw
+        if key.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS | {"host"}
+    ]
+
+
+async def _finish_request(r: httpx.Response, server: UpstreamServer, model_name):
+    await r.aclose()
+    policy.on_request_finish(server, model_name)
+
+
+@app.api_route("/proxy/{path:path}", methods=["GET", "POST"])
+@app.api_route("/v1/{path:path}", methods=["GET", "POST"])
+async def reverse_proxy(request: Request):
+    body = await request.body()
+    model_name = _get_model_name(body)
+    server = policy.select(model_name)
+    if server is None:
+        return JSONResponse({"error": "no healthy upstream"}, status_code=503)
+    path = request.url.path
+    if path.startswith("/proxy/"):
+        path = path[len("/proxy") :]
+    url = httpx.URL(f"{server.url}{path}", query=request.url.query.encode("utf-8"))
     req = client.build_request(
-        request.method, url, headers=request.headers.raw, content=request.stream()
+        request.method, url, headers=_forward_headers(request.headers), content=body
     )
-    r = await client.send(req, stream=True)
+    policy.on_request_start(server, model_name)
+    try:
+        r = await client.send(req, stream=True)
+    except httpx.TransportError as e:
+        policy.on_request_finish(server, model_name)
+        # the next health check decides when it gets traffic again
+        server.healthy = False
+        logger.warning(f"Proxying {model_name} to {server.url} failed: {e}")
+        return JSONResponse({"error": f"upstream {server.url} failed"}, status_code=502)
+    headers = {
+        key: value
+        for key, value in r.headers.items()
+        if key.lower() not in HOP_BY_HOP_HEADERS
+    }
+    # tokens are passed through as they arrive, without buffering
     return StreamingResponse(
         r.aiter_raw(),
         status_code=r.status_code,
-        headers=r.headers,
-        background=BackgroundTask(r.aclose),
+        headers=headers,
+        background=BackgroundTask(_finish_request, r, server, model_name),
     )
 
 
 @app.post("/register")
 async def register_upstream(request: UpstreamRegistrationRequest):
-    uss.append(UpstreamServer(url=request.ip_address, weight=request.weight))
+    server = find_server(request.ip_address)
+    if server is None:
+        server = UpstreamServer(url=request.ip_address, weight=request.weight)
+        uss.append(server)
+    else:
+        server.weight = request.weight
+    await check_health(server)
+    return {"url": server.url, "healthy": server.healthy}
+
+
+@app.post("/unregister")
+async def unregister_upstream(request: UpstreamRegistrationRequest):
+    server = find_server(request.ip_address)
+    if server is None:
+        return JSONResponse({"error": "unknown upstream"}, status_code=404)
+    # with consistent hashing, only the models it owned move elsewhere
+    uss.remove(server)
+    return {"url": server.url}
+
+
+@app.get("/upstreams")
+async def list_upstreams():
+    return [
+        {
+            "url": server.url,
+            "weight": server.weight,
+            "healthy": server.healthy,
+            "in_flight": server.in_flight,
+            "num_running": server.num_running,
+            "num_waiting": server.num_waiting,
+            "deltas": sorted(server.deltas),
+        }
+        for server in uss
+    ]
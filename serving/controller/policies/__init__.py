@@ -0,0 +1,16 @@
+from .consistent_hash import ConsistentHash
+from .core import Policy
+from .round_robin import RoundRobin
+from .shortest_queue import ShortestQueue
+
+POLICIES = {
+    "round-robin": RoundRobin,
+    "shortest-queue": ShortestQueue,
+    "consistent-hash": ConsistentHash,
+}
+
+
+def get_policy(name: str, **kwargs) -> Policy:
+    if name not in POLICIES:
+        raise ValueError(f"Unknown policy {name}, expected one of {list(POLICIES)}")
+    return POLICIES[name](**kwargs)
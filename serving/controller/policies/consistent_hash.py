@@ -0,0 +1,88 @@
+import bisect
+import hashlib
+import math
+from typing import List, Optional, Tuple
+
+from .core import Policy, UpstreamServer, healthy_servers
+
+
+def _hash(key: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class ConsistentHash(Policy):
+    """Shards models across upstreams with consistent hashing and bounded load.
+
+    Every upstream owns `virtual_nodes * capacity` points on a hash ring and a
+    model is placed on the upstream owning the first point after the model's
+    hash, so each replica only caches its share of the deltas. Adding or
+    removing an upstream moves only the models between its points and their
+    predecessors.
+
+    To keep hot models from overloading their owner, an upstream takes a
+    request only while it has fewer than `load_factor` times its fair share
+    of the in-flight requests; otherwise the walk continues to the next
+    upstream on the ring, which is the same one for every overflowing request
+    of that model.
+
+    Args:
+        virtual_nodes: Points per unit of upstream weight.
+        load_factor: Bound on the load of an upstream relative to the
+            average, must be >= 1.
+    """
+
+    def __init__(self, virtual_nodes: int = 100, load_factor: float = 1.25):
+        if virtual_nodes < 1:
+            raise ValueError(f"virtual_nodes must be >= 1, got {virtual_nodes}")
+        if load_factor < 1:
+            raise ValueError(f"load_factor must be >= 1, got {load_factor}")
+        self.virtual_nodes = virtual_nodes
+        self.load_factor = load_factor
+        self._members: Tuple[Tuple[int, float], ...] = ()
+        self._ring: List[Tuple[int, UpstreamServer]] = []
+        self._points: List[int] = []
+
+    def _build_ring(self, servers: List[UpstreamServer]):
+        members = tuple((id(server), server.capacity) for server in servers)
+        if members == self._members:
+            return
+        ring = []
+        for server in servers:
+            num_points = max(round(self.virtual_nodes * server.capacity), 1)
+            for i in range(num_points):
+                ring.append((_hash(f"{server.url}#{i}"), server))
+        ring.sort(key=lambda point: point[0])
+        self._ring = ring
+        self._points = [point for point, _ in ring]
+        self._members = members
+
+    def owners(self, model_name: str) -> List[UpstreamServer]:
+        """Healthy upstreams in ring order starting at `model_name`'s owner."""
+        servers = healthy_servers()
+        if not servers:
+            return []
+        self._build_ring(servers)
+        start = bisect.bisect(self._points, _hash(model_name))
+        owners: List[UpstreamServer] = []
+        for i in range(len(self._ring)):
+            server = self._ring[(start + i) % len(self._ring)][1]
+            if not any(owner is server for owner in owners):
+                owners.append(server)
+                if len(owners) == len(servers):
+                    break
+        return owners
+
+    def select(self, model_name: Optional[str]) -> Optional[UpstreamServer]:
+        owners = self.owners(model_name or "")
+        if not owners:
+            return None
+        total_load = sum(server.in_flight for server in owners) + 1
+        total_capacity = sum(server.capacity for server in owners)
+        for server in owners:
+            bound = math.ceil(
+                self.load_factor * total_load * server.capacity / total_capacity
+            )
+            if server.in_flight < bound:
+                return server
+        return owners[0]
@@ -1,10 +1,65 @@
-from typing import Optional
-from dataclasses import dataclass
+from typing import Optional, Set
+from dataclasses import dataclass, field
 
 uss = []
 
 
+def normalize_url(url: str) -> str:
+    """Upstreams register as `host:port`; the proxy needs a base URL."""
+    if not url.startswith(("http://", "https://")):
+        url = f"http://{url}"
+    return url.rstrip("/")
+
+
 @dataclass
 class UpstreamServer:
     url: str
     weight: Optional[float]
+    # updated by the controller's health checks and failed proxy attempts
+    healthy: bool = True
+    # requests proxied to the upstream that have not finished yet
+    in_flight: int = 0
+    # last reported by the upstream's /load endpoint, if polled
+    num_running: int = 0
+    num_waiting: int = 0
+    deltas: Set[str] = field(default_factory=set)
+
+    def __post_init__(self):
+        self.url = normalize_url(self.url)
+
+    @property
+    def capacity(self) -> float:
+        # None == uniform weight distribution
+        return self.weight if self.weight else 1.0
+
+    @property
+    def queue_length(self) -> int:
+        """Outstanding requests, as far as the controller knows."""
+        return max(self.in_flight, self.num_running + self.num_waiting)
+
+
+def healthy_servers():
+    return [server for server in uss if server.healthy]
+
+
+def find_server(url: str) -> Optional[UpstreamServer]:
+    url = normalize_url(url)
+    return next((server for server in uss if server.url == url), None)
+
+
+class Policy:
+    """Decides which upstream serves a request.
+
+    `select` is called once per request; the proxy then brackets the request
+    with `on_request_start` and `on_request_finish`, so that policies can
+    keep their own bookkeeping.
+    """
+
+    def select(self, model_name: Optional[str]) -> Optional[UpstreamServer]:
+        raise NotImplementedError
+
+    def on_request_start(self, server: UpstreamServer, model_name: Optional[str]):
+        server.in_flight += 1
+
+    def on_request_finish(self, server: UpstreamServer, model_name: Optional[str]):
+        server.in_flight = max(server.in_flight - 1, 0)
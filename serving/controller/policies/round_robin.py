@@ -1,9 +1,42 @@
-from .core import uss
+from typing import Dict, Optional
 
-index = 0
+from .core import Policy, UpstreamServer, healthy_servers, uss
 
 
-def map_model_to_server(model_name: str):
-    global index
-    server = uss[index]
-    index = (index + 1) % len(uss)
+class RoundRobin(Policy):
+    """Sends a model to the upstream it was last routed to, assigning new
+    models (and models whose upstream went away) weighted round robin.
+
+    Upstreams are picked in proportion to their weight with smooth weighted
+    round robin, which interleaves them instead of sending bursts to the
+    heaviest one.
+    """
+
+    def __init__(self):
+        # model -> the upstream that served it last, which likely still holds
+        # the delta in its GPU/CPU cache
+        self.affinity: Dict[str, UpstreamServer] = {}
+        # upstream url -> current weight of smooth weighted round robin
+        self.current: Dict[str, float] = {}
+
+    def _next_server(self) -> Optional[UpstreamServer]:
+        candidates = healthy_servers()
+        if not candidates:
+            return None
+        total = sum(server.capacity for server in candidates)
+        for server in candidates:
+            self.current[server.url] = (
+                self.current.get(server.url, 0.0) + server.capacity
+            )
+        server = max(candidates, key=lambda server: self.current[server.url])
+        self.current[server.url] -= total
+        return server
+
+    def select(self, model_name: Optional[str]) -> Optional[UpstreamServer]:
+        server = self.affinity.get(model_name)
+        if server is not None and server.healthy and any(s is server for s in uss):
+            return server
+        server = self._next_server()
+        if server is not None:
+            self.affinity[model_name] = server
+        return server
@@ -0,0 +1,65 @@
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from .core import Policy, UpstreamServer, healthy_servers
+
+
+class ShortestQueue(Policy):
+    """Routes to the upstream with the lowest expected completion time.
+
+    The estimate for an upstream is the time to drain its queue, plus the
+    time to load the delta if the upstream does not hold it:
+
+        (queue_length + 1) * service_time / capacity + cold * delta_load_time
+
+    `queue_length` counts the requests in flight through the controller, or
+    the running and waiting requests the upstream reported, whichever is
+    larger. An upstream holds a delta if it reported it in its last `/load`
+    poll, or if one of the last `recent_deltas` models routed to it was that
+    delta, since that one is loaded (or being loaded) already.
+
+    Args:
+        service_time: Seconds an upstream needs per queued request.
+        delta_load_time: Seconds to load a cold delta.
+        recent_deltas: Models remembered per upstream as recently routed.
+    """
+
+    def __init__(
+        self,
+        service_time: float = 1.0,
+        delta_load_time: float = 2.0,
+        recent_deltas: int = 8,
+    ):
+        self.service_time = service_time
+        self.delta_load_time = delta_load_time
+        self.recent_deltas = recent_deltas
+        # upstream url -> models recently routed to it, least recent first
+        self.recent: Dict[str, "OrderedDict[str, None]"] = {}
+
+    def is_warm(self, server: UpstreamServer, model_name: Optional[str]) -> bool:
+        if model_name is None:
+            return True
+        return model_name in server.deltas or model_name in self.recent.get(
+            server.url, {}
+        )
+
+    def expected_time(self, server: UpstreamServer, model_name: Optional[str]) -> float:
+        queueing = (server.queue_length + 1) * self.service_time / server.capacity
+        if self.is_warm(server, model_name):
+            return queueing
+        return queueing + self.delta_load_time
+
+    def select(self, model_name: Optional[str]) -> Optional[UpstreamServer]:
+        candidates = healthy_servers()
+        if not candidates:
+            return None
+        server = min(
+            candidates, key=lambda server: self.expected_time(server, model_name)
+        )
+        if model_name is not None:
+            recent = self.recent.setdefault(server.url, OrderedDict())
+            recent.pop(model_name, None)
+            recent[model_name] = None
+            while len(recent) > self.recent_deltas:
+                recent.popitem(last=False)
+        return server
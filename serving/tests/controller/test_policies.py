@@ -0,0 +1,91 @@
+import pytest
+
+from controller.policies import get_policy
+from controller.policies.core import UpstreamServer, uss
+
+
+@pytest.fixture
+def servers():
+    uss.clear()
+    uss.extend(
+        [
+            UpstreamServer(url="replica-0:8000", weight=None),
+            UpstreamServer(url="replica-1:8000", weight=None),
+        ]
+    )
+    yield uss
+    uss.clear()
+
+
+def test_round_robin_is_sticky(servers):
+    policy = get_policy("round-robin")
+    first = policy.select("delta-1")
+    second = policy.select("delta-2")
+    assert first is not second
+    assert policy.select("delta-1") is first
+    first.healthy = False
+    assert policy.select("delta-1") is second
+
+
+def test_round_robin_honours_weight(servers):
+    servers[0].weight = 3
+    policy = get_policy("round-robin")
+    picked = [policy.select(f"delta-{i}") for i in range(8)]
+    assert sum(server is servers[0] for server in picked) == 6
+    # heavier upstreams are interleaved, not picked in a burst
+    assert picked[:4].count(servers[1]) == 1
+
+
+def test_shortest_queue_balances_in_flight(servers):
+    policy = get_policy("shortest-queue", service_time=1.0, delta_load_time=0.0)
+    server = policy.select("delta-1")
+    policy.on_request_start(server, "delta-1")
+    other = policy.select("delta-1")
+    assert other is not server
+    policy.on_request_finish(server, "delta-1")
+    assert server.in_flight == 0
+
+
+def test_shortest_queue_prefers_warm_upstream(servers):
+    policy = get_policy("shortest-queue", service_time=1.0, delta_load_time=5.0)
+    servers[1].deltas = {"delta-1"}
+    servers[1].num_waiting = 3
+    # draining 3 more requests is cheaper than loading the delta
+    assert policy.select("delta-1") is servers[1]
+    servers[1].num_waiting = 6
+    assert policy.select("delta-1") is servers[0]
+    # now delta-1 is being loaded on replica-0 as well
+    assert policy.is_warm(servers[0], "delta-1")
+
+
+def test_no_healthy_upstream(servers):
+    for server in servers:
+        server.healthy = False
+    assert get_policy("shortest-queue").select("delta-1") is None
+    assert get_policy("round-robin").select("delta-1") is None
+
+
+def test_consistent_hash_moves_few_models(servers):
+    policy = get_policy("consistent-hash")
+    models = [f"delta-{i}" for i in range(200)]
+    before = {model: policy.select(model).url for model in models}
+    assert len(set(before.values())) == 2
+    servers.append(UpstreamServer(url="replica-2:8000", weight=None))
+    after = {model: policy.select(model).url for model in models}
+    moved = [model for model in models if before[model] != after[model]]
+    # only models now owned by the new upstream move
+    assert all(after[model] == servers[2].url for model in moved)
+    assert 0 < len(moved) < len(models) / 2
+    servers.pop()
+    assert {model: policy.select(model).url for model in models} == before
+
+
+def test_consistent_hash_bounds_load(servers):
+    policy = get_policy("consistent-hash", load_factor=1.0)
+    owner = policy.select("delta-1")
+    policy.on_request_start(owner, "delta-1")
+    # the owner already has its fair share, the hot model spills over
+    spill = policy.select("delta-1")
+    assert spill is not owner
+    policy.on_request_start(spill, "delta-1")
+    assert policy.select("delta-1") is owner
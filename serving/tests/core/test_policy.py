@@ -0,0 +1,84 @@
+from typing import Optional
+
+import pytest
+
+from vllm import SamplingParams
+from vllm.core.policy import DeltaAffinity, PolicyFactory
+from vllm.delta.request import DeltaRequest
+from vllm.sequence import Sequence, SequenceGroup
+
+
+def create_delta_group(
+    request_id: int, delta_int_id: int, arrival_time: float
+) -> SequenceGroup:
+    delta_request: Optional[DeltaRequest] = None
+    if delta_int_id > 0:
+        delta_request = DeltaRequest(
+            f"delta-{delta_int_id}", delta_int_id, f"/deltas/{delta_int_id}"
+        )
+    prompt = Sequence(request_id, "0 1 2 3", [0, 1, 2, 3], 4)
+    return SequenceGroup(
+        str(request_id),
+        [prompt],
+        SamplingParams(),
+        arrival_time,
+        delta_request=delta_request,
+    )
+
+
+def _order(seq_groups):
+    return [int(seq_group.request_id) for seq_group in seq_groups]
+
+
+def test_factory_passes_max_wait():
+    policy = PolicyFactory.get_policy("delta-affinity", max_wait=3.0)
+    assert isinstance(policy, DeltaAffinity)
+    assert policy.max_wait == 3.0
+    with pytest.raises(ValueError):
+        DeltaAffinity(max_wait=-1)
+
+
+def test_resident_deltas_first():
+    policy = DeltaAffinity(max_wait=100)
+    now = 10.0
+    seq_groups = [
+        create_delta_group(0, 3, arrival_time=1.0),  # on disk, oldest
+        create_delta_group(1, 2, arrival_time=2.0),  # in the CPU cache
+        create_delta_group(2, 1, arrival_time=3.0),  # in a GPU slot
+        create_delta_group(3, 0, arrival_time=4.0),  # base model
+    ]
+    ordered = policy.sort_by_priority(
+        now, seq_groups, available_deltas=[1, 2], running_deltas={1}
+    )
+    assert _order(ordered) == [2, 3, 1, 0]
+
+
+def test_requests_of_a_delta_are_grouped():
+    policy = DeltaAffinity(max_wait=100)
+    now = 10.0
+    seq_groups = [
+        create_delta_group(0, 1, arrival_time=1.0),
+        create_delta_group(1, 2, arrival_time=2.0),
+        create_delta_group(2, 1, arrival_time=3.0),
+        create_delta_group(3, 2, arrival_time=4.0),
+        create_delta_group(4, 1, arrival_time=5.0),
+    ]
+    ordered = policy.sort_by_priority(now, seq_groups, available_deltas=[])
+    # delta 1 has the oldest request, so its whole group goes first
+    assert _order(ordered) == [0, 2, 4, 1, 3]
+
+
+def test_starving_requests_go_first():
+    policy = DeltaAffinity(max_wait=5.0)
+    now = 10.0
+    seq_groups = [
+        create_delta_group(0, 1, arrival_time=9.0),
+        create_delta_group(1, 3, arrival_time=4.0),  # waited 6s
+        create_delta_group(2, 4, arrival_time=2.0),  # waited 8s
+    ]
+    ordered = policy.sort_by_priority(
+        now, seq_groups, available_deltas=[1], running_deltas={1}
+    )
+    assert _order(ordered) == [2, 1, 0]
+    assert policy.is_starving(now, seq_groups[1])
+    assert not policy.is_starving(now, seq_groups[0])
@@ -0,0 +1,108 @@
+import pytest
+
+from vllm.config import CacheConfig, SchedulerConfig
+from vllm.core.simulator import DeltaCacheModel, LinearCostModel, Simulator
+from vllm.delta.config import DeltaConfig
+
+
+def create_simulator(max_deltas=1, max_cpu_deltas=2, enable_prefetch=False):
+    scheduler_config = SchedulerConfig(256, 16, 256)
+    cache_config = CacheConfig(16, 1.0, 1, "auto")
+    cache_config.num_gpu_blocks = 256
+    cache_config.num_cpu_blocks = 64
+    delta_config = DeltaConfig(max_deltas=max_deltas, max_cpu_deltas=max_cpu_deltas)
+    return Simulator(
+        scheduler_config,
+        cache_config,
+        delta_config,
+        LinearCostModel(),
+        ["delta-1", "delta-2", "delta-3"],
+        enable_prefetch=enable_prefetch,
+    )
+
+
+def create_requests(models, gap=0.0, max_tokens=8):
+    return [
+        {
+            "request_id": str(i),
+            "model": model,
+            "prompt_len": 32,
+            "max_tokens": max_tokens,
+            "arrival_time": i * gap,
+        }
+        for i, model in enumerate(models)
+    ]
+
+
+def test_cache_model_lru():
+    cache = DeltaCacheModel(max_deltas=1, max_cpu_deltas=2)
+    assert cache.add_cpu(1)
+    assert cache.activate(1)
+    assert not cache.activate(1)
+    assert cache.add_cpu(2)
+    # 1 is on the GPU, a prefetch may not evict it
+    assert cache.add_cpu(2)
+    assert not cache.add_cpu(3, evict_active=False, pinned=[2])
+    assert cache.add_cpu(3, pinned=[2])
+    assert cache.list_deltas() == {2, 3}
+    assert not cache.gpu
+    with pytest.raises(ValueError):
+        DeltaCacheModel(max_deltas=2, max_cpu_deltas=1)
+
+
+def test_all_requests_finish_with_ordered_metrics():
+    simulator = create_simulator()
+    requests = create_requests(
+        ["delta-1", "delta-2", "base-model", "delta-1", "delta-3"], gap=0.01
+    )
+    finished = simulator.run(requests)
+    assert len(finished) == len(requests)
+    results = simulator.get_results()
+    assert [r["response"]["id"] for r in results] == ["0", "1", "2", "3", "4"]
+    for result in results:
+        metrics = result["response"]["metrics"][0]
+        assert result["response"]["usage"]["completion_tokens"] == 8
+        assert metrics["arrival_time"] <= metrics["first_scheduled_time"]
+        assert metrics["first_scheduled_time"] <= metrics["first_token_time"]
+        assert metrics["first_token_time"] <= metrics["finished_time"]
+        if result["response"]["model"] == "base-model":
+            assert metrics["cpu_loading_time"] is None
+        else:
+            assert metrics["cpu_loading_time"] <= metrics["gpu_loading_time"]
+            assert metrics["gpu_loading_time"] <= metrics["first_token_time"]
+    assert simulator.deltas.stats["disk_loads"] == 3
+
+
+def test_max_deltas_is_respected():
+    simulator = create_simulator(max_deltas=1, max_cpu_deltas=3)
+    simulator.run(create_requests(["delta-1", "delta-2", "delta-3"]))
+    results = simulator.get_results()
+    spans = sorted(
+        (
+            r["response"]["metrics"][0]["first_scheduled_time"],
+            r["response"]["metrics"][0]["finished_time"],
+        )
+        for r in results
+    )
+    # one delta slot, so requests of different deltas never overlap
+    for (_, end), (start, _) in zip(spans, spans[1:]):
+        assert end <= start
+
+
+def test_prefetch_hides_disk_loads():
+    models = ["delta-1", "delta-2", "delta-3"]
+    ttfts = []
+    for enable_prefetch in [False, True]:
+        simulator = create_simulator(
+            max_deltas=1, max_cpu_deltas=3, enable_prefetch=enable_prefetch
+        )
+        simulator.run(create_requests(models, max_tokens=64))
+        metrics = [r["response"]["metrics"][0] for r in simulator.get_results()]
+        ttfts.append(sum(m["first_token_time"] - m["arrival_time"] for m in metrics))
+    assert ttfts[1] < ttfts[0]
+
+
+def test_unknown_model():
+    simulator = create_simulator()
+    with pytest.raises(ValueError):
+        simulator.add_request("0", "delta-9", 4, 4, 0.0)
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+from vllm.delta.disk_cache import ENTRY_MARKER_FILENAME, LocalDiskDeltaCache
+
+
+def _make_delta(root, name: str, nbytes: int) -> str:
+    path = os.path.join(root, "remote", name)
+    os.makedirs(path)
+    with open(os.path.join(path, "config.json"), "w") as fp:
+        fp.write("{}")
+    with open(os.path.join(path, "deltazip-compressed.safetensors"), "wb") as fp:
+        fp.write(b"\0" * (nbytes - 2))
+    return path
+
+
+def test_miss_fills_and_hit_returns_local_copy(tmp_path):
+    source = _make_delta(tmp_path, "delta-1", 100)
+    cache = LocalDiskDeltaCache(str(tmp_path / "cache"), capacity_bytes=1000)
+    assert cache.acquire(source) is None
+    cache.wait_for_fills()
+    local_path = cache.acquire(source)
+    assert local_path is not None and local_path != source
+    assert sorted(os.listdir(local_path)) == sorted(
+        os.listdir(source) + [ENTRY_MARKER_FILENAME]
+    )
+    cache.release(source)
+    assert (cache.num_hits, cache.num_misses) == (1, 1)
+
+
+def test_second_hit_admission(tmp_path):
+    source = _make_delta(tmp_path, "delta-1", 100)
+    cache = LocalDiskDeltaCache(
+        str(tmp_path / "cache"), capacity_bytes=1000, admission="second-hit"
+    )
+    assert cache.acquire(source) is None
+    cache.wait_for_fills()
+    assert source not in cache
+    assert cache.acquire(source) is None
+    cache.wait_for_fills()
+    assert source in cache
+
+
+def test_lru_eviction_skips_pinned_entries(tmp_path):
+    sources = [_make_delta(tmp_path, f"delta-{i}", 100) for i in range(3)]
+    cache = LocalDiskDeltaCache(str(tmp_path / "cache"), capacity_bytes=250)
+    for source in sources[:2]:
+        cache.acquire(source)
+        cache.wait_for_fills()
+    # delta-0 is being read, so delta-1 is evicted even though it is newer
+    assert cache.acquire(sources[0]) is not None
+    cache.acquire(sources[2])
+    cache.wait_for_fills()
+    assert sources[0] in cache
+    assert sources[1] not in cache
+    assert sources[2] in cache
+    assert cache.used_bytes <= 250
+    cache.release(sources[0])
+
+
+def test_entries_survive_restart(tmp_path):
+    source = _make_delta(tmp_path, "delta-1", 100)
+    cache_dir = str(tmp_path / "cache")
+    cache = LocalDiskDeltaCache(cache_dir, capacity_bytes=1000)
+    cache.acquire(source)
+    cache.wait_for_fills()
+    cache.shutdown()
+    os.makedirs(os.path.join(cache_dir, "partial.tmp-0"))
+    restarted = LocalDiskDeltaCache(cache_dir, capacity_bytes=1000)
+    assert source in restarted
+    assert not any(".tmp-" in name for name in os.listdir(cache_dir))
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        LocalDiskDeltaCache(str(tmp_path), capacity_bytes=0)
+    with pytest.raises(ValueError):
+        LocalDiskDeltaCache(str(tmp_path), capacity_bytes=10, admission="never")
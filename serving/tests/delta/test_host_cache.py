@@ -0,0 +1,72 @@
+import pytest
+
+from vllm.delta.host_cache import GreedyDualSizeCache, PinnedSlab
+from vllm.delta.loader import SLAB_ALIGNMENT
+
+
+def test_slab_allocate_and_coalesce():
+    slab = PinnedSlab(4 * SLAB_ALIGNMENT, pin_memory=False)
+    a = slab.allocate(SLAB_ALIGNMENT)
+    b = slab.allocate(SLAB_ALIGNMENT - 1)
+    c = slab.allocate(2 * SLAB_ALIGNMENT)
+    assert (a, b, c) == (0, SLAB_ALIGNMENT, 2 * SLAB_ALIGNMENT)
+    assert slab.free_bytes == 0
+    assert slab.allocate(1) is None
+
+    slab.free(a)
+    slab.free(c)
+    # two free blocks, neither large enough for 3 aligned units
+    assert not slab.can_allocate(3 * SLAB_ALIGNMENT)
+    slab.free(b)
+    # everything merged back into a single block
+    assert slab.largest_free_block == 4 * SLAB_ALIGNMENT
+    assert slab.allocate(4 * SLAB_ALIGNMENT) == 0
+
+
+def test_slab_views_do_not_overlap():
+    slab = PinnedSlab(2 * SLAB_ALIGNMENT, pin_memory=False)
+    a = slab.allocate(10)
+    b = slab.allocate(10)
+    slab.view(a, 10).fill_(1)
+    slab.view(b, 10).fill_(2)
+    assert slab.view(a, 10).eq(1).all()
+    assert slab.view(b, 10).eq(2).all()
+
+
+def test_slab_rejects_empty_capacity():
+    with pytest.raises(ValueError):
+        PinnedSlab(0, pin_memory=False)
+
+
+def _evicted(cache):
+    removed = []
+    cache._on_remove = lambda key, value: removed.append(key)
+    return removed
+
+
+def test_gds_uniform_sizes_is_lru():
+    cache = GreedyDualSizeCache(3, size_fn=lambda value: 1)
+    removed = _evicted(cache)
+    for key in range(3):
+        cache.put(key, key)
+    cache.touch(0)
+    cache.put(3, 3)
+    cache.put(4, 4)
+    assert removed == [1, 2]
+
+
+def test_gds_prefers_evicting_large_entries():
+    sizes = {"small": 1, "large": 4, "medium": 2}
+    cache = GreedyDualSizeCache(10, size_fn=lambda value: sizes[value])
+    removed = _evicted(cache)
+    cache.put("large", "large")
+    cache.put("small", "small")
+    cache.put("medium", "medium")
+    assert cache.eviction_order() == ["large", "medium", "small"]
+    cache.remove_oldest()
+    assert removed == ["large"]
+    # inflation ages out entries that are not hit again
+    assert cache.inflation == pytest.approx(1 / 4)
+    cache.put("large", "large")
+    cache.touch("medium")
+    assert cache.eviction_order()[0] == "large"
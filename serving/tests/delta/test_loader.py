@@ -0,0 +1,102 @@
+import pytest
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+from vllm.delta.config import CompressionConfig
+from vllm.delta.loader import (
+    MmapSafetensorsReader,
+    assemble_delta_weights,
+    combine_load_stats,
+    is_rank_local,
+    load_tensors_mmap,
+    read_safetensors_header,
+)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    tensors = {
+        "model.layers.0.self_attn.qkv_proj.0.qweight": torch.randint(
+            -(2**31), 2**31 - 1, (64, 48), dtype=torch.int32
+        ),
+        "model.layers.0.self_attn.qkv_proj.0.scales": torch.randn(
+            1, 96, dtype=torch.float16
+        ),
+        # odd element count so that the next tensor starts misaligned
+        "model.layers.0.self_attn.qkv_proj.0.meta": torch.randint(
+            0, 100, (3,), dtype=torch.int16
+        ),
+        "model.layers.0.self_attn.qkv_proj.1.qweight": torch.randint(
+            -(2**31), 2**31 - 1, (64, 48), dtype=torch.int32
+        ),
+        "model.embed_tokens.0.weight": torch.randn(32, 16, dtype=torch.float16),
+    }
+    path = str(tmp_path / "deltazip-compressed.safetensors")
+    save_file(tensors, path)
+    return path, tensors
+
+
+def test_read_header(checkpoint):
+    path, tensors = checkpoint
+    infos = read_safetensors_header(path)
+    assert set(infos) == set(tensors)
+    for name, tensor in tensors.items():
+        assert infos[name].dtype == tensor.dtype
+        assert infos[name].shape == tuple(tensor.shape)
+        assert infos[name].nbytes == tensor.nbytes
+
+
+def test_reader_matches_safe_open(checkpoint):
+    path, _ = checkpoint
+    with safe_open(path, "pt") as f, MmapSafetensorsReader(path) as reader:
+        assert sorted(reader.keys()) == sorted(f.keys())
+        for key in f.keys():
+            assert torch.equal(reader.get_tensor(key), f.get_tensor(key))
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_load_tensors_mmap(checkpoint, lazy):
+    path, tensors = checkpoint
+    loaded, stats = load_tensors_mmap(
+        path, key_filter=lambda key: key.rsplit(".", 2)[1] == "0", lazy=lazy
+    )
+    expected = {k: v for k, v in tensors.items() if k.rsplit(".", 2)[1] == "0"}
+    assert set(loaded) == set(expected)
+    for name, tensor in expected.items():
+        assert torch.equal(loaded[name], tensor)
+    assert stats.num_tensors == len(expected)
+    assert stats.total_bytes == sum(t.nbytes for t in expected.values())
+    assert stats.load_mode == ("mmap_lazy" if lazy else "mmap")
+    assert stats.peak_rss > 0
+
+
+def test_combine_load_stats(checkpoint):
+    path, tensors = checkpoint
+    # one part per shard index, together they cover the whole file
+    parts = [
+        load_tensors_mmap(
+            path, key_filter=lambda key, shard=shard: key.rsplit(".", 2)[1] == shard
+        )[1]
+        for shard in ("0", "1")
+    ]
+    stats = combine_load_stats(parts)
+    assert stats.num_tensors == len(tensors)
+    assert stats.total_bytes == sum(t.nbytes for t in tensors.values())
+    assert stats.elapsed == sum(part.elapsed for part in parts)
+
+
+def test_assemble_rank_local_weights(checkpoint):
+    path, tensors = checkpoint
+    tensors = dict(tensors)
+    tensors["model.layers.0.self_attn.qkv_proj.0.g_idx"] = torch.arange(4)
+    rank_local = {k: v for k, v in tensors.items() if is_rank_local(k, 0)}
+    # other ranks and tensors the kernels do not use are skipped
+    assert "model.layers.0.self_attn.qkv_proj.1.qweight" not in rank_local
+    assert "model.layers.0.self_attn.qkv_proj.0.g_idx" not in rank_local
+    modules = assemble_delta_weights(rank_local, 0, CompressionConfig(bits=4))
+    assert set(modules) == {"model.layers.0.self_attn.qkv_proj", "model.embed_tokens"}
+    qkv = modules["model.layers.0.self_attn.qkv_proj"]
+    assert qkv._compressed
+    assert set(qkv.tensors()) == {"qweight", "scales", "meta"}
+    assert not modules["model.embed_tokens"]._compressed
@@ -0,0 +1,86 @@
+import random
+from dataclasses import dataclass
+from typing import Tuple
+
+import pytest
+import torch
+
+from vllm.delta.mapping import SlotTable, convert_mapping
+
+
+@dataclass
+class Mapping:
+    index_mapping: Tuple[int, ...]
+    prompt_mapping: Tuple[int, ...]
+
+
+def _reference_convert_mapping(mapping, index_to_id, max_models, vocab_size,
+                               extra_vocab_size):
+    # the per-token implementation that convert_mapping replaces
+    indices = list(mapping.index_mapping)
+    embedding_indices = indices.copy()
+    model_indices = indices.copy()
+    prompt_mapping = [
+        index_to_id.index(x) if x > 0 else -1 for x in mapping.prompt_mapping
+    ]
+    for i in range(len(indices)):
+        idx = index_to_id.index(indices[i]) if indices[i] > 0 else -1
+        embedding_indices[i] = idx if indices[i] > 0 else 0
+        indices[i] = i
+        model_indices[i] = idx
+    indices = torch.tensor([indices, model_indices, embedding_indices],
+                           dtype=torch.long)
+    prompt_mapping = torch.tensor(prompt_mapping, dtype=torch.long)
+    embeddings_indices = torch.stack([
+        indices[2] * extra_vocab_size,
+        indices[2] * (vocab_size + extra_vocab_size)
+    ])
+    sampler_indices_padded = prompt_mapping.clone()
+    sampler_indices_padded[sampler_indices_padded == -1] = max_models - 1
+    sampler_indices_padded = torch.arange(
+        0, len(sampler_indices_padded),
+        dtype=torch.long) + (sampler_indices_padded *
+                             len(sampler_indices_padded))
+    return indices[1], prompt_mapping, sampler_indices_padded, embeddings_indices
+
+
+def test_slot_table_behaves_like_list():
+    table = SlotTable(4)
+    assert list(table) == [None] * 4
+    table[1] = 7
+    table[3] = 200
+    assert table == [None, 7, None, 200]
+    assert table.index(200) == 3
+    table[3] = None
+    with pytest.raises(ValueError):
+        table.index(200)
+    first_free = next(i for i, model_id in enumerate(table) if model_id is None)
+    assert first_free == 0
+    version = table.version
+    table.reset()
+    assert table == [None] * 4
+    assert table.version > version
+
+
+@pytest.mark.parametrize("num_tokens", [0, 1, 17, 512])
+@pytest.mark.parametrize("extra_vocab_size", [0, 256])
+def test_convert_mapping_matches_reference(num_tokens, extra_vocab_size):
+    random.seed(num_tokens)
+    slot_to_id = [3, None, 1000, 12]
+    ids = [0] + [model_id for model_id in slot_to_id if model_id is not None]
+    mapping = Mapping(
+        index_mapping=tuple(random.choice(ids) for _ in range(num_tokens)),
+        prompt_mapping=tuple(random.choice(ids) for _ in range(num_tokens // 4)),
+    )
+    args = (len(slot_to_id) + 1, 32000, extra_vocab_size)
+    expected = _reference_convert_mapping(mapping, slot_to_id, *args)
+    actual = convert_mapping(mapping, SlotTable.from_list(slot_to_id), *args)
+    for e, a in zip(expected, actual[:4]):
+        assert torch.equal(e, a)
+    assert actual[4] == tuple(t.shape[-1] for t in actual[:4])
+
+
+def test_convert_mapping_unknown_id():
+    mapping = Mapping(index_mapping=(1, 2), prompt_mapping=(2, ))
+    with pytest.raises(ValueError):
+        convert_mapping(mapping, SlotTable.from_list([1, None]), 3, 100, 0)
@@ -0,0 +1,106 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+import torch
+import torch.nn as nn
+
+from vllm.delta.pipeline import (
+    DeltaCopyPipeline,
+    SyncEvent,
+    delta_layer_index,
+    group_modules_by_layer,
+)
+
+
+def test_layer_index():
+    assert delta_layer_index("model.layers.11.mlp.down_proj") == 11
+    assert delta_layer_index("layers.0.self_attn.qkv_proj") == 0
+    assert delta_layer_index("model.embed_tokens") == -1
+    assert delta_layer_index("lm_head") == math.inf
+
+
+def test_groups_follow_forward_order():
+    names = [
+        "lm_head",
+        "model.layers.10.mlp.down_proj",
+        "model.layers.2.self_attn.qkv_proj",
+        "model.embed_tokens",
+        "model.layers.2.mlp.down_proj",
+    ]
+    modules = {name: nn.Linear(2, 2) for name in names}
+    groups = group_modules_by_layer(modules)
+    assert [layer for layer, _ in groups] == [-1, 2, 10, math.inf]
+    assert [name for name, _ in groups[1][1]] == [
+        "model.layers.2.self_attn.qkv_proj",
+        "model.layers.2.mlp.down_proj",
+    ]
+
+
+def test_cpu_fallback_copies_synchronously():
+    names = [f"model.layers.{i}.mlp.down_proj" for i in (3, 0, 1)]
+    modules = {name: nn.Linear(4, 4, bias=False) for name in names}
+    sources = {name: torch.full((4, 4), float(i)) for i, name in enumerate(names)}
+    pipeline = DeltaCopyPipeline(use_cuda=False)
+    copied = []
+
+    def copy_fn(module_name, module):
+        with torch.no_grad():
+            module.weight.copy_(sources[module_name])
+        copied.append(module_name)
+
+    last_event = pipeline.copy(group_modules_by_layer(modules), copy_fn)
+    assert pipeline.last_order == [0, 1, 3]
+    assert copied == [names[1], names[2], names[0]]
+    assert isinstance(last_event, SyncEvent) and last_event.query()
+    for name, module in modules.items():
+        # the copy already landed when the layer gets to wait on it
+        assert isinstance(module.copy_event, SyncEvent)
+        assert torch.equal(module.weight, sources[name])
+    # each layer gets its own event
+    assert modules[names[0]].copy_event is last_event
+    assert modules[names[1]].copy_event is not last_event
+
+
+def test_marlin_layer_waits_on_its_copy(monkeypatch):
+    layers_marlin = pytest.importorskip("vllm.delta.layers_marlin")
+    monkeypatch.setattr(
+        layers_marlin, "get_tensor_model_parallel_world_size", lambda: 1
+    )
+    weight = torch.zeros(64, 64, dtype=torch.float16)
+    base_layer = SimpleNamespace(
+        weight=weight, bias=None, linear_weights={"weight": weight}
+    )
+    layer = layers_marlin.RowParallelLinearWithDelta(base_layer)
+    layer.create_delta_weights(
+        2,
+        SimpleNamespace(pack_factor=8, sparse_factor=2, delta_dtype=torch.int32),
+    )
+    layer.set_mapping(torch.zeros(4, dtype=torch.long), None, None, None, [4])
+    qweight = torch.randint(0, 100, layer.qweight_stacked.shape[1:], dtype=torch.int32)
+
+    def copy_fn(module_name, module):
+        module.set_delta(
+            1,
+            4,
+            qweight,
+            None,
+            torch.ones(layer.scales_stacked.shape[1:], dtype=torch.float16),
+            None,
+            torch.ones(layer.meta_stacked.shape[1:], dtype=torch.int16),
+        )
+
+    DeltaCopyPipeline(use_cuda=False).copy(
+        group_modules_by_layer({"model.layers.0.mlp.down_proj": layer}), copy_fn
+    )
+    assert layer.copy_event is not None
+
+    def apply_delta(x, qweight_stacked, *args):
+        # the slot is only read once the layer waited on its copy
+        assert layer.copy_event is None
+        assert torch.equal(qweight_stacked[1], qweight)
+        return x
+
+    monkeypatch.setattr(layers_marlin, "apply_delta", apply_delta)
+    layer.apply_weights(torch.zeros(4, 64, dtype=torch.float16))
+    assert layer.copy_event is None
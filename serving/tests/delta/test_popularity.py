@@ -0,0 +1,134 @@
+import pytest
+
+from vllm.delta.popularity import (
+    EWMAPopularity,
+    MarkovPopularity,
+    PredictivePrefetcher,
+    get_popularity_model,
+)
+from vllm.delta.request import DeltaRequest
+
+
+def _request(delta_int_id: int) -> DeltaRequest:
+    return DeltaRequest(
+        f"delta-{delta_int_id}", delta_int_id, f"/deltas/{delta_int_id}"
+    )
+
+
+def test_ewma_decays():
+    model = EWMAPopularity(half_life=10.0)
+    model.observe(1, now=0.0)
+    model.observe(1, now=0.0)
+    model.observe(2, now=10.0)
+    scores = model.scores(now=10.0)
+    assert scores[1] == pytest.approx(1.0)
+    assert scores[2] == pytest.approx(1.0)
+    assert model.scores(now=20.0)[2] == pytest.approx(0.5)
+
+
+def test_markov_follows_transitions():
+    model = get_popularity_model("markov", decay=1.0)
+    assert isinstance(model, MarkovPopularity)
+    for delta_int_id in [1, 2, 1, 2, 1, 3, 1]:
+        model.observe(delta_int_id, now=0.0)
+    scores = model.scores(now=0.0)
+    assert scores[2] == pytest.approx(2 / 3)
+    assert scores[3] == pytest.approx(1 / 3)
+    with pytest.raises(ValueError):
+        get_popularity_model("lfu")
+
+
+def test_prefetcher_budget_hits_and_waste():
+    prefetched = []
+    sizes = {1: 100, 2: 100, 3: 300}
+    prefetcher = PredictivePrefetcher(
+        EWMAPopularity(half_life=1000.0),
+        prefetch_fn=lambda request, priority: not prefetched.append(
+            request.delta_int_id
+        ),
+        size_fn=lambda request: sizes[request.delta_int_id],
+        budget_bytes=250,
+    )
+    for delta_int_id in [3, 3, 3, 1, 2]:
+        prefetcher.observe(_request(delta_int_id), now=0.0)
+    # delta 3 is the most popular but never fits the budget
+    assert 3 not in prefetched
+    assert prefetched == [1]
+    assert prefetcher.outstanding_deltas() == [1]
+
+    # delta 1 was predicted, so this is a hit
+    prefetcher.observe(_request(1), now=1.0)
+    assert prefetcher.stats.num_hits == 1
+    assert prefetcher.stats.hit_rate == pytest.approx(1.0)
+    assert prefetched == [1, 2]
+
+    assert prefetcher.outstanding_bytes <= 250
+    assert prefetcher.stats.bytes_prefetched == 200
+    assert prefetcher.stats.wasted_bytes == 0
+
+
+def test_prefetcher_gives_up_stale_predictions():
+    prefetcher = PredictivePrefetcher(
+        EWMAPopularity(half_life=1.0),
+        prefetch_fn=lambda request, priority: True,
+        size_fn=lambda request: 10,
+        budget_bytes=10,
+    )
+    prefetcher.observe(_request(1), now=0.0)
+    prefetcher.observe(_request(2), now=0.0)
+    assert prefetcher.outstanding_deltas() == [1]
+    # delta 3 is hot now, delta 1 is given up without being requested
+    prefetcher.observe(_request(3), now=50.0)
+    assert prefetcher.stats.wasted_bytes == 10
+    assert prefetcher.stats.hit_rate == pytest.approx(0.0)
+    # delta 2 replaced delta 1 and is requested next
+    assert prefetcher.outstanding_deltas() == [2]
+    prefetcher.observe(_request(2), now=50.0)
+    assert prefetcher.outstanding_deltas() == [3]
+    assert prefetcher.stats.num_prefetched == 3
+    assert prefetcher.stats.hit_rate == pytest.approx(0.5)
+
+
+def test_prefetcher_cancels_given_up_predictions():
+    cancelled = []
+    prefetcher = PredictivePrefetcher(
+        EWMAPopularity(half_life=1.0),
+        prefetch_fn=lambda request, priority: True,
+        size_fn=lambda request: 10,
+        budget_bytes=10,
+        # delta 1 is still queued, nothing of it was read
+        cancel_fn=lambda delta_int_id: not cancelled.append(delta_int_id),
+    )
+    prefetcher.observe(_request(1), now=0.0)
+    prefetcher.observe(_request(2), now=0.0)
+    assert prefetcher.outstanding_deltas() == [1]
+    prefetcher.observe(_request(3), now=50.0)
+    assert cancelled == [1]
+    assert prefetcher.stats.num_given_up == 1
+    assert prefetcher.stats.wasted_bytes == 0
+
+
+def test_prefetcher_skips_deltas_not_queued():
+    cached = {1}
+    prefetcher = PredictivePrefetcher(
+        EWMAPopularity(half_life=1000.0),
+        # a resident delta is not loaded again
+        prefetch_fn=lambda request, priority: request.delta_int_id not in cached,
+        size_fn=lambda request: 10,
+        budget_bytes=100,
+        is_cached_fn=lambda delta_int_id: delta_int_id in cached,
+    )
+    for _ in range(3):
+        prefetcher.observe(_request(1), now=0.0)
+    assert prefetcher.outstanding_deltas() == []
+    assert prefetcher.stats.num_prefetched == 0
+    assert prefetcher.stats.num_hits == 0
+
+    prefetcher.observe(_request(2), now=0.0)
+    prefetcher.observe(_request(3), now=0.0)
+    assert prefetcher.outstanding_deltas() == [2]
+    # the load of delta 2 was not admitted to the cache, no hit
+    prefetcher.observe(_request(2), now=1.0)
+    assert prefetcher.stats.num_hits == 0
+    assert prefetcher.stats.num_given_up == 1
+    assert prefetcher.stats.wasted_bytes == 10
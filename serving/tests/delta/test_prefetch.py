@@ -0,0 +1,121 @@
+import threading
+import time
+
+from vllm.delta.prefetch import DeltaPrefetcher
+from vllm.delta.request import DeltaRequest
+
+
+class FakeCache:
+
+    def __init__(self, capacity=8, block=None):
+        self.capacity = capacity
+        self.cache = {}
+        self.load_order = []
+        self.lock = threading.Lock()
+        self.block = block
+
+    def load(self, delta_request, pause_event, discard_event):
+        if self.block is not None:
+            self.block.wait()
+        if discard_event.is_set():
+            return None
+        with self.lock:
+            self.load_order.append(delta_request.delta_int_id)
+        return delta_request.delta_int_id
+
+    def add(self, delta_id):
+        with self.lock:
+            if len(self.cache) >= self.capacity:
+                return False
+            self.cache[delta_id] = True
+            return True
+
+    def is_cached(self, delta_id):
+        with self.lock:
+            return delta_id in self.cache
+
+
+def _request(delta_id):
+    return DeltaRequest(f"delta-{delta_id}", delta_id, f"/tmp/delta-{delta_id}")
+
+
+def _make_prefetcher(cache, num_workers=1):
+    return DeltaPrefetcher(
+        load_fn=cache.load,
+        add_fn=cache.add,
+        is_cached_fn=cache.is_cached,
+        num_workers=num_workers,
+    )
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_priority_order():
+    gate = threading.Event()
+    cache = FakeCache(block=gate)
+    prefetcher = _make_prefetcher(cache)
+    # the first job blocks the only worker while the rest are queued
+    prefetcher.submit(_request(1), priority=0)
+    prefetcher.submit(_request(2), priority=3)
+    prefetcher.submit(_request(3), priority=1)
+    prefetcher.submit(_request(4), priority=2)
+    prefetcher.start()
+    gate.set()
+    _wait_until(lambda: len(cache.cache) == 4)
+    prefetcher.stop()
+    assert cache.load_order == [1, 3, 4, 2]
+
+
+def test_supersede_and_dedupe():
+    cache = FakeCache()
+    prefetcher = _make_prefetcher(cache)
+    assert prefetcher.submit(_request(1), priority=10)
+    # same or worse priority is a no-op
+    assert not prefetcher.submit(_request(1), priority=10)
+    assert not prefetcher.submit(_request(1), priority=20)
+    # better priority supersedes the queued job
+    assert prefetcher.submit(_request(1), priority=5)
+    assert len(prefetcher) == 1
+    assert prefetcher.queued_delta_ids() == [1]
+
+
+def test_cancel_queued_job():
+    cache = FakeCache()
+    prefetcher = _make_prefetcher(cache)
+    prefetcher.submit(_request(1))
+    prefetcher.submit(_request(2))
+    prefetcher.cancel(1)
+    assert prefetcher.queued_delta_ids() == [2]
+    prefetcher.start()
+    _wait_until(lambda: cache.is_cached(2))
+    prefetcher.stop()
+    assert 1 not in cache.cache
+
+
+def test_full_cache_does_not_stop_workers():
+    cache = FakeCache(capacity=1)
+    prefetcher = _make_prefetcher(cache, num_workers=2)
+    prefetcher.start()
+    for delta_id in range(1, 4):
+        prefetcher.submit(_request(delta_id))
+    _wait_until(lambda: len(prefetcher) == 0 and len(cache.load_order) == 3)
+    assert len(cache.cache) == 1
+    assert prefetcher.num_discarded == 2
+    # workers are still alive and serve new jobs once there is room
+    cache.capacity = 2
+    prefetcher.submit(_request(4))
+    _wait_until(lambda: cache.is_cached(4))
+    prefetcher.stop()
+
+
+def test_cached_deltas_are_not_queued():
+    cache = FakeCache()
+    cache.cache[1] = True
+    prefetcher = _make_prefetcher(cache)
+    assert not prefetcher.submit(_request(1))
+    assert len(prefetcher) == 0
@@ -0,0 +1,91 @@
+import json
+from typing import Optional
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from vllm.delta.profiler import DeltaLayerProfiler
+
+
+class FakeLinearMethod:
+
+    def apply_weights(self, weights, x, bias: Optional[torch.Tensor] = None):
+        return F.linear(x, weights["weight"], bias)
+
+
+class FakeLinearWithDelta(nn.Module):
+
+    def __init__(self, dim: int = 16):
+        super().__init__()
+        self.base_layer = nn.Module()
+        self.base_layer.linear_method = FakeLinearMethod()
+        self.base_layer.linear_weights = {"weight": torch.randn(dim, dim)}
+        self.delta = torch.randn(dim, dim)
+
+    def apply_weights(self, x: torch.Tensor, bias: Optional[torch.Tensor] = None):
+        base = self.base_layer.linear_method.apply_weights(
+            self.base_layer.linear_weights, x, bias
+        )
+        return base + F.linear(x, self.delta)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.apply_weights(x, None)
+
+
+class FakeEmbeddingWithDelta(nn.Module):
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return x
+
+
+def test_wrapped_layers_keep_outputs():
+    layer = FakeLinearWithDelta()
+    x = torch.randn(4, 16)
+    expected = layer(x)
+    profiler = DeltaLayerProfiler(interval=10)
+    modules = {"layers.0.qkv_proj": layer, "embed_tokens": FakeEmbeddingWithDelta()}
+    assert profiler.wrap(modules) == 1
+    assert torch.equal(layer(x), expected)
+
+
+def test_timings_by_number_of_deltas(tmp_path):
+    output = tmp_path / "layers.jsonl"
+    profiler = DeltaLayerProfiler(interval=3, output_path=str(output))
+    profiler.wrap({"layers.0.qkv_proj": FakeLinearWithDelta()})
+    layer = FakeLinearWithDelta()
+    profiler.wrap({"layers.0.o_proj": layer})
+    x = torch.randn(4, 16)
+    for num_deltas in [1, 2, 2]:
+        profiler.set_num_deltas(num_deltas)
+        layer(x)
+        profiler.step()
+
+    lines = output.read_text().splitlines()
+    assert len(lines) == 1
+    record = json.loads(lines[0])
+    assert record["step"] == 3
+    rows = {(r["layer"], r["num_deltas"]): r for r in record["layers"]}
+    # the layer that never ran has no timings
+    assert set(rows) == {("layers.0.o_proj", 1), ("layers.0.o_proj", 2)}
+    assert rows[("layers.0.o_proj", 2)]["calls"] == 2
+    for row in rows.values():
+        assert row["mean_delta_ms"] > 0
+        assert row["mean_base_ms"] > 0
+    # timings restart after every interval
+    assert profiler.timings == {}
+
+
+def test_reset_drops_warmup_steps():
+    profiler = DeltaLayerProfiler(interval=2, profile_base=False)
+    layer = FakeLinearWithDelta()
+    profiler.wrap({"layers.0.o_proj": layer})
+    layer(torch.randn(4, 16))
+    profiler.step()
+    profiler.reset()
+    layer(torch.randn(4, 16))
+    profiler.step()
+    summary = profiler.summary()
+    assert len(summary) == 1
+    assert summary[0]["calls"] == 1
+    assert summary[0]["mean_base_ms"] == 0
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+
+from vllm.delta.shards import (
+    MONOLITHIC_FILENAME,
+    SHARD_MANIFEST_FILENAME,
+    convert_to_rank_shards,
+    get_delta_tensor_filename,
+)
+
+
+def _write_checkpoint(path, tp_size):
+    tensors = {}
+    for rank in range(tp_size):
+        tensors[f"model.layers.0.mlp.down_proj.{rank}.qweight"] = torch.randint(
+            0, 100, (16, 8), dtype=torch.int32
+        )
+        tensors[f"model.layers.0.mlp.down_proj.{rank}.scales"] = torch.randn(
+            1, 8, dtype=torch.float16
+        )
+    save_file(tensors, str(path / MONOLITHIC_FILENAME))
+    with open(path / "compress_config.json", "w") as fp:
+        json.dump({"bits": 4}, fp)
+    return tensors
+
+
+@pytest.mark.parametrize("tp_size", [1, 2, 4])
+def test_convert_to_rank_shards(tmp_path, tp_size):
+    tensors = _write_checkpoint(tmp_path, tp_size)
+    assert get_delta_tensor_filename(str(tmp_path), 0, tp_size) == MONOLITHIC_FILENAME
+
+    manifest = convert_to_rank_shards(str(tmp_path))
+    assert manifest["tp_size"] == tp_size
+    assert (tmp_path / SHARD_MANIFEST_FILENAME).exists()
+    for rank in range(tp_size):
+        filename = get_delta_tensor_filename(str(tmp_path), rank, tp_size)
+        assert filename == f"rank.{rank}.safetensors"
+        with safe_open(str(tmp_path / filename), "pt") as f:
+            keys = list(f.keys())
+            assert all(key.rsplit(".", 2)[1] == str(rank) for key in keys)
+            assert len(keys) == 2
+            for key in keys:
+                assert torch.equal(f.get_tensor(key), tensors[key])
+
+
+def test_tp_size_mismatch(tmp_path):
+    _write_checkpoint(tmp_path, 2)
+    convert_to_rank_shards(str(tmp_path))
+    with pytest.raises(ValueError):
+        get_delta_tensor_filename(str(tmp_path), 0, 4)
+
+
+def test_convert_to_output_dir(tmp_path):
+    src = tmp_path / "src"
+    src.mkdir()
+    _write_checkpoint(src, 2)
+    dst = tmp_path / "dst"
+    convert_to_rank_shards(str(src), output=str(dst))
+    assert (dst / "compress_config.json").exists()
+    assert not (dst / MONOLITHIC_FILENAME).exists()
+    assert get_delta_tensor_filename(str(dst), 1, 2) == "rank.1.safetensors"
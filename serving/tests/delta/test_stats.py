@@ -0,0 +1,58 @@
+import threading
+
+from vllm.delta.stats import DeltaCacheStats, DeltaCacheStatsRecorder
+from vllm.engine.metrics import StatLogger
+
+
+def test_collect_resets_only_load_times():
+    recorder = DeltaCacheStatsRecorder()
+    recorder.inc("cpu_misses")
+    recorder.inc("bytes_loaded", 1024)
+    recorder.observe("disk_load_times", 0.5)
+    stats = recorder.collect()
+    assert stats.cpu_misses == 1
+    assert stats.bytes_loaded == 1024
+    assert stats.disk_load_times == [0.5]
+
+    recorder.inc("cpu_misses")
+    stats = recorder.collect()
+    # counters are cumulative, load times are per collection
+    assert stats.cpu_misses == 2
+    assert stats.disk_load_times == []
+
+
+def test_load_times_are_capped_between_collections():
+    recorder = DeltaCacheStatsRecorder(max_samples=3)
+    for seconds in range(5):
+        recorder.observe("disk_load_times", float(seconds))
+    # the oldest durations are dropped
+    assert recorder.collect().disk_load_times == [2.0, 3.0, 4.0]
+
+
+def test_concurrent_increments():
+    recorder = DeltaCacheStatsRecorder()
+
+    def record():
+        for _ in range(1000):
+            recorder.inc("gpu_hits")
+            recorder.observe("activation_times", 0.0)
+
+    threads = [threading.Thread(target=record) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = recorder.collect()
+    assert stats.gpu_hits == 4000
+    assert len(stats.activation_times) == 4000
+
+
+def test_stat_logger_exports_increases():
+    logger = StatLogger(local_interval=5, labels={"model_name": "test"})
+    counter = logger.metrics.counters_delta_cache["cpu_misses"]
+    histogram = logger.metrics.histogram_delta_disk_load_time
+
+    logger._log_delta_cache(DeltaCacheStats(cpu_misses=3, disk_load_times=[0.1]))
+    logger._log_delta_cache(DeltaCacheStats(cpu_misses=5, disk_load_times=[0.2]))
+    assert counter.labels(model_name="test")._value.get() == 5
+    assert histogram.labels(model_name="test")._sum.get() == 0.1 + 0.2
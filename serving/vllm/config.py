@@ -598,6 +598,9 @@ class SchedulerConfig:
             and generated text).
         delay_factor: Apply a delay (of delay factor multiplied by previous
             prompt latency) before scheduling next prompt.
+        scheduler_policy: The policy that orders the waiting requests.
+        scheduler_max_wait: Seconds a request may wait before the
+            delta-affinity policy schedules it ahead of everything else.
     """
 
     def __init__(
@@ -607,6 +610,7 @@ class SchedulerConfig:
         max_model_len: int,
         delay_factor: float = 0.0,
         scheduler_policy: str = "fcfs",
+        scheduler_max_wait: float = 10.0,
     ) -> None:
         if max_num_batched_tokens is not None:
             self.max_num_batched_tokens = max_num_batched_tokens
@@ -618,6 +622,7 @@ class SchedulerConfig:
         self.max_model_len = max_model_len
         self.delay_factor = delay_factor
         self.scheduler_policy = scheduler_policy
+        self.scheduler_max_wait = scheduler_max_wait
         self._verify_args()
 
     def _verify_args(self) -> None:
@@ -636,6 +641,10 @@ class SchedulerConfig:
                 "be greater than or equal to max_num_seqs "
                 f"({self.max_num_seqs})."
             )
+        if self.scheduler_max_wait < 0:
+            raise ValueError(
+                f"scheduler_max_wait ({self.scheduler_max_wait}) must be >= 0."
+            )
 
     def __str__(self) -> str:
         return (
@@ -643,7 +652,8 @@ class SchedulerConfig:
             f"max_num_seqs={self.max_num_seqs}, "
             f"max_model_len={self.max_model_len}, "
             f"delay_factor={self.delay_factor}, "
-            f"scheduler_policy={self.scheduler_policy})"
+            f"scheduler_policy={self.scheduler_policy}, "
+            f"scheduler_max_wait={self.scheduler_max_wait})"
         )
 
 
@@ -1,5 +1,5 @@
 from collections import deque
-from typing import Deque
+from typing import Deque, Dict, Iterable, Optional
 import random
 from vllm.sequence import SequenceGroup
 from vllm.logger import init_logger
@@ -16,6 +16,10 @@ class Policy:
     ) -> float:
         raise NotImplementedError
 
+    def is_starving(self, now: float, seq_group: SequenceGroup) -> bool:
+        """Whether `seq_group` has to be scheduled before anything else."""
+        return False
+
     def get_most_wanted(
         self,
         now: float,
@@ -36,6 +40,7 @@ class Policy:
         occurences: dict = None,
         available_deltas: list = None,
         most_wanted: SequenceGroup = None,
+        running_deltas: Optional[Iterable[int]] = None,
     ) -> Deque[SequenceGroup]:
         return deque(
             sorted(
@@ -77,13 +82,104 @@ class DeltaServe(Policy):
         priority = now - seq_group.metrics.arrival_time
         return priority
 
+
+class DeltaAffinity(Policy):
+    """Batches requests by the residency of their delta.
+
+    Waiting requests are ordered by tiers: requests whose delta is already
+    used by a running request (resident in a GPU slot) or that use the base
+    model come first, then requests whose delta is in the CPU cache
+    (`available_deltas`), then requests whose delta still has to be read from
+    disk. Within a tier, requests of the same delta are kept together, and
+    delta groups are ordered by the wait of their oldest request, so the
+    scheduler fills the delta slots with as few distinct deltas as possible.
+
+    A request that waited longer than `max_wait` seconds is starving: it is
+    placed ahead of all tiers, and the scheduler stops admitting other
+    requests while it cannot get a delta slot, so that running deltas drain
+    and free one. This bounds the queueing delay of unpopular deltas.
+    """
+
+    # tiers, higher is scheduled first
+    TIER_DISK = 0
+    TIER_CPU = 1
+    TIER_GPU = 2
+
+    def __init__(self, max_wait: float = 10.0):
+        if max_wait < 0:
+            raise ValueError(f"max_wait must be >= 0, got {max_wait}")
+        self.max_wait = max_wait
+
+    def is_starving(self, now: float, seq_group: SequenceGroup) -> bool:
+        return now - seq_group.metrics.arrival_time >= self.max_wait
+
+    def get_tier(
+        self,
+        seq_group: SequenceGroup,
+        available_deltas: Iterable[int] = (),
+        running_deltas: Iterable[int] = (),
+    ) -> int:
+        delta_int_id = seq_group.delta_int_id
+        if delta_int_id == 0 or delta_int_id in running_deltas:
+            return self.TIER_GPU
+        if delta_int_id in available_deltas:
+            return self.TIER_CPU
+        return self.TIER_DISK
+
+    def get_priority(
+        self,
+        now: float,
+        seq_group: SequenceGroup,
+        occurences: dict = None,
+        available_deltas: list = None,
+        most_wanted=None,
+    ) -> float:
+        # ungrouped priority, used when a single request has to be ranked
+        return now - seq_group.metrics.arrival_time
+
+    def sort_by_priority(
+        self,
+        now: float,
+        seq_groups: Deque[SequenceGroup],
+        occurences: dict = None,
+        available_deltas: list = None,
+        most_wanted: SequenceGroup = None,
+        running_deltas: Optional[Iterable[int]] = None,
+    ) -> Deque[SequenceGroup]:
+        available_deltas = set(available_deltas or ())
+        running_deltas = set(running_deltas or ())
+        # the longest wait of each delta's requests
+        group_wait: Dict[int, float] = {}
+        for seq_group in seq_groups:
+            wait = now - seq_group.metrics.arrival_time
+            delta_int_id = seq_group.delta_int_id
+            group_wait[delta_int_id] = max(group_wait.get(delta_int_id, wait), wait)
+
+        def key(seq_group: SequenceGroup):
+            wait = now - seq_group.metrics.arrival_time
+            if self.is_starving(now, seq_group):
+                # starving requests are served in FCFS order
+                return (1, 0, wait, 0, 0.0)
+            tier = self.get_tier(seq_group, available_deltas, running_deltas)
+            delta_int_id = seq_group.delta_int_id
+            # -delta_int_id keeps groups with equal waits contiguous
+            return (0, tier, group_wait[delta_int_id], -delta_int_id, wait)
+
+        return deque(sorted(seq_groups, key=key, reverse=True))
+
+
 class RandomPolicy(Policy):
     def get_priority(self, now: float, seq_group: SequenceGroup) -> float:
         return random.random()
 
 
 class PolicyFactory:
-    _POLICY_REGISTRY = {"fcfs": FCFS, "random": RandomPolicy, "deltaserve": DeltaServe}
+    _POLICY_REGISTRY = {
+        "fcfs": FCFS,
+        "random": RandomPolicy,
+        "deltaserve": DeltaServe,
+        "delta-affinity": DeltaAffinity,
+    }
 
     @classmethod
     def get_policy(cls, policy_name: str, **kwargs) -> Policy:
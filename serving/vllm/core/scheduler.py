@@ -1,7 +1,7 @@
 import enum
 import time
 from collections import deque
-from typing import Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Set, Tuple, Union
 
 from vllm.config import CacheConfig, LoRAConfig, SchedulerConfig
 from vllm.core.block_manager import AllocStatus, BlockSpaceManager
@@ -129,8 +129,11 @@ class Scheduler:
         lora_config: Optional[LoRAConfig],
         delta_config: Optional[DeltaConfig],
         swap_config: Optional[SwapConfig],
+        clock: Callable[[], float] = time.time,
     ) -> None:
         self.scheduler_config = scheduler_config
+        # source of `now`, replaced by the simulated clock in vllm.core.simulator
+        self.clock = clock
         self.cache_config = cache_config
         # Note for LoRA scheduling: the current policy is extremely
         # simple and NOT fair. It can lead to starvation of some
@@ -147,8 +150,11 @@ class Scheduler:
         # Instantiate the scheduling policy.
         if self.delta_enabled:
             logger.info(f"Using {self.scheduler_config.scheduler_policy} policy.")
+            policy_kwargs = {}
+            if self.scheduler_config.scheduler_policy == "delta-affinity":
+                policy_kwargs["max_wait"] = self.scheduler_config.scheduler_max_wait
             self.policy = PolicyFactory.get_policy(
-                policy_name=self.scheduler_config.scheduler_policy
+                policy_name=self.scheduler_config.scheduler_policy, **policy_kwargs
             )
             if self.scheduler_config.scheduler_policy == "deltaserve":
                 self.enable_delta_serve_policy = True
@@ -249,7 +255,7 @@ class Scheduler:
         blocks_to_copy: Dict[int, List[int]] = {}
 
         # Fix the current time.
-        now = time.time()
+        now = self.clock()
         if self.enable_delta_serve_policy:
             curr_delta_running_mapping = {}
             for seq_group in self.running:
@@ -307,7 +313,12 @@ class Scheduler:
             leftover_waiting_sequences = deque()
             num_batched_tokens = 0
             # sort waiting sequences by the policy
-            self.waiting = self.policy.sort_by_priority(now, self.waiting, available_deltas=available_deltas)
+            self.waiting = self.policy.sort_by_priority(
+                now,
+                self.waiting,
+                available_deltas=available_deltas,
+                running_deltas=curr_deltas,
+            )
             while self._passed_delay(now) and self.waiting:
                 seq_group = self.waiting[0]
                 waiting_seqs = seq_group.get_seqs(status=SequenceStatus.WAITING)
@@ -367,6 +378,9 @@ class Scheduler:
                         # we ignore this request for now.
                         leftover_waiting_sequences.appendleft(seq_group)
                         self.waiting.popleft()
+                        if self.policy.is_starving(now, seq_group):
+                            # admit nothing else until a delta slot drains
+                            break
                         continue
 
                 if self.swap_enabled:
@@ -608,7 +622,7 @@ class Scheduler:
         # This function call changes the internal states of the scheduler
         # such as self.running, self.swapped, and self.waiting.
         scheduler_outputs = self._schedule(available_deltas)
-        now = time.time()
+        now = self.clock()
 
         # Create input data structures.
         seq_group_metadata_list: List[SequenceGroupMetadata] = []
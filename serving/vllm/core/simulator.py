@@ -0,0 +1,416 @@
+"""GPU-free discrete-event simulation of a delta serving engine.
+
+`Simulator` replays requests against the real `Scheduler` and
+`BlockSpaceManager` on a simulated clock. Models are not executed and deltas
+are not read: the durations of prefill and decode steps and of disk -> CPU and
+CPU -> GPU delta loads come from a pluggable `CostModel`, and the delta caches
+are modelled by `DeltaCacheModel`, which keeps the LRU replacement of
+`LRUCacheDeltaModelManager`. Request metrics are set at the same points of a
+step as in a live run, so simulated results can be analysed like measured ones.
+"""
+import json
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Set
+
+from vllm.config import CacheConfig, SchedulerConfig
+from vllm.core.scheduler import Scheduler
+from vllm.delta.config import DeltaConfig
+from vllm.delta.request import DeltaRequest
+from vllm.logger import init_logger
+from vllm.sampling_params import SamplingParams
+from vllm.sequence import Logprob, Sequence, SequenceGroup, SequenceStatus
+
+logger = init_logger(__name__)
+
+# the token every simulated sequence generates
+_SIM_TOKEN_ID = 0
+
+
+class CostModel:
+    """Durations, in seconds, of the operations of an engine step."""
+
+    def prefill_time(self, num_tokens: int, num_seqs: int, num_deltas: int) -> float:
+        raise NotImplementedError
+
+    def decode_time(
+        self, num_seqs: int, num_context_tokens: int, num_deltas: int
+    ) -> float:
+        raise NotImplementedError
+
+    def disk_to_cpu_time(self, delta_id: int) -> float:
+        raise NotImplementedError
+
+    def cpu_to_gpu_time(self, delta_id: int) -> float:
+        raise NotImplementedError
+
+
+@dataclass
+class LinearCostModel(CostModel):
+    """Step times linear in the batch shape, load times from the size of a
+    delta and the bandwidth of the link it crosses. The coefficients are meant
+    to be fitted to profiles of the deployment being planned for."""
+
+    prefill_base: float = 0.02
+    prefill_per_token: float = 1e-4
+    decode_base: float = 0.015
+    decode_per_seq: float = 2e-4
+    decode_per_context_token: float = 1e-7
+    # extra time of a step per distinct delta in the batch
+    per_delta: float = 2e-3
+    delta_bytes: int = 1 << 30
+    disk_latency: float = 5e-3
+    disk_bandwidth: float = 2e9
+    pcie_bandwidth: float = 12e9
+
+    @classmethod
+    def from_json(cls, path: str) -> "LinearCostModel":
+        with open(path, "r") as f:
+            return cls(**json.load(f))
+
+    def prefill_time(self, num_tokens: int, num_seqs: int, num_deltas: int) -> float:
+        return (
+            self.prefill_base
+            + self.prefill_per_token * num_tokens
+            + self.per_delta * num_deltas
+        )
+
+    def decode_time(
+        self, num_seqs: int, num_context_tokens: int, num_deltas: int
+    ) -> float:
+        return (
+            self.decode_base
+            + self.decode_per_seq * num_seqs
+            + self.decode_per_context_token * num_context_tokens
+            + self.per_delta * num_deltas
+        )
+
+    def disk_to_cpu_time(self, delta_id: int) -> float:
+        return self.disk_latency + self.delta_bytes / self.disk_bandwidth
+
+    def cpu_to_gpu_time(self, delta_id: int) -> float:
+        return self.delta_bytes / self.pcie_bandwidth
+
+
+class DeltaCacheModel:
+    """Residency of deltas in the GPU slots and in the CPU cache.
+
+    Both tiers are LRU. A delta in a GPU slot is also in the CPU cache, and
+    evicting it from the CPU cache frees its slot, as in
+    `LRUCacheDeltaModelManager`.
+    """
+
+    def __init__(self, max_deltas: int, max_cpu_deltas: int):
+        if max_cpu_deltas < max_deltas:
+            raise ValueError("max_cpu_deltas must be greater than max_deltas")
+        self.max_deltas = max_deltas
+        self.max_cpu_deltas = max_cpu_deltas
+        self.gpu: "OrderedDict[int, None]" = OrderedDict()
+        self.cpu: "OrderedDict[int, None]" = OrderedDict()
+        self.stats = {
+            "gpu_hits": 0,
+            "cpu_hits": 0,
+            "disk_loads": 0,
+            "prefetch_hits": 0,
+            "cpu_evictions": 0,
+            "gpu_evictions": 0,
+        }
+
+    def list_deltas(self) -> Set[int]:
+        return set(self.cpu)
+
+    def add_cpu(
+        self, delta_id: int, pinned: Iterable[int] = (), evict_active: bool = True
+    ) -> bool:
+        """Inserts `delta_id` into the CPU cache, evicting the least recently
+        used delta that is not `pinned` (nor in a GPU slot, unless
+        `evict_active`). Returns False if no delta could be evicted."""
+        if delta_id in self.cpu:
+            self.cpu.move_to_end(delta_id)
+            return True
+        if len(self.cpu) >= self.max_cpu_deltas:
+            pinned = set(pinned)
+            victim = next(
+                (
+                    d
+                    for d in self.cpu
+                    if d not in pinned and (evict_active or d not in self.gpu)
+                ),
+                None,
+            )
+            if victim is None:
+                return False
+            del self.cpu[victim]
+            self.gpu.pop(victim, None)
+            self.stats["cpu_evictions"] += 1
+        self.cpu[delta_id] = None
+        return True
+
+    def activate(self, delta_id: int, pinned: Iterable[int] = ()) -> bool:
+        """Puts `delta_id` into a GPU slot. Returns whether it had to be copied
+        from the CPU cache."""
+        self.cpu.move_to_end(delta_id)
+        if delta_id in self.gpu:
+            self.gpu.move_to_end(delta_id)
+            return False
+        if len(self.gpu) >= self.max_deltas:
+            pinned = set(pinned)
+            victim = next(d for d in self.gpu if d not in pinned)
+            del self.gpu[victim]
+            self.stats["gpu_evictions"] += 1
+        self.gpu[delta_id] = None
+        return True
+
+
+class Simulator:
+    """Drives a `Scheduler` with simulated model execution and delta loads.
+
+    Each step schedules a batch, loads the deltas of the batch that are not in
+    a GPU slot (from disk first if they are not in the CPU cache either), runs
+    the prefill or decode step and appends one token to every running
+    sequence. With `enable_prefetch`, a delta starts loading into the CPU cache
+    when a request for it arrives, on a single disk channel that is paused
+    while a step loads a delta on the critical path.
+    """
+
+    def __init__(
+        self,
+        scheduler_config: SchedulerConfig,
+        cache_config: CacheConfig,
+        delta_config: Optional[DeltaConfig],
+        cost_model: CostModel,
+        delta_names: List[str],
+        base_model: str = "base-model",
+        enable_prefetch: bool = False,
+    ):
+        self.now = 0.0
+        self.base_model = base_model
+        self.scheduler_config = scheduler_config
+        self.cache_config = cache_config
+        self.cost_model = cost_model
+        self.enable_prefetch = enable_prefetch
+        self.scheduler = Scheduler(
+            scheduler_config,
+            cache_config,
+            None,
+            delta_config,
+            None,
+            clock=lambda: self.now,
+        )
+        max_deltas = delta_config.max_deltas if delta_config else 0
+        max_cpu_deltas = delta_config.max_cpu_deltas if delta_config else 0
+        self.deltas = DeltaCacheModel(max_deltas, max_cpu_deltas)
+        self.delta_requests = {
+            name: DeltaRequest(name, i + 1, name) for i, name in enumerate(delta_names)
+        }
+        # delta id -> simulated time its prefetch completes
+        self.in_flight: Dict[int, float] = {}
+        self.disk_free_at = 0.0
+        self.seq_counter = count()
+        self.finished: List[SequenceGroup] = []
+        self.num_steps = 0
+
+    def add_request(
+        self,
+        request_id: str,
+        model: str,
+        prompt_len: int,
+        max_tokens: int,
+        arrival_time: float,
+        min_tokens: int = 0,
+    ) -> SequenceGroup:
+        """Queues a request for `model`, a delta name or the base model."""
+        delta_request = None
+        if model != self.base_model:
+            if model not in self.delta_requests:
+                raise ValueError(f"Unknown model {model}")
+            if self.scheduler.delta_config is None:
+                raise ValueError(
+                    f"Got a request for delta {model} but deltas are disabled"
+                )
+            delta_request = self.delta_requests[model]
+        seq = Sequence(
+            next(self.seq_counter),
+            "",
+            [_SIM_TOKEN_ID] * max(prompt_len, 1),
+            self.cache_config.block_size,
+            delta_request=delta_request,
+        )
+        sampling_params = SamplingParams(
+            max_tokens=max_tokens, min_tokens=min_tokens, ignore_eos=True
+        )
+        seq_group = SequenceGroup(
+            request_id,
+            [seq],
+            sampling_params,
+            arrival_time,
+            delta_request=delta_request,
+        )
+        self.scheduler.add_seq_group(seq_group)
+        if self.enable_prefetch and delta_request is not None:
+            self._prefetch(delta_request.delta_int_id)
+        return seq_group
+
+    def _prefetch(self, delta_id: int) -> None:
+        if delta_id in self.deltas.cpu or delta_id in self.in_flight:
+            return
+        start = max(self.now, self.disk_free_at)
+        self.disk_free_at = start + self.cost_model.disk_to_cpu_time(delta_id)
+        self.in_flight[delta_id] = self.disk_free_at
+
+    def _complete_prefetches(self) -> None:
+        for delta_id, done in list(self.in_flight.items()):
+            if done <= self.now:
+                del self.in_flight[delta_id]
+                # never evict a delta in use on the GPU for a prefetched one
+                self.deltas.add_cpu(delta_id, evict_active=False)
+
+    def _load_delta(self, delta_id: int, batch_deltas: Set[int]) -> None:
+        """Brings `delta_id` into the CPU cache, advancing the clock by the
+        time the step waits for it."""
+        if delta_id in self.deltas.cpu:
+            key = "gpu_hits" if delta_id in self.deltas.gpu else "cpu_hits"
+            self.deltas.stats[key] += 1
+        elif delta_id in self.in_flight:
+            # the delta is already half-way in, wait for it
+            self.now = max(self.now, self.in_flight.pop(delta_id))
+            self.deltas.stats["prefetch_hits"] += 1
+        else:
+            load_time = self.cost_model.disk_to_cpu_time(delta_id)
+            # prefetching pauses while the step loads
+            self.disk_free_at = max(self.disk_free_at, self.now) + load_time
+            for in_flight_id in self.in_flight:
+                self.in_flight[in_flight_id] += load_time
+            self.now += load_time
+            self.deltas.stats["disk_loads"] += 1
+        self.deltas.add_cpu(delta_id, pinned=batch_deltas)
+
+    def step(self) -> bool:
+        """Runs one engine step. Returns False if nothing was scheduled."""
+        self._complete_prefetches()
+        _, scheduler_outputs = self.scheduler.schedule(
+            list(self.deltas.list_deltas())
+        )
+        for seq_group in scheduler_outputs.ignored_seq_groups:
+            seq_group.set_finished_time(self.now)
+            self.finished.append(seq_group)
+        if scheduler_outputs.is_empty():
+            return bool(scheduler_outputs.ignored_seq_groups)
+        self.num_steps += 1
+        batch = list(scheduler_outputs.scheduled_seq_groups)
+
+        # the worker loads the deltas of the batch before the forward pass
+        batch_deltas = {g.delta_int_id for g in batch if g.delta_int_id > 0}
+        for delta_id in sorted(batch_deltas):
+            seq_groups = [g for g in batch if g.delta_int_id == delta_id]
+            self._load_delta(delta_id, batch_deltas)
+            for seq_group in seq_groups:
+                seq_group.maybe_set_cpu_loading_time(self.now)
+            if self.deltas.activate(delta_id, pinned=batch_deltas):
+                self.now += self.cost_model.cpu_to_gpu_time(delta_id)
+            for seq_group in seq_groups:
+                seq_group.maybe_set_gpu_loading_time(self.now)
+
+        if scheduler_outputs.prompt_run:
+            self.now += self.cost_model.prefill_time(
+                scheduler_outputs.num_batched_tokens, len(batch), len(batch_deltas)
+            )
+        else:
+            num_context_tokens = sum(
+                seq.get_len()
+                for seq_group in batch
+                for seq in seq_group.get_seqs(status=SequenceStatus.RUNNING)
+            )
+            self.now += self.cost_model.decode_time(
+                scheduler_outputs.num_batched_tokens,
+                num_context_tokens,
+                len(batch_deltas),
+            )
+
+        for seq_group in batch:
+            for seq in seq_group.get_seqs(status=SequenceStatus.RUNNING):
+                seq.append_token_id(_SIM_TOKEN_ID, {_SIM_TOKEN_ID: Logprob(0.0)})
+                self._check_stop(seq, seq_group.sampling_params)
+                if seq.is_finished():
+                    self.scheduler.free_seq(seq)
+        self.scheduler.free_finished_seq_groups()
+        for seq_group in batch:
+            seq_group.maybe_set_first_token_time(self.now)
+            if seq_group.is_finished():
+                seq_group.set_finished_time(self.now)
+                self.finished.append(seq_group)
+        return True
+
+    def _check_stop(self, seq: Sequence, sampling_params: SamplingParams) -> None:
+        # simulated sequences never emit EOS, they run to their length cap
+        if (
+            seq.get_len() > self.scheduler_config.max_model_len
+            or seq.get_output_len() == sampling_params.max_tokens
+        ):
+            seq.status = SequenceStatus.FINISHED_LENGTH_CAPPED
+
+    def run(self, requests: List[dict]) -> List[SequenceGroup]:
+        """Replays `requests`, dicts of `add_request` arguments, until all of
+        them finished. Returns the finished sequence groups."""
+        pending = deque(sorted(requests, key=lambda r: r["arrival_time"]))
+        while pending or self.scheduler.has_unfinished_seqs():
+            while pending and pending[0]["arrival_time"] <= self.now:
+                self.add_request(**pending.popleft())
+            if self.step():
+                continue
+            # nothing can run, skip to the next arrival or prefetch completion
+            next_events = list(self.in_flight.values())
+            if pending:
+                next_events.append(pending[0]["arrival_time"])
+            next_events = [t for t in next_events if t > self.now]
+            if not next_events:
+                raise RuntimeError(
+                    f"Simulation stalled at t={self.now:.3f}s with "
+                    f"{self.scheduler.get_num_unfinished_seq_groups()} "
+                    "unfinished requests"
+                )
+            self.now = min(next_events)
+        logger.info(
+            f"Simulated {len(self.finished)} requests in {self.num_steps} steps, "
+            f"{self.now:.2f}s of serving time, delta cache: {self.deltas.stats}"
+        )
+        return self.finished
+
+    def get_results(self) -> List[dict]:
+        """Finished requests in the format of the responses recorded by
+        scripts/helpers/bench.py."""
+        delta_names = {r.delta_int_id: r.delta_name for r in self.delta_requests.values()}
+        results = []
+        for seq_group in sorted(self.finished, key=lambda g: g.metrics.arrival_time):
+            seq = seq_group.get_seqs()[0]
+            prompt_tokens = seq.get_prompt_len()
+            completion_tokens = seq.get_output_len()
+            response = {
+                "id": seq_group.request_id,
+                "object": "text_completion",
+                "model": delta_names.get(seq_group.delta_int_id, self.base_model),
+                "choices": [
+                    {
+                        "index": 0,
+                        "text": "",
+                        "finish_reason": SequenceStatus.get_finished_reason(
+                            seq.status
+                        ),
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                },
+                "metrics": [asdict(seq_group.metrics)],
+            }
+            results.append(
+                {
+                    "response": response,
+                    "start_at": seq_group.metrics.arrival_time,
+                    "end_at": seq_group.metrics.finished_time,
+                }
+            )
+        return results
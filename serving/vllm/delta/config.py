@@ -85,8 +85,62 @@ class DeltaConfig:
     pack_factor: Fraction = field(default=Fraction(32, 1))
     sparse_factor: Fraction = field(default=Fraction(2, 1))
     kernel: QuantKernel = QuantKernel.TRITON
+    # number of threads loading deltas into the CPU cache in the background
+    prefetch_workers: int = 1
+    # bound the CPU cache by bytes of a preallocated pinned slab (in addition
+    # to max_cpu_deltas) instead of by number of models only
+    cpu_delta_cache_bytes: Optional[int] = None
+    # popularity model ("ewma" or "markov") used to prefetch deltas before
+    # they are requested, disabled if None
+    predictive_prefetch: Optional[str] = None
+    # bytes of predicted deltas that may be outstanding in the CPU cache,
+    # defaults to cpu_delta_cache_bytes
+    predictive_prefetch_bytes: Optional[int] = None
+    # half-life in seconds of the request counts of the ewma model
+    popularity_half_life: float = 60.0
+    # copy deltas into their GPU slots layer by layer on a side stream, so
+    # that the copies overlap with the forward pass
+    pipelined_activation: bool = False
+    # local (NVMe) directory caching deltas read from remote storage, between
+    # the CPU cache and the remote filesystem; disabled if None
+    disk_cache_dir: Optional[str] = None
+    disk_cache_bytes: Optional[int] = None
+    # "always" or "second-hit"
+    disk_cache_admission: str = "always"
+    # time the delta linear layers, aggregated over this many steps;
+    # disabled if None
+    profile_layers_interval: Optional[int] = None
+    # jsonl file the layer timings are appended to
+    profile_layers_output: Optional[str] = None
 
     def __post_init__(self):
+        if self.prefetch_workers < 1:
+            raise ValueError("prefetch_workers must be >= 1")
+        if self.cpu_delta_cache_bytes is not None and self.cpu_delta_cache_bytes <= 0:
+            raise ValueError("cpu_delta_cache_bytes must be > 0")
+        if self.predictive_prefetch is not None:
+            if self.predictive_prefetch not in ["ewma", "markov"]:
+                raise ValueError("predictive_prefetch must be 'ewma' or 'markov'")
+            if self.predictive_prefetch_bytes is None:
+                self.predictive_prefetch_bytes = self.cpu_delta_cache_bytes
+            if self.predictive_prefetch_bytes is None:
+                raise ValueError(
+                    "predictive_prefetch requires predictive_prefetch_bytes "
+                    "or cpu_delta_cache_bytes"
+                )
+            if self.predictive_prefetch_bytes <= 0:
+                raise ValueError("predictive_prefetch_bytes must be > 0")
+            if self.popularity_half_life <= 0:
+                raise ValueError("popularity_half_life must be > 0")
+        if self.disk_cache_dir is not None:
+            if self.disk_cache_bytes is None or self.disk_cache_bytes <= 0:
+                raise ValueError("disk_cache_dir requires disk_cache_bytes > 0")
+            if self.disk_cache_admission not in ["always", "second-hit"]:
+                raise ValueError(
+                    "disk_cache_admission must be 'always' or 'second-hit'"
+                )
+        if self.profile_layers_interval is not None and self.profile_layers_interval < 1:
+            raise ValueError("profile_layers_interval must be >= 1")
         if self.max_cpu_deltas is None:
             self.max_cpu_deltas = self.max_deltas
         elif self.max_cpu_deltas < self.max_deltas:
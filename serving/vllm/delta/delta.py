@@ -1,11 +1,13 @@
 import torch
-from typing import Optional, List
+from typing import Dict, Optional, List
 from .config import CompressionConfig
 
 
 class DeltaLayerWeights:
     """Delta weights for a layer composed of base model and compressed delta."""
 
+    TENSOR_ATTRS = ("qweight", "qzeros", "scales", "g_idx", "meta", "weight")
+
     def __init__(
         self,
         module_name: str,
@@ -34,6 +36,18 @@ class DeltaLayerWeights:
         self.g_idx = g_idx
         self.weight = weight
 
+    def tensors(self) -> Dict[str, torch.Tensor]:
+        """The non-empty tensors of this layer, keyed by attribute name."""
+        return {
+            attr: getattr(self, attr)
+            for attr in self.TENSOR_ATTRS
+            if isinstance(getattr(self, attr), torch.Tensor)
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return sum(tensor.nbytes for tensor in self.tensors().values())
+
 
 class PackedDeltaLayerWeights(DeltaLayerWeights):
     """Delta used for packed layers (eg. qkv_proj)."""
@@ -0,0 +1,260 @@
+"""Local disk tier of the delta cache.
+
+Deltas usually live on a network filesystem, so a miss in the CPU cache pays
+the remote read. `LocalDiskDeltaCache` keeps copies of recently used delta
+checkpoints on a local (NVMe) directory, between the CPU tier and remote
+storage:
+
+    GPU slots (max_deltas) -> CPU cache (max_cpu_deltas) -> local disk -> remote
+
+A lookup that hits returns the local copy to load from; a miss admits the
+delta according to the admission policy and copies it in the background,
+while the current load still reads from remote storage. Each entry is a
+directory holding the files one tensor-parallel rank needs, written under a
+temporary name and renamed into place once complete, so a crashed fill never
+leaves a half-written entry behind. Entries found on disk at startup are
+reused.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from vllm.logger import init_logger
+from .shards import SHARD_MANIFEST_FILENAME, get_delta_tensor_filename
+
+logger = init_logger(__name__)
+
+ADMISSION_POLICIES = ["always", "second-hit"]
+ENTRY_MARKER_FILENAME = "deltazip-disk-cache.json"
+# number of recent misses remembered by the second-hit admission policy
+MISS_HISTORY_SIZE = 1024
+
+
+def delta_files_for_rank(path: str, tp_rank: int, tp_size: int) -> List[str]:
+    """Files of the checkpoint at `path` that `tp_rank` needs to load it."""
+    files = [
+        filename
+        for filename in os.listdir(path)
+        if filename.endswith(".json") and os.path.isfile(os.path.join(path, filename))
+    ]
+    tensor_file = get_delta_tensor_filename(path, tp_rank, tp_size)
+    if tensor_file not in files:
+        files.append(tensor_file)
+    if SHARD_MANIFEST_FILENAME not in files and os.path.exists(
+        os.path.join(path, SHARD_MANIFEST_FILENAME)
+    ):
+        files.append(SHARD_MANIFEST_FILENAME)
+    return files
+
+
+@dataclass
+class DiskCacheEntry:
+    source: str
+    local_path: str
+    nbytes: int
+    # loads currently reading from the entry, it is not evicted meanwhile
+    readers: int = 0
+
+
+class LocalDiskDeltaCache:
+    """An LRU cache of delta checkpoints on a local directory.
+
+    Args:
+        cache_dir: Directory holding the cached checkpoints.
+        capacity_bytes: Upper bound on the bytes of all cached checkpoints.
+        admission: "always" copies a delta on its first miss, "second-hit"
+            only once it missed twice, so that one-off deltas do not evict
+            the working set.
+        files_fn: Selects the files of a checkpoint to cache, by default all
+            regular files.
+        fill_workers: Number of background copy threads.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        capacity_bytes: int,
+        admission: str = "always",
+        files_fn: Optional[Callable[[str], List[str]]] = None,
+        fill_workers: int = 1,
+    ):
+        if capacity_bytes <= 0:
+            raise ValueError(f"capacity_bytes must be > 0, got {capacity_bytes}")
+        if admission not in ADMISSION_POLICIES:
+            raise ValueError(
+                f"admission must be one of {ADMISSION_POLICIES}, got {admission}"
+            )
+        self.cache_dir = cache_dir
+        self.capacity_bytes = capacity_bytes
+        self.admission = admission
+        self._files_fn = files_fn or (
+            lambda path: [
+                filename
+                for filename in os.listdir(path)
+                if os.path.isfile(os.path.join(path, filename))
+            ]
+        )
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, DiskCacheEntry]" = OrderedDict()
+        self._filling: Dict[str, object] = {}
+        self._misses: "OrderedDict[str, int]" = OrderedDict()
+        self._executor = ThreadPoolExecutor(
+            max_workers=fill_workers, thread_name_prefix="delta-disk-fill"
+        )
+        self.num_hits = 0
+        self.num_misses = 0
+        self.num_evictions = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._scan()
+
+    @staticmethod
+    def _entry_name(source: str) -> str:
+        digest = hashlib.sha1(os.path.abspath(source).encode()).hexdigest()[:16]
+        return f"{os.path.basename(os.path.normpath(source))}-{digest}"
+
+    def _scan(self):
+        """Indexes complete entries left by a previous run, oldest first."""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            entry_dir = os.path.join(self.cache_dir, name)
+            marker = os.path.join(entry_dir, ENTRY_MARKER_FILENAME)
+            if ".tmp-" in name:
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                continue
+            if not os.path.exists(marker):
+                continue
+            with open(marker, "r") as fp:
+                meta = json.load(fp)
+            found.append((os.path.getmtime(marker), meta, entry_dir))
+        for _, meta, entry_dir in sorted(found, key=lambda item: item[0]):
+            self._entries[meta["source"]] = DiskCacheEntry(
+                meta["source"], entry_dir, meta["bytes"]
+            )
+        self._evict_until(0)
+        if self._entries:
+            logger.info(
+                f"Found {len(self._entries)} deltas "
+                f"({self.used_bytes/1024/1024:.2f} MiB) in {self.cache_dir}"
+            )
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __contains__(self, source: str) -> bool:
+        with self._lock:
+            return source in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def acquire(self, source: str) -> Optional[str]:
+        """Returns the local copy of `source` and pins it until `release`.
+
+        On a miss, returns None and admits `source` per the admission policy.
+        """
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is not None:
+                self._entries.move_to_end(source)
+                entry.readers += 1
+                self.num_hits += 1
+                return entry.local_path
+            self.num_misses += 1
+            if self._should_admit(source):
+                self._fill_async(source)
+        return None
+
+    def release(self, source: str):
+        with self._lock:
+            entry = self._entries.get(source)
+            if entry is not None and entry.readers > 0:
+                entry.readers -= 1
+
+    def _should_admit(self, source: str) -> bool:
+        if source in self._filling:
+            return False
+        if self.admission == "always":
+            return True
+        misses = self._misses.pop(source, 0) + 1
+        self._misses[source] = misses
+        while len(self._misses) > MISS_HISTORY_SIZE:
+            self._misses.popitem(last=False)
+        return misses >= 2
+
+    def _fill_async(self, source: str):
+        self._misses.pop(source, None)
+        self._filling[source] = self._executor.submit(self._fill, source)
+
+    def _evict_until(self, nbytes: int) -> bool:
+        """Evicts unpinned LRU entries until `nbytes` fit. Holds the lock."""
+        while self.used_bytes + nbytes > self.capacity_bytes:
+            unpinned = (
+                source for source, entry in self._entries.items() if not entry.readers
+            )
+            victim = next(unpinned, None)
+            if victim is None:
+                return False
+            entry = self._entries.pop(victim)
+            shutil.rmtree(entry.local_path, ignore_errors=True)
+            self.num_evictions += 1
+            logger.debug(f"Evicted {victim} from the disk delta cache")
+        return True
+
+    def _fill(self, source: str):
+        tmp_dir = None
+        try:
+            files = self._files_fn(source)
+            nbytes = sum(
+                os.path.getsize(os.path.join(source, filename)) for filename in files
+            )
+            if nbytes > self.capacity_bytes:
+                logger.info(
+                    f"Not caching {source} on disk, {nbytes} bytes exceed the "
+                    f"capacity of {self.capacity_bytes} bytes"
+                )
+                return
+            name = self._entry_name(source)
+            tmp_dir = os.path.join(self.cache_dir, f"{name}.tmp-{uuid.uuid4().hex}")
+            os.makedirs(tmp_dir)
+            for filename in files:
+                shutil.copyfile(
+                    os.path.join(source, filename), os.path.join(tmp_dir, filename)
+                )
+            with open(os.path.join(tmp_dir, ENTRY_MARKER_FILENAME), "w") as fp:
+                json.dump({"source": source, "bytes": nbytes}, fp)
+            with self._lock:
+                if not self._evict_until(nbytes):
+                    logger.info(f"No room to cache {source} on disk")
+                    return
+                entry_dir = os.path.join(self.cache_dir, name)
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                os.replace(tmp_dir, entry_dir)
+                tmp_dir = None
+                self._entries[source] = DiskCacheEntry(source, entry_dir, nbytes)
+            logger.info(f"Cached {source} on disk ({nbytes/1024/1024:.2f} MiB)")
+        except Exception as e:
+            logger.error(f"Caching {source} on disk failed: {e}")
+        finally:
+            if tmp_dir is not None:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            with self._lock:
+                self._filling.pop(source, None)
+
+    def wait_for_fills(self):
+        """Blocks until all queued fills are done."""
+        with self._lock:
+            futures = list(self._filling.values())
+        for future in futures:
+            future.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
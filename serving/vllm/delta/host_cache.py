@@ -0,0 +1,140 @@
+"""Byte-budgeted host memory for the CPU tier of the delta cache.
+
+`PinnedSlab` preallocates one page-locked buffer and carves deltas out of it
+with a first-fit allocator, so host memory use is fixed up front and no
+`pin_memory()` allocation happens on the load path.
+`GreedyDualSizeCache` replaces recency-only eviction with GreedyDual-Size:
+each entry gets a credit `H = L + cost / size` when it is inserted or hit,
+the entry with the smallest credit is evicted first and the global inflation
+value `L` is raised to the evicted credit. Large deltas are evicted earlier
+than small ones that were used equally recently.
+"""
+import bisect
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+import torch
+
+from vllm.utils import LRUCache
+from .loader import SLAB_ALIGNMENT, align_bytes
+
+T = TypeVar("T")
+
+
+class PinnedSlab:
+    """A preallocated (page-locked) host buffer with a first-fit allocator."""
+
+    def __init__(self, capacity_bytes: int, pin_memory: bool = True):
+        if capacity_bytes <= 0:
+            raise ValueError(f"capacity_bytes must be > 0, got {capacity_bytes}")
+        self.capacity_bytes = align_bytes(capacity_bytes)
+        self.buffer = torch.empty(
+            self.capacity_bytes,
+            dtype=torch.uint8,
+            pin_memory=pin_memory and torch.cuda.is_available(),
+        )
+        # sorted, non-adjacent (offset, size) free blocks
+        self._free: List[Tuple[int, int]] = [(0, self.capacity_bytes)]
+        self._allocated: Dict[int, int] = {}
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(self._allocated.values())
+
+    @property
+    def free_bytes(self) -> int:
+        return self.capacity_bytes - self.used_bytes
+
+    @property
+    def largest_free_block(self) -> int:
+        return max((size for _, size in self._free), default=0)
+
+    def can_allocate(self, nbytes: int) -> bool:
+        return self.largest_free_block >= align_bytes(nbytes)
+
+    def allocate(self, nbytes: int) -> Optional[int]:
+        """Returns the offset of a new block of `nbytes`, None if none fits."""
+        nbytes = align_bytes(max(nbytes, 1))
+        for i, (offset, size) in enumerate(self._free):
+            if size >= nbytes:
+                if size == nbytes:
+                    self._free.pop(i)
+                else:
+                    self._free[i] = (offset + nbytes, size - nbytes)
+                self._allocated[offset] = nbytes
+                return offset
+        return None
+
+    def free(self, offset: int):
+        size = self._allocated.pop(offset)
+        i = bisect.bisect_left(self._free, (offset, 0))
+        # merge with the following block
+        if i < len(self._free) and self._free[i][0] == offset + size:
+            size += self._free.pop(i)[1]
+        # merge with the preceding block
+        if i > 0 and self._free[i - 1][0] + self._free[i - 1][1] == offset:
+            prev_offset, prev_size = self._free.pop(i - 1)
+            offset, size = prev_offset, prev_size + size
+            i -= 1
+        self._free.insert(i, (offset, size))
+
+    def view(self, offset: int, nbytes: int) -> torch.Tensor:
+        return self.buffer[offset : offset + nbytes]
+
+
+class GreedyDualSizeCache(LRUCache[T]):
+    """An LRUCache whose eviction order follows GreedyDual-Size.
+
+    Ties between equal credits are broken by recency, so with uniform sizes
+    and costs it behaves exactly like the LRUCache it extends.
+    """
+
+    def __init__(
+        self,
+        capacity: int,
+        size_fn: Callable[[T], int],
+        cost_fn: Optional[Callable[[T], float]] = None,
+    ):
+        super().__init__(capacity)
+        self.size_fn = size_fn
+        # GDS(1) by default: every miss costs the same, which minimises the
+        # number of misses rather than the number of bytes loaded
+        self.cost_fn = cost_fn or (lambda value: 1.0)
+        self.inflation = 0.0
+        self.credits: Dict[Hashable, float] = {}
+
+    def _credit(self, key: Hashable):
+        value = self.cache[key]
+        self.credits[key] = self.inflation + self.cost_fn(value) / max(
+            self.size_fn(value), 1
+        )
+
+    def touch(self, key: Hashable) -> None:
+        super().touch(key)
+        self._credit(key)
+
+    def get(self, key: Hashable, default_value: Optional[T] = None) -> Optional[T]:
+        value = super().get(key, default_value)
+        if key in self.cache:
+            self._credit(key)
+        return value
+
+    def put(self, key: Hashable, value: T) -> None:
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self._credit(key)
+        self._remove_old_if_needed()
+
+    def eviction_order(self) -> List[Hashable]:
+        # sorted() is stable, so equal credits stay in LRU order
+        return sorted(self.cache.keys(), key=lambda key: self.credits[key])
+
+    def remove_oldest(self):
+        if not self.cache:
+            return
+        victim = self.eviction_order()[0]
+        self.inflation = max(self.inflation, self.credits[victim])
+        self.pop(victim)
+
+    def pop(self, key: Hashable, default_value: Optional[T] = None) -> T:
+        self.credits.pop(key, None)
+        return super().pop(key, default_value)
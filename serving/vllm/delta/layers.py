@@ -59,6 +59,16 @@ class DeltaMapping:
 
 
 class BaseLayerWithDelta(nn.Module):
+    # event of a pipelined host-to-device copy into this layer that the
+    # forward pass has not waited on yet, see vllm/delta/pipeline.py
+    copy_event = None
+
+    def wait_delta_copy(self):
+        """Makes the current stream wait until the delta copy has landed."""
+        if self.copy_event is not None:
+            self.copy_event.wait()
+            self.copy_event = None
+
     def create_delta_weights(
         self, max_deltas: int, delta_config: DeltaConfig, model_config: PretrainedConfig
     ) -> None:
@@ -156,7 +166,7 @@ class VocabParallelEmbeddingWithDelta(BaseLayerWithDelta):
         else:
             masked_input = x
         output_parallel = F.embedding(masked_input, self.base_layer.weight)
-
+        self.wait_delta_copy()
         output_parallel = apply_delta_embed(masked_input, self.delta_weights, indices)
 
         if self.tp_size > 1:
@@ -270,6 +280,7 @@ class ColumnParallelLinearWithDelta(BaseLayerWithDelta):
         output = self.base_layer.linear_method.apply_weights(
             self.base_layer.linear_weights, x, bias
         )
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -459,6 +470,7 @@ class MergedColumnParallelLinearWithDelta(ColumnParallelLinearWithDelta):
         output = self.base_layer.linear_method.apply_weights(
             self.base_layer.linear_weights, x, bias
         )
+        self.wait_delta_copy()
         output = apply_delta_packed_nslice(
             x,
             self.qweight_stacked,
@@ -720,6 +732,7 @@ class MergedQKVParallelLinearWithDelta(ColumnParallelLinearWithDelta):
         output = self.base_layer.linear_method.apply_weights(
             self.base_layer.linear_weights, x, bias
         )
+        self.wait_delta_copy()
         output = apply_delta_packed_nslice(
             x,
             self.qweight_stacked,
@@ -833,6 +846,7 @@ class RowParallelLinearWithDelta(BaseLayerWithDelta):
         output = self.base_layer.linear_method.apply_weights(
             self.base_layer.linear_weights, x
         )
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -986,6 +1000,7 @@ class LogitsProcessorWithDelta(BaseLayerWithDelta):
         # NOTE(xiaozhe): for now we assume there's no additional token added, so this simply performs additional matmuls on delta.
         if logits is None:
             return None
+        self.wait_delta_copy()
         apply_delta_uncompressed(
             hidden_states,
             self.weight_stacked,
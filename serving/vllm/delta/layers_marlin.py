@@ -59,6 +59,16 @@ class DeltaMapping:
 
 
 class BaseLayerWithDelta(nn.Module):
+    # event of a pipelined host-to-device copy into this layer that the
+    # forward pass has not waited on yet, see vllm/delta/pipeline.py
+    copy_event = None
+
+    def wait_delta_copy(self):
+        """Makes the current stream wait until the delta copy has landed."""
+        if self.copy_event is not None:
+            self.copy_event.wait()
+            self.copy_event = None
+
     def create_delta_weights(
         self, max_deltas: int, delta_config: DeltaConfig, model_config: PretrainedConfig
     ) -> None:
@@ -151,6 +161,7 @@ class VocabParallelEmbeddingWithDelta(BaseLayerWithDelta):
             masked_input[input_mask] = 0
         else:
             masked_input = x
+        self.wait_delta_copy()
         output_parallel = apply_delta_embed(
             masked_input, self.delta_weights, indices, self.base_layer.weight
         )
@@ -237,6 +248,7 @@ class ColumnParallelLinearWithDelta(BaseLayerWithDelta):
         self, x: torch.Tensor, bias: Optional[torch.Tensor]
     ) -> torch.Tensor:
         # (note): this is not actually used.
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -362,6 +374,7 @@ class MergedColumnParallelLinearWithDelta(ColumnParallelLinearWithDelta):
     def apply_weights(
         self, x: torch.Tensor, bias: Optional[torch.Tensor]
     ) -> torch.Tensor:
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -461,6 +474,7 @@ class MergedQKVParallelLinearWithDelta(ColumnParallelLinearWithDelta):
     def apply_weights(
         self, x: torch.Tensor, bias: Optional[torch.Tensor]
     ) -> torch.Tensor:
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -560,6 +574,7 @@ class RowParallelLinearWithDelta(BaseLayerWithDelta):
         if self.base_layer.bias is not None:
             raise ValueError(
                 "RowParallelLinearWithDelta does not support bias yet.")
+        self.wait_delta_copy()
         output = apply_delta(
             x,
             self.qweight_stacked,
@@ -701,6 +716,7 @@ class LogitsProcessorWithDelta(BaseLayerWithDelta):
     ) -> Optional[torch.Tensor]:
         # Get the logits for the next tokens.
         # TODO(xiaozhe): for now we assume there's no additional token added, so this simply performs additional matmuls on delta.
+        self.wait_delta_copy()
         logits = apply_delta_uncompressed(
             hidden_states,
             self.weight_stacked,
@@ -0,0 +1,265 @@
+"""Memory-mapped loading of compressed delta checkpoints.
+
+The default path in `DeltaModel.from_checkpoint` reads every tensor with
+`safe_open(...).get_tensor` and then calls `pin_memory()` on it, which costs
+two host copies per tensor. The reader below maps the safetensors file once
+and hands out tensors that are views into either
+
+* one page-locked slab that the selected byte ranges are copied into in a
+  single pass (`mmap`), or
+* the mapping itself, so that nothing is copied until `set_delta` moves the
+  tensor to the GPU (`mmap_lazy`).
+"""
+import os
+import json
+import mmap
+import struct
+import resource
+from dataclasses import dataclass
+from timeit import default_timer as timer
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+
+from .config import CompressionConfig
+from .delta import DeltaLayerWeights
+
+LOAD_MODES = ["safetensors", "mmap", "mmap_lazy"]
+# slab offsets are rounded up to this many bytes so that every view is
+# aligned for any dtype we may reinterpret it as
+SLAB_ALIGNMENT = 64
+
+SAFETENSORS_DTYPES = {
+    "BOOL": torch.bool,
+    "U8": torch.uint8,
+    "I8": torch.int8,
+    "I16": torch.int16,
+    "I32": torch.int32,
+    "I64": torch.int64,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "F32": torch.float32,
+    "F64": torch.float64,
+}
+
+
+UNCOMPRESSED_MODULES = [
+    "lm_head",
+    "model.embed_tokens",
+    "model.norm",
+    "input_layernorm",
+    "post_attention_layernorm",
+]
+
+DELTA_TENSOR_NAMES = ["qweight", "scales", "meta", "weight"]
+
+
+def get_load_mode() -> str:
+    load_mode = os.environ.get("DELTA_LOAD_MODE", "safetensors")
+    if load_mode not in LOAD_MODES:
+        raise ValueError(f"DELTA_LOAD_MODE must be one of {LOAD_MODES}, got {load_mode}")
+    return load_mode
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is reported in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def align_bytes(offset: int, alignment: int = SLAB_ALIGNMENT) -> int:
+    return (offset + alignment - 1) // alignment * alignment
+
+
+@dataclass
+class TensorInfo:
+    name: str
+    dtype: torch.dtype
+    shape: Tuple[int, ...]
+    # absolute byte range in the file
+    start: int
+    end: int
+
+    @property
+    def nbytes(self) -> int:
+        return self.end - self.start
+
+
+@dataclass
+class DeltaLoadStats:
+    """Timing and memory figures of a single Disk -> CPU delta load."""
+
+    load_mode: str
+    num_tensors: int
+    total_bytes: int
+    elapsed: float
+    peak_rss: int
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.total_bytes / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"[{self.load_mode}] Disk -> CPU: Loaded {self.num_tensors} tensors, "
+            f"{self.total_bytes/1024/1024:.2f} MiB in {self.elapsed:.3f} seconds "
+            f"({self.bytes_per_second/1024/1024:.2f} MiB/s), "
+            f"peak RSS {self.peak_rss/1024/1024:.2f} MiB"
+        )
+
+
+def combine_load_stats(parts: List[DeltaLoadStats]) -> DeltaLoadStats:
+    """Stats of a delta whose tensors were loaded from several files."""
+    return DeltaLoadStats(
+        load_mode=parts[0].load_mode,
+        num_tensors=sum(part.num_tensors for part in parts),
+        total_bytes=sum(part.total_bytes for part in parts),
+        elapsed=sum(part.elapsed for part in parts),
+        peak_rss=max(part.peak_rss for part in parts),
+    )
+
+
+def read_safetensors_header(path: str) -> Dict[str, TensorInfo]:
+    """Parses the header of a safetensors file without touching tensor data."""
+    with open(path, "rb") as fp:
+        (header_len,) = struct.unpack("<Q", fp.read(8))
+        header = json.loads(fp.read(header_len))
+    data_start = 8 + header_len
+    infos = {}
+    for name, meta in header.items():
+        if name == "__metadata__":
+            continue
+        if meta["dtype"] not in SAFETENSORS_DTYPES:
+            raise ValueError(f"Unsupported dtype {meta['dtype']} for tensor {name}")
+        begin, end = meta["data_offsets"]
+        infos[name] = TensorInfo(
+            name=name,
+            dtype=SAFETENSORS_DTYPES[meta["dtype"]],
+            shape=tuple(meta["shape"]),
+            start=data_start + begin,
+            end=data_start + end,
+        )
+    return infos
+
+
+class MmapSafetensorsReader:
+    """Maps a safetensors file once and serves tensors as views into it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.infos = read_safetensors_header(path)
+        with open(path, "rb") as fp:
+            # ACCESS_COPY gives a private, writable mapping, so torch can wrap
+            # it without complaining about read-only buffers and without ever
+            # writing back to the file.
+            self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_COPY)
+        self._buffer = torch.frombuffer(self._mmap, dtype=torch.uint8)
+
+    def keys(self) -> List[str]:
+        return list(self.infos.keys())
+
+    def get_tensor(self, name: str) -> torch.Tensor:
+        """Returns a zero-copy view of `name` into the mapping."""
+        info = self.infos[name]
+        raw = self._buffer[info.start : info.end]
+        if info.nbytes == 0:
+            return torch.empty(info.shape, dtype=info.dtype)
+        itemsize = torch.empty((), dtype=info.dtype).element_size()
+        if info.start % itemsize != 0:
+            # misaligned tensors cannot be reinterpreted in place
+            raw = raw.clone()
+        return raw.view(info.dtype).view(info.shape)
+
+    def load_pinned(
+        self, names: List[str], pin_memory: bool = True
+    ) -> Dict[str, torch.Tensor]:
+        """Copies `names` into one (page-locked) slab and returns views of it."""
+        offsets = {}
+        total = 0
+        for name in names:
+            offsets[name] = total
+            total = align_bytes(total + self.infos[name].nbytes)
+        slab = torch.empty(
+            total,
+            dtype=torch.uint8,
+            pin_memory=pin_memory and torch.cuda.is_available(),
+        )
+        tensors = {}
+        for name in names:
+            info = self.infos[name]
+            offset = offsets[name]
+            view = slab[offset : offset + info.nbytes]
+            view.copy_(self._buffer[info.start : info.end])
+            tensors[name] = view.view(info.dtype).view(info.shape)
+        return tensors
+
+    def close(self):
+        # views keep the mapping alive through `self._buffer`; dropping our
+        # references is enough, the OS unmaps once the last view is gone.
+        self._buffer = None
+        self._mmap = None
+
+    def __enter__(self) -> "MmapSafetensorsReader":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def load_tensors_mmap(
+    path: str,
+    key_filter: Callable[[str], bool],
+    lazy: bool = False,
+) -> Tuple[Dict[str, torch.Tensor], DeltaLoadStats]:
+    """Loads every tensor whose name passes `key_filter` from `path`.
+
+    With `lazy=False` the tensors are views into a single pinned slab, with
+    `lazy=True` they are views into the file mapping and are only paged in
+    when they are first read (i.e. by the host-to-device copy in `set_delta`).
+    """
+    start = timer()
+    with MmapSafetensorsReader(path) as reader:
+        names = [name for name in reader.keys() if key_filter(name)]
+        if lazy:
+            tensors = {name: reader.get_tensor(name) for name in names}
+        else:
+            tensors = reader.load_pinned(names)
+        total_bytes = sum(reader.infos[name].nbytes for name in names)
+    stats = DeltaLoadStats(
+        load_mode="mmap_lazy" if lazy else "mmap",
+        num_tensors=len(names),
+        total_bytes=total_bytes,
+        elapsed=timer() - start,
+        peak_rss=peak_rss_bytes(),
+    )
+    return tensors, stats
+
+
+def is_rank_local(key: str, tp_rank: int) -> bool:
+    """Keys are stored as `{module}.{tp_rank}.{tensor}`."""
+    _, rank, tensor_name = key.rsplit(".", 2)
+    return rank == str(tp_rank) and tensor_name in DELTA_TENSOR_NAMES
+
+
+def assemble_delta_weights(
+    tensors: Dict[str, torch.Tensor],
+    tp_rank: int,
+    compress_config: CompressionConfig,
+) -> Dict[str, DeltaLayerWeights]:
+    """Groups the rank-local tensors of a checkpoint into DeltaLayerWeights."""
+    module_names = set(key.rsplit(".", 2)[0] for key in tensors)
+    modules = {}
+    for module in module_names:
+        if any(y in module for y in UNCOMPRESSED_MODULES):
+            modules[module] = DeltaLayerWeights(
+                module_name=module,
+                weight=tensors[f"{module}.{tp_rank}.weight"],
+            )
+        else:
+            modules[module] = DeltaLayerWeights(
+                module_name=module,
+                qweight=tensors[f"{module}.{tp_rank}.qweight"],
+                scales=tensors[f"{module}.{tp_rank}.scales"],
+                meta=tensors[f"{module}.{tp_rank}.meta"],
+                compress_config=compress_config,
+            )
+    return modules
@@ -0,0 +1,185 @@
+"""Vectorized conversion of per-token model mappings to index tensors.
+
+Shared by the delta and the swap managers. Both keep a table from GPU slot to
+model id; `SlotTable` additionally maintains the inverse id -> slot lookup
+array, so that a whole batch is translated with one gather instead of a
+`list.index` call per token.
+"""
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import torch
+
+# lookup arrays grow geometrically, starting from this many ids
+_INITIAL_LOOKUP_SIZE = 64
+
+
+class SlotTable:
+    """Slot -> model id table with an O(1) id -> slot lookup.
+
+    Behaves like the `List[Optional[int]]` it replaces: it can be indexed,
+    assigned to, iterated and searched with `index`.
+    """
+
+    def __init__(self, num_slots: int):
+        self.num_slots = num_slots
+        self._slot_to_id: List[Optional[int]] = [None] * num_slots
+        self._id_to_slot = torch.full((_INITIAL_LOOKUP_SIZE,), -1, dtype=torch.long)
+        # bumped on every change, so cached mappings can be invalidated
+        self.version = 0
+
+    @classmethod
+    def from_list(cls, slot_to_id: Sequence[Optional[int]]) -> "SlotTable":
+        table = cls(len(slot_to_id))
+        for slot, model_id in enumerate(slot_to_id):
+            table[slot] = model_id
+        return table
+
+    def __len__(self) -> int:
+        return self.num_slots
+
+    def __iter__(self) -> Iterator[Optional[int]]:
+        return iter(self._slot_to_id)
+
+    def __getitem__(self, slot: int) -> Optional[int]:
+        return self._slot_to_id[slot]
+
+    def __setitem__(self, slot: int, model_id: Optional[int]):
+        old_id = self._slot_to_id[slot]
+        if old_id is not None:
+            self._id_to_slot[old_id] = -1
+        if model_id is not None:
+            if model_id <= 0:
+                raise ValueError(f"model id must be > 0, got {model_id}")
+            if model_id >= len(self._id_to_slot):
+                self._grow(model_id + 1)
+            self._id_to_slot[model_id] = slot
+        self._slot_to_id[slot] = model_id
+        self.version += 1
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return f"SlotTable({self._slot_to_id})"
+
+    def _grow(self, min_size: int):
+        size = len(self._id_to_slot)
+        while size < min_size:
+            size *= 2
+        lookup = torch.full((size,), -1, dtype=torch.long)
+        lookup[: len(self._id_to_slot)] = self._id_to_slot
+        self._id_to_slot = lookup
+
+    def index(self, model_id: int) -> int:
+        """Slot of `model_id`, raises ValueError like `list.index`."""
+        if 0 < model_id < len(self._id_to_slot):
+            slot = int(self._id_to_slot[model_id])
+            if slot >= 0:
+                return slot
+        raise ValueError(f"{model_id} is not in slot table")
+
+    def reset(self):
+        self._slot_to_id = [None] * self.num_slots
+        self._id_to_slot.fill_(-1)
+        self.version += 1
+
+    def lookup(self, model_ids: Sequence[int]) -> torch.Tensor:
+        """Slots of a batch of model ids; ids <= 0 (no model) map to -1."""
+        ids = torch.as_tensor(model_ids, dtype=torch.long)
+        has_model = ids > 0
+        known = has_model & (ids < len(self._id_to_slot))
+        slots = torch.full_like(ids, -1)
+        slots[known] = self._id_to_slot[ids[known]]
+        missing = has_model & (slots < 0)
+        if missing.any():
+            raise ValueError(
+                f"{ids[missing][0].item()} is not in slot table {self._slot_to_id}"
+            )
+        return slots
+
+
+class _ArangeCache:
+    """Keeps one `arange` around instead of allocating one per step."""
+
+    def __init__(self):
+        self._arange = torch.arange(0, dtype=torch.long)
+
+    def get(self, n: int) -> torch.Tensor:
+        if n > len(self._arange):
+            self._arange = torch.arange(max(n, 2 * len(self._arange)), dtype=torch.long)
+        return self._arange[:n]
+
+
+_arange_cache = _ArangeCache()
+
+
+def convert_mapping(
+    mapping,
+    index_to_id: Union[SlotTable, Sequence[Optional[int]]],
+    max_models: int,
+    vocab_size: int,
+    extra_vocab_size: int,
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, Tuple[int, ...]]:
+    """Converts a DeltaMapping/ModelMapping to index tensors.
+
+    The tensors are built on the CPU; the managers copy them into their
+    persistent device buffers.
+
+    Args:
+        mapping: DeltaMapping/ModelMapping mapping rows in a batch to ids.
+        index_to_id: SlotTable (or plain list) mapping slots to ids.
+        max_models: Maximum number of models.
+        vocab_size: Model vocab size.
+        extra_vocab_size: Extra vocab size each model can have.
+
+    Returns:
+        A tuple of tensors:
+            base_indices: Tensor of shape [batch_size] mapping batch rows to
+                slot indices.
+            sampler_indices: Tensor of shape [batch_size] mapping requests to
+                slot indices for sampler. For generation, this will be the
+                same as base_indicies. For prefill, this will map requests
+                to slot indices.
+            sampler_indices_padded: Tensor of shape [batch_size] mapping
+                requests to slot indices for sampler with padding.
+                Same as sampler_indicies, but -1 is replaced with
+                max_models - 1.
+            embeddings_indices: Tensor of shape [2, batch_size] mapping
+                requests to embedding indices. First row is for embeddings
+                added by the models, second row is for the model embeddings.
+            indices_len: Lengths of the above tensors.
+    """
+    if not isinstance(index_to_id, SlotTable):
+        index_to_id = SlotTable.from_list(index_to_id)
+    base_indices = index_to_id.lookup(mapping.index_mapping)
+    sampler_indices = index_to_id.lookup(mapping.prompt_mapping)
+    # tokens without a model read the embeddings of slot 0
+    embedding_slots = base_indices.clamp(min=0)
+    embeddings_indices = torch.stack(
+        [
+            embedding_slots * extra_vocab_size,
+            embedding_slots * (vocab_size + extra_vocab_size),
+        ]
+    )
+    num_sampled = sampler_indices.shape[-1]
+    sampler_indices_padded = torch.where(
+        sampler_indices == -1,
+        torch.full_like(sampler_indices, max_models - 1),
+        sampler_indices,
+    )
+    sampler_indices_padded = (
+        _arange_cache.get(num_sampled) + sampler_indices_padded * num_sampled
+    )
+    indices_len = (
+        base_indices.shape[-1],
+        sampler_indices.shape[-1],
+        sampler_indices_padded.shape[-1],
+        embeddings_indices.shape[-1],
+    )
+    return (
+        base_indices,
+        sampler_indices,
+        sampler_indices_padded,
+        embeddings_indices,
+        indices_len,
+    )
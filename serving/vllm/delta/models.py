@@ -9,6 +9,20 @@ import torch.nn as nn
 from typing import Dict, Optional, List, Callable, Hashable, Any, Type, Tuple
 from .delta import DeltaLayerWeights, PackedDeltaLayerWeights
 from .config import DeltaConfig, CompressionConfig
+from .loader import (
+    DeltaLoadStats,
+    align_bytes,
+    assemble_delta_weights,
+    combine_load_stats,
+    get_load_mode,
+    is_rank_local,
+    load_tensors_mmap,
+    peak_rss_bytes,
+)
+from .host_cache import GreedyDualSizeCache, PinnedSlab
+from .shards import get_delta_tensor_filename
+from .mapping import SlotTable, convert_mapping
+from .pipeline import DeltaCopyPipeline, group_modules_by_layer
 import threading
 from .utils import (
     replace_submodule,
@@ -66,85 +80,6 @@ else:
     )
 
 
-def convert_mapping(
-    mapping: DeltaMapping,
-    delta_index_to_id: List[Optional[int]],
-    max_deltas: int,
-    vocab_size: int,
-    extra_vocab_size: int,
-) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, List[int]]:
-    """Converts DeltaMapping to index tensors.
-
-    Args:
-        mapping: DeltaMapping mapping rows in a batch to Delta ids.
-        delta_index_to_id: List mapping Delta ids to Delta indices.
-        max_deltas: Maximum number of Deltas.
-        vocab_size: Model vocab size.
-        extra_vocab_size: Extra vocab size each Delta can have.
-
-    Returns:
-        A tuple of tensors:
-            base_indices: Tensor of shape [batch_size] mapping batch rows to
-                Delta indices.
-            sampler_indices: Tensor of shape [batch_size] mapping requests to
-                Delta indices for sampler. For generation, this will be the
-                same as base_indicies. For prefill, this will map requests
-                to Delta indices.
-            sampler_indices_padded: Tensor of shape [batch_size] mapping
-                requests to Delta indices for sampler with padding.
-                Same as sampler_indicies, but -1 is replaced with
-                max_deltas.
-            embeddings_indices: Tensor of shape [2, batch_size] mapping
-                requests to embedding indices. First row is for embeddings
-                added by the Deltas, second row is for the Delta.emb
-                embeddings.
-            indices_len: List of lengths of the above tensors.
-    """
-    indices = list(mapping.index_mapping).copy()
-    embedding_indices = indices.copy()
-    delta_indices = indices.copy()
-    prompt_mapping = [
-        delta_index_to_id.index(x) if x > 0 else -1 for x in mapping.prompt_mapping
-    ]
-    delta_idx = None
-    for i in range(len(indices)):
-        # TODO index can be slow. optimize
-        delta_idx = delta_index_to_id.index(indices[i]) if indices[i] > 0 else -1
-        embedding_indices[i] = delta_idx if indices[i] > 0 else 0
-        indices[i] = i
-        delta_indices[i] = delta_idx
-
-    indices = torch.tensor(
-        [indices, delta_indices, embedding_indices], dtype=torch.long, device="cuda"
-    )
-    prompt_mapping = torch.tensor(prompt_mapping, device="cuda", dtype=torch.long)
-    embeddings_indices = torch.stack(
-        [indices[2] * extra_vocab_size, indices[2] * (vocab_size + extra_vocab_size)]
-    )
-    embeddings_indices[embeddings_indices == -1] = max_deltas - 1
-    base_indices = indices[1]
-    sampler_indices = prompt_mapping
-    sampler_indices_padded = sampler_indices.clone()
-    sampler_indices_padded[sampler_indices_padded == -1] = max_deltas - 1
-    sampler_indices_padded = torch.arange(
-        0, len(sampler_indices_padded), device="cuda", dtype=torch.long
-    ) + (sampler_indices_padded * len(sampler_indices_padded))
-    indices_len = (
-        base_indices.shape[-1],
-        sampler_indices.shape[-1],
-        sampler_indices_padded.shape[-1],
-        embeddings_indices.shape[-1],
-    )
-
-    return (
-        base_indices,
-        sampler_indices,
-        sampler_indices_padded,
-        embeddings_indices,
-        indices_len,
-    )
-
-
 def get_delta_id():
     global _GLOBAL_DELTA_ID
     _GLOBAL_DELTA_ID += 1
@@ -163,10 +98,18 @@ class DeltaModel:
         self.id = delta_model_id
         self.deltas: Dict[str, DeltaLayerWeights] = deltas
         self.bitwidth = bitwidth
+        self.load_stats: Optional[DeltaLoadStats] = None
+        # set when the tensors live in a ByteBudgetDeltaModelManager slab
+        self.slab_offset: Optional[int] = None
+        self.copy_done_event: Optional[torch.cuda.Event] = None
 
     def get_delta(self, module_name: str) -> Optional[DeltaLayerWeights]:
         return self.deltas.get(module_name, None)
 
+    @property
+    def nbytes(self) -> int:
+        return sum(delta.nbytes for delta in self.deltas.values())
+
     @classmethod
     def from_checkpoint(
         cls,
@@ -176,6 +119,7 @@ class DeltaModel:
         trust_remote_code: bool = False,
         prefetch_thread_event: threading.Event = None,
         discard_prefetching_event: threading.Event = None,
+        load_mode: Optional[str] = None,
     ) -> "DeltaModel":
         use_marlin = True
         # get tp rank here
@@ -190,8 +134,11 @@ class DeltaModel:
         compress_config = CompressionConfig.from_pretrained(path_or_name)
         logger.debug(f"Loaded DeltaModel from {path_or_name}, config: {config}")
         if use_marlin:
-            # model_tensor_filenames = [f"model.tp{tp_size}.safetensors"]
-            model_tensor_filenames = [f"deltazip-compressed.safetensors"]
+            # rank-local shards if the checkpoint has been converted,
+            # the monolithic deltazip-compressed.safetensors otherwise
+            model_tensor_filenames = [
+                get_delta_tensor_filename(path_or_name, tp_rank, tp_size)
+            ]
         else:
             raise ValueError("Only Marlin is supported for now")
         logger.info(f"Loading from {model_tensor_filenames}")
@@ -204,64 +151,69 @@ class DeltaModel:
         torch.nn.init.normal_ = skip
         transformers.modeling_utils._init_weights = False
 
-        # TODO(xiaozhe): this should be specified by each model
-        uncompressed_modules = [
-            "lm_head",
-            "model.embed_tokens",
-            "model.norm",
-            "input_layernorm",
-            "post_attention_layernorm",
-        ]
         tensors = {}
         bitwidth = compress_config.bits
         logger.info(
             f"[{'main' if prefetch_thread_event is None else 'prefetching'}] Lossless Compression Disabled"
         )
+        if load_mode is None:
+            load_mode = get_load_mode()
         modules = {}
-        for mtf in model_tensor_filenames:
-            with safe_open(os.path.join(path_or_name, mtf), "torch") as f:
-                keys = f.keys()
-                if discard_prefetching_event is not None:
-                    if discard_prefetching_event.is_set():
-                        logger.info("Discarding prefetching")
-                        return None
-                if prefetch_thread_event is not None:
-                    prefetch_thread_event.wait()
-                module_names = set(
-                    [
-                        x.rsplit(".", 2)[0]
-                        for x in keys
-                        if all([y not in x for y in uncompressed_modules])
-                    ]
+        load_stats = None
+        if load_mode == "safetensors":
+            start = timer()
+            num_tensors = 0
+            total_bytes = 0
+            for mtf in model_tensor_filenames:
+                with safe_open(os.path.join(path_or_name, mtf), "torch") as f:
+                    keys = f.keys()
+                    if discard_prefetching_event is not None:
+                        if discard_prefetching_event.is_set():
+                            logger.info("Discarding prefetching")
+                            return None
+                    if prefetch_thread_event is not None:
+                        prefetch_thread_event.wait()
+                    tensors = {
+                        key: f.get_tensor(key).pin_memory()
+                        for key in keys
+                        if is_rank_local(key, tp_rank)
+                    }
+                    num_tensors += len(tensors)
+                    total_bytes += total_bytes_count(tensors)
+                    modules.update(
+                        assemble_delta_weights(tensors, tp_rank, compress_config)
+                    )
+            load_stats = DeltaLoadStats(
+                load_mode=load_mode,
+                num_tensors=num_tensors,
+                total_bytes=total_bytes,
+                elapsed=timer() - start,
+                peak_rss=peak_rss_bytes(),
+            )
+        else:
+            if discard_prefetching_event is not None:
+                if discard_prefetching_event.is_set():
+                    logger.info("Discarding prefetching")
+                    return None
+            if prefetch_thread_event is not None:
+                prefetch_thread_event.wait()
+            file_stats = []
+            for mtf in model_tensor_filenames:
+                tensors, stats = load_tensors_mmap(
+                    os.path.join(path_or_name, mtf),
+                    key_filter=lambda key: is_rank_local(key, tp_rank),
+                    lazy=load_mode == "mmap_lazy",
                 )
-                for module in module_names:
-                    if use_marlin:
-                        modules[module] = DeltaLayerWeights(
-                            module_name=module,
-                            qweight=f.get_tensor(f"{module}.{tp_rank}.qweight").pin_memory(),
-                            scales=f.get_tensor(f"{module}.{tp_rank}.scales").pin_memory(),
-                            meta=f.get_tensor(f"{module}.{tp_rank}.meta").pin_memory(),
-                            compress_config=compress_config,
-                        )
-                remaining_module_names = set(
-                    [
-                        x.rsplit(".", 2)[0]
-                        for x in keys
-                        if any([y in x for y in uncompressed_modules])
-                    ]
+                file_stats.append(stats)
+                modules.update(
+                    assemble_delta_weights(tensors, tp_rank, compress_config)
                 )
-                # print(f"remaining_module_names: {remaining_module_names}")
-                for module in remaining_module_names:
-                    modules[module] = DeltaLayerWeights(
-                        module_name=module,
-                        weight=f.get_tensor(f"{module}.{tp_rank}.weight").pin_memory(),
-                    )
-        # total_bytes = total_bytes_count(tensors)
-        # logger.info(
-        #     f"Disk -> CPU: Loaded {total_bytes/1024/1024:.2f} MiB in {end - start:.3f} seconds"
-        # )
+            load_stats = combine_load_stats(file_stats)
+        logger.info(str(load_stats))
         del tensors
-        return cls(id, bitwidth, modules)
+        delta_model = cls(id, bitwidth, modules)
+        delta_model.load_stats = load_stats
+        return delta_model
 
 class DeltaModelManager:
     """A manager that manages multiple full-fine-tuned models."""
@@ -280,7 +232,7 @@ class DeltaModelManager:
             self.capacity >= self.delta_slots
         ), "capacity must be greater than delta_slots"
         self.max_num_batched_tokens = math.ceil(max_num_batched_tokens / 8) * 8
-        self.delta_index_to_id: List[Optional[int]] = [None] * self.delta_slots
+        self.delta_index_to_id = SlotTable(self.delta_slots)
         self.vocab_size = vocab_size
         self.base_indices = torch.empty(
             self.max_num_batched_tokens, dtype=torch.long, device="cuda"
@@ -309,11 +261,18 @@ class DeltaModelManager:
 
         self._registered_deltas: Dict[int, DeltaModel] = {}
         self._active_deltas: Dict[int, None] = {}
+        # deltas evicted from the CPU cache / from a GPU slot to make room
+        self.num_cpu_evictions = 0
+        self.num_gpu_evictions = 0
 
         self._last_mapping = None
         self._create_delta_modules()
         self.model.delta_manager = self
         self.current_kernel = delta_config.kernel
+        self.copy_pipeline: Optional[DeltaCopyPipeline] = None
+        if delta_config.pipelined_activation:
+            self.copy_pipeline = DeltaCopyPipeline()
+            self._layer_groups = group_modules_by_layer(self.modules)
 
     @property
     def capacity(self) -> int:
@@ -346,7 +305,7 @@ class DeltaModelManager:
         delta_model = self._registered_deltas[delta_id]
         self.delta_index_to_id[index] = delta_model.id
 
-        for module_name, module in self.modules.items():
+        def copy_module(module_name: str, module: "BaseLayerWithDelta"):
             module_delta = delta_model.get_delta(module_name)
             if module_delta:
                 if module_delta._compressed:
@@ -367,8 +326,23 @@ class DeltaModelManager:
                     )
             else:
                 module.reset_delta(index)
+
+        if self.copy_pipeline is not None:
+            # the forward pass waits per layer, not on the whole delta
+            delta_model.copy_done_event = self.copy_pipeline.copy(
+                self._layer_groups, copy_module
+            )
+        else:
+            for module_name, module in self.modules.items():
+                copy_module(module_name, module)
         return True
 
+    def wait_delta_copies(self):
+        """Waits for all pipelined copies, for forward passes that cannot wait
+        layer by layer (CUDA graph replay)."""
+        for module in self.modules.values():
+            module.wait_delta_copy()
+
     def _deactivate_delta(self, delta_id: int):
         try:
             index = self.delta_index_to_id.index(delta_id)
@@ -403,7 +377,6 @@ class DeltaModelManager:
         self.deactivate_delta(delta_id)
         return bool(self._registered_deltas.pop(delta_id, None))
 
-    # TODO see if this can be vectorized
     def _set_delta_mapping(self, mapping: DeltaMapping) -> None:
         (
             base_indices,
@@ -430,9 +403,11 @@ class DeltaModelManager:
         self.indices_len[:] = indices_len
 
     def set_delta_mapping(self, delta_mapping: DeltaMapping) -> None:
-        if self._last_mapping != delta_mapping:
+        # the indices also depend on which slot each delta occupies
+        mapping_key = (delta_mapping, self.delta_index_to_id.version)
+        if self._last_mapping != mapping_key:
             self._set_delta_mapping(delta_mapping)
-        self._last_mapping = delta_mapping
+        self._last_mapping = mapping_key
 
     def list_deltas(self) -> Dict[int, DeltaModel]:
         """List all registered DeltaModels."""
@@ -444,7 +419,7 @@ class DeltaModelManager:
     def remove_all_deltas(self) -> bool:
         """Remove all DeltaModels from the manager."""
         self._registered_deltas.clear()
-        self.delta_index_to_id = [None] * self.delta_slots
+        self.delta_index_to_id.reset()
         self._active_deltas.clear()
 
     def _create_delta_modules(self):
@@ -545,6 +520,34 @@ class DeltaLRUCache(LRUCache):
         self.deactivate_delta_fn(key)
         return super()._on_remove(key, value)
 
+    def eviction_order(self) -> List[Hashable]:
+        return list(self.cache.keys())
+
+
+class DeltaGreedyDualSizeCache(GreedyDualSizeCache):
+    """CPU cache of deltas carved from a pinned slab, evicted by GDS."""
+
+    def __init__(
+        self,
+        capacity: int,
+        deactivate_delta_fn: Callable[[Hashable], None],
+        slab: PinnedSlab,
+    ):
+        super().__init__(capacity, size_fn=lambda delta: delta.nbytes)
+        self.deactivate_delta_fn = deactivate_delta_fn
+        self.slab = slab
+
+    def _on_remove(self, key: Hashable, value: Any):
+        logger.debug(f"Removing Delta. int id: {key}")
+        self.deactivate_delta_fn(key)
+        if value is not None and value.slab_offset is not None:
+            # pending host-to-device copies may still read from the region
+            if value.copy_done_event is not None:
+                value.copy_done_event.synchronize()
+            self.slab.free(value.slab_offset)
+            value.slab_offset = None
+        return super()._on_remove(key, value)
+
 
 class LRUCacheDeltaModelManager(DeltaModelManager):
     """A model manager that manages multiple Deltas with LRU cache."""
@@ -567,6 +570,23 @@ class LRUCacheDeltaModelManager(DeltaModelManager):
             self.delta_slots, self._deactivate_delta
         )
 
+    def has_room(self, delta: DeltaModel) -> bool:
+        """Whether `delta` can be added without evicting anything."""
+        return len(self._registered_deltas) < self.capacity
+
+    def make_room(self, delta: DeltaModel, evict_active: bool = True) -> bool:
+        """Evicts deltas until `delta` fits, those without a GPU slot first.
+
+        Returns False if `delta` does not fit even after evicting everything
+        that may be evicted.
+        """
+        while not self.has_room(delta):
+            if self.remove_oldest_inactive_delta():
+                continue
+            if not evict_active or not self.remove_oldest_delta():
+                return False
+        return True
+
     def list_deltas(self) -> Dict[int, DeltaModel]:
         """List all registered DeltaModels."""
         return dict(self._registered_deltas.cache)
@@ -574,6 +594,10 @@ class LRUCacheDeltaModelManager(DeltaModelManager):
     def add_delta(self, delta: DeltaModel) -> bool:
         """Add a DeltaModel to the manager."""
         if delta.id not in self._registered_deltas:
+            # evict here rather than inside the cache, so that evictions are
+            # counted and the new delta is never its own victim
+            while len(self._registered_deltas) >= self.capacity:
+                self.remove_oldest_delta()
             self._add_delta(delta)
             was_added = True
         else:
@@ -591,6 +615,7 @@ class LRUCacheDeltaModelManager(DeltaModelManager):
             and len(self._active_deltas) >= self.delta_slots
         ):
             self._active_deltas.remove_oldest()
+            self.num_gpu_evictions += 1
         result = super().activate_delta(delta_id)
         # We always touch to update the LRU cache order
         self._active_deltas.touch(delta_id)
@@ -599,9 +624,93 @@ class LRUCacheDeltaModelManager(DeltaModelManager):
     def remove_oldest_delta(self) -> bool:
         if len(self._registered_deltas) > 0:
             self._registered_deltas.remove_oldest()
+            self.num_cpu_evictions += 1
             return True
         return False
 
+    def remove_oldest_inactive_delta(self) -> bool:
+        """Evicts the least recently used delta that is not in a GPU slot."""
+        for delta_id in self._registered_deltas.eviction_order():
+            if delta_id not in self._active_deltas:
+                self._registered_deltas.pop(delta_id)
+                self.num_cpu_evictions += 1
+                return True
+        return False
+
+class ByteBudgetDeltaModelManager(LRUCacheDeltaModelManager):
+    """LRU/GDS model manager whose CPU tier is bounded by bytes, not models.
+
+    Deltas are copied into a preallocated pinned slab of
+    `delta_config.cpu_delta_cache_bytes` bytes when they are added and are
+    evicted by GreedyDual-Size, so that a 13B 4-bit delta does not take the
+    same share of the budget as a 7B 2-bit one.
+    """
+
+    def __init__(
+        self,
+        model: nn.Module,
+        max_num_seqs: int,
+        max_num_batched_tokens: int,
+        vocab_size: int,
+        delta_config: DeltaConfig,
+    ):
+        super().__init__(
+            model, max_num_seqs, max_num_batched_tokens, vocab_size, delta_config
+        )
+        self.slab = PinnedSlab(delta_config.cpu_delta_cache_bytes)
+        self._registered_deltas: DeltaGreedyDualSizeCache = DeltaGreedyDualSizeCache(
+            self.capacity, self.deactivate_delta, self.slab
+        )
+        logger.info(
+            f"Allocated {self.slab.capacity_bytes/1024/1024:.2f} MiB pinned delta cache"
+        )
+
+    @staticmethod
+    def _slab_bytes(delta: DeltaModel) -> int:
+        return sum(
+            align_bytes(tensor.nbytes)
+            for layer in delta.deltas.values()
+            for tensor in layer.tensors().values()
+        )
+
+    def has_room(self, delta: DeltaModel) -> bool:
+        return super().has_room(delta) and self.slab.can_allocate(
+            self._slab_bytes(delta)
+        )
+
+    def _carve(self, delta: DeltaModel, offset: int):
+        """Moves all tensors of `delta` into the slab, starting at `offset`."""
+        for layer in delta.deltas.values():
+            for attr, tensor in layer.tensors().items():
+                view = self.slab.view(offset, tensor.nbytes)
+                view.copy_(tensor.contiguous().view(-1).view(torch.uint8))
+                setattr(layer, attr, view.view(tensor.dtype).view(tensor.shape))
+                offset += align_bytes(tensor.nbytes)
+
+    def _add_delta(self, delta: DeltaModel):
+        slab_bytes = self._slab_bytes(delta)
+        offset = self.slab.allocate(slab_bytes)
+        if offset is None:
+            raise RuntimeError(
+                f"Delta {delta.id} ({slab_bytes/1024/1024:.2f} MiB) does not fit "
+                f"in the pinned delta cache "
+                f"({self.slab.free_bytes/1024/1024:.2f} MiB free)."
+            )
+        self._carve(delta, offset)
+        delta.slab_offset = offset
+        super()._add_delta(delta)
+
+    def activate_delta(self, delta_id: int) -> bool:
+        result = super().activate_delta(delta_id)
+        # a hit refreshes the GDS credit of the delta
+        self._registered_deltas.touch(delta_id)
+        if result and torch.cuda.is_available() and self.copy_pipeline is None:
+            delta = self._registered_deltas.cache[delta_id]
+            delta.copy_done_event = torch.cuda.Event()
+            delta.copy_done_event.record()
+        return result
+
+
 def create_delta_manager(
     model: nn.Module,
     max_num_seqs: int,
@@ -0,0 +1,114 @@
+"""Layer-pipelined activation of deltas.
+
+`DeltaModelManager.activate_delta` copies every module of a delta into its
+GPU slot before the step can start. With pipelining, the copies are issued
+layer by layer on a dedicated stream and an event is recorded after each
+layer. Every delta layer waits only on the event of its own decoder layer
+right before it applies the delta, so the copies of later layers overlap
+with the forward pass through earlier ones.
+
+Without CUDA the copies run synchronously and the events are already
+complete, which keeps the ordering logic testable on CPU.
+"""
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+_LAYER_INDEX = re.compile(r"(?:^|\.)layers\.(\d+)\.")
+
+
+class SyncEvent:
+    """Stands in for a `torch.cuda.Event` when copies run synchronously."""
+
+    def record(self, stream=None) -> None:
+        pass
+
+    def wait(self, stream=None) -> None:
+        pass
+
+    def query(self) -> bool:
+        return True
+
+    def synchronize(self) -> None:
+        pass
+
+
+def delta_layer_index(module_name: str) -> float:
+    """Position of `module_name` in the forward pass.
+
+    Modules inside decoder layers are ordered by their layer index, input
+    embeddings come before all layers and everything else (lm_head, logits)
+    after them.
+    """
+    match = _LAYER_INDEX.search(module_name)
+    if match is not None:
+        return int(match.group(1))
+    if "embed" in module_name:
+        return -1
+    return math.inf
+
+
+def group_modules_by_layer(
+    modules: Dict[str, nn.Module]
+) -> List[Tuple[float, List[Tuple[str, nn.Module]]]]:
+    """Groups `modules` by decoder layer, in forward pass order."""
+    groups: Dict[float, List[Tuple[str, nn.Module]]] = {}
+    for module_name, module in modules.items():
+        groups.setdefault(delta_layer_index(module_name), []).append(
+            (module_name, module)
+        )
+    return sorted(groups.items(), key=lambda group: group[0])
+
+
+class DeltaCopyPipeline:
+    """Issues per-layer delta copies on a side stream, one event per layer.
+
+    Args:
+        use_cuda: Whether to copy on a CUDA side stream. Defaults to whether
+            CUDA is available; if False, copies run synchronously.
+    """
+
+    def __init__(self, use_cuda: Optional[bool] = None):
+        self.use_cuda = torch.cuda.is_available() if use_cuda is None else use_cuda
+        self.stream = torch.cuda.Stream() if self.use_cuda else None
+        # layer order of the most recent copy, for logging and tests
+        self.last_order: List[float] = []
+
+    def _new_event(self):
+        return torch.cuda.Event() if self.use_cuda else SyncEvent()
+
+    def copy(
+        self,
+        groups: List[Tuple[float, List[Tuple[str, nn.Module]]]],
+        copy_fn: Callable[[str, nn.Module], None],
+    ):
+        """Runs `copy_fn` for every module, layer by layer.
+
+        After each layer an event is recorded and attached to the layer's
+        modules as `copy_event`; `BaseLayerWithDelta.wait_delta_copy` makes
+        the compute stream wait on it. Returns the event of the last layer,
+        which completes once the whole delta is on the GPU.
+        """
+        self.last_order = []
+        event = self._new_event()
+        if self.use_cuda:
+            # the slot may still be read by kernels of the previous step
+            self.stream.wait_stream(torch.cuda.current_stream())
+        for layer_index, layer_modules in groups:
+            event = self._new_event()
+            if self.use_cuda:
+                with torch.cuda.stream(self.stream):
+                    for module_name, module in layer_modules:
+                        copy_fn(module_name, module)
+                    event.record(self.stream)
+            else:
+                for module_name, module in layer_modules:
+                    copy_fn(module_name, module)
+                event.record()
+            for _, module in layer_modules:
+                module.copy_event = event
+            self.last_order.append(layer_index)
+        return event
@@ -0,0 +1,264 @@
+"""Popularity-predictive prefetching of deltas.
+
+The worker prefetcher (`prefetch.py`) only loads a delta once a request for it
+has arrived. `PredictivePrefetcher` learns from the arrival history which
+deltas are likely to be requested next and queues them for the CPU cache
+ahead of time, bounded by a byte budget. Two popularity models are provided:
+
+* `ewma`: an exponentially decayed request frequency per delta, which tracks
+  slowly drifting popularity.
+* `markov`: a first-order Markov chain over the sequence of requested deltas,
+  which captures workloads where one delta reliably follows another.
+"""
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+from vllm.logger import init_logger
+from .request import DeltaRequest
+
+logger = init_logger(__name__)
+
+# predictive prefetches are queued behind every reactive one, whose priority
+# is the submission time
+PREDICTIVE_PRIORITY_OFFSET = 3600.0
+
+
+class PopularityModel:
+    """Scores deltas by how likely they are to be requested soon."""
+
+    def observe(self, delta_int_id: int, now: float) -> None:
+        raise NotImplementedError
+
+    def scores(self, now: float) -> Dict[int, float]:
+        raise NotImplementedError
+
+
+class EWMAPopularity(PopularityModel):
+    """Request frequency with exponential decay.
+
+    Every request adds 1 to the score of its delta, and all scores halve
+    every `half_life` seconds.
+    """
+
+    def __init__(self, half_life: float = 60.0):
+        if half_life <= 0:
+            raise ValueError(f"half_life must be > 0, got {half_life}")
+        self.half_life = half_life
+        # delta id -> (score, time of the last update)
+        self._scores: Dict[int, tuple] = {}
+
+    def _decayed(self, delta_int_id: int, now: float) -> float:
+        score, last = self._scores.get(delta_int_id, (0.0, now))
+        return score * 0.5 ** (max(now - last, 0.0) / self.half_life)
+
+    def observe(self, delta_int_id: int, now: float) -> None:
+        self._scores[delta_int_id] = (self._decayed(delta_int_id, now) + 1.0, now)
+
+    def scores(self, now: float) -> Dict[int, float]:
+        return {
+            delta_int_id: self._decayed(delta_int_id, now)
+            for delta_int_id in self._scores
+        }
+
+
+class MarkovPopularity(PopularityModel):
+    """First-order Markov chain over the delta request sequence.
+
+    Scores are the (decayed) transition counts out of the last requested
+    delta. Counts are multiplied by `decay` on every transition out of the
+    same delta, so that the chain follows changes in the workload.
+    """
+
+    def __init__(self, decay: float = 0.95):
+        if not 0 < decay <= 1:
+            raise ValueError(f"decay must be in (0, 1], got {decay}")
+        self.decay = decay
+        self._transitions: Dict[int, Dict[int, float]] = {}
+        self._last: Optional[int] = None
+
+    def observe(self, delta_int_id: int, now: float) -> None:
+        if self._last is not None:
+            row = self._transitions.setdefault(self._last, {})
+            for next_id in row:
+                row[next_id] *= self.decay
+            row[delta_int_id] = row.get(delta_int_id, 0.0) + 1.0
+        self._last = delta_int_id
+
+    def scores(self, now: float) -> Dict[int, float]:
+        if self._last is None:
+            return {}
+        row = self._transitions.get(self._last, {})
+        total = sum(row.values())
+        if total == 0:
+            return {}
+        return {next_id: count / total for next_id, count in row.items()}
+
+
+POPULARITY_MODELS = {"ewma": EWMAPopularity, "markov": MarkovPopularity}
+
+
+def get_popularity_model(name: str, **kwargs) -> PopularityModel:
+    if name not in POPULARITY_MODELS:
+        raise ValueError(
+            f"Unknown popularity model {name}, "
+            f"expected one of {list(POPULARITY_MODELS)}"
+        )
+    return POPULARITY_MODELS[name](**kwargs)
+
+
+@dataclass
+class PredictivePrefetchStats:
+    """Counters of the predictive prefetcher since engine start."""
+
+    num_arrivals: int = 0
+    # predictive prefetches issued, how many of them were requested and how
+    # many were given up before that
+    num_prefetched: int = 0
+    num_hits: int = 0
+    num_given_up: int = 0
+    bytes_prefetched: int = 0
+    # bytes of prefetches that were given up without being requested
+    wasted_bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of settled predictive prefetches that were requested."""
+        settled = self.num_hits + self.num_given_up
+        return self.num_hits / settled if settled else 0.0
+
+    @property
+    def coverage(self) -> float:
+        """Fraction of arrivals that found their delta prefetched."""
+        return self.num_hits / self.num_arrivals if self.num_arrivals else 0.0
+
+
+class PredictivePrefetcher:
+    """Warms the CPU cache with the deltas a popularity model expects next.
+
+    On every arrival the model is updated and re-ranks all deltas seen so far.
+    The best ranked ones are prefetched as long as their total size stays
+    within `budget_bytes` (and their number within `max_deltas`). Only
+    deltas whose load was actually queued count as predictions. A delta
+    that drops out of the ranking before it is requested is given up: its
+    bytes no longer count against the budget and its load is cancelled.
+    Bytes that were read anyway are accounted as wasted; a delta that was
+    already loaded is evicted by the CPU cache when it needs the room.
+
+    Args:
+        model: The popularity model.
+        prefetch_fn: Queues a delta load, given the request and a priority.
+            Returns False if nothing was queued, e.g. because the delta is
+            cached or already being loaded.
+        size_fn: Bytes a delta occupies in the CPU cache.
+        budget_bytes: Upper bound on the bytes of outstanding predictions.
+        max_deltas: Upper bound on the number of outstanding predictions.
+        is_cached_fn: Whether a delta is in the CPU cache. If given, a
+            requested prediction is only a hit if its load was admitted to
+            the cache, otherwise it is given up.
+        cancel_fn: Cancels the queued or in-flight load of a delta id.
+            Returns True if the load was dropped before anything was read,
+            which is then not accounted as wasted.
+    """
+
+    def __init__(
+        self,
+        model: PopularityModel,
+        prefetch_fn: Callable[[DeltaRequest, float], bool],
+        size_fn: Callable[[DeltaRequest], int],
+        budget_bytes: int,
+        max_deltas: Optional[int] = None,
+        is_cached_fn: Optional[Callable[[int], bool]] = None,
+        cancel_fn: Optional[Callable[[int], bool]] = None,
+    ):
+        if budget_bytes <= 0:
+            raise ValueError(f"budget_bytes must be > 0, got {budget_bytes}")
+        self.model = model
+        self._prefetch_fn = prefetch_fn
+        self._is_cached_fn = is_cached_fn
+        self._cancel_fn = cancel_fn
+        self._size_fn = size_fn
+        self.budget_bytes = budget_bytes
+        self.max_deltas = max_deltas
+        self.stats = PredictivePrefetchStats()
+        # every delta seen so far, only these can be prefetched
+        self._requests: Dict[int, DeltaRequest] = {}
+        self._sizes: Dict[int, int] = {}
+        # delta id -> bytes of predictions that were not requested yet
+        self._outstanding: Dict[int, int] = {}
+
+    @property
+    def outstanding_bytes(self) -> int:
+        return sum(self._outstanding.values())
+
+    def outstanding_deltas(self) -> List[int]:
+        return list(self._outstanding)
+
+    def _size(self, delta_int_id: int) -> int:
+        if delta_int_id not in self._sizes:
+            self._sizes[delta_int_id] = self._size_fn(self._requests[delta_int_id])
+        return self._sizes[delta_int_id]
+
+    def observe(self, delta_request: DeltaRequest, now: Optional[float] = None):
+        """Records an arrival for `delta_request` and updates the prefetches."""
+        now = time.time() if now is None else now
+        delta_int_id = delta_request.delta_int_id
+        self.stats.num_arrivals += 1
+        self._requests[delta_int_id] = delta_request
+        size = self._outstanding.pop(delta_int_id, None)
+        if size is not None:
+            if self._is_cached_fn is None or self._is_cached_fn(delta_int_id):
+                self.stats.num_hits += 1
+            else:
+                # the load was not admitted to the cache, or evicted again
+                self.stats.wasted_bytes += size
+                self.stats.num_given_up += 1
+        self.model.observe(delta_int_id, now)
+        self._plan(now, requested=delta_int_id)
+
+    def _plan(self, now: float, requested: int):
+        ranking = sorted(
+            (
+                (score, delta_int_id)
+                for delta_int_id, score in self.model.scores(now).items()
+                # the requested delta is loaded on demand anyway
+                if delta_int_id != requested and delta_int_id in self._requests
+            ),
+            reverse=True,
+        )
+        wanted: List[int] = []
+        total = 0
+        for score, delta_int_id in ranking:
+            if score <= 0:
+                break
+            if self.max_deltas is not None and len(wanted) >= self.max_deltas:
+                break
+            size = self._size(delta_int_id)
+            if total + size > self.budget_bytes:
+                continue
+            wanted.append(delta_int_id)
+            total += size
+
+        for delta_int_id in list(self._outstanding):
+            if delta_int_id not in wanted:
+                size = self._outstanding.pop(delta_int_id)
+                self.stats.num_given_up += 1
+                if self._cancel_fn is not None and self._cancel_fn(delta_int_id):
+                    # dropped from the queue before anything was read
+                    continue
+                self.stats.wasted_bytes += size
+        for rank, delta_int_id in enumerate(wanted):
+            if delta_int_id in self._outstanding:
+                continue
+            queued = self._prefetch_fn(
+                self._requests[delta_int_id], now + PREDICTIVE_PRIORITY_OFFSET + rank
+            )
+            if not queued:
+                # cached or in flight already, nothing was predicted
+                continue
+            size = self._size(delta_int_id)
+            self._outstanding[delta_int_id] = size
+            self.stats.num_prefetched += 1
+            self.stats.bytes_prefetched += size
+        if wanted:
+            logger.debug(f"Predictively prefetching deltas {wanted}")
@@ -0,0 +1,202 @@
+"""Background prefetching of deltas from disk into the CPU cache."""
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional
+
+from vllm.logger import init_logger
+from .request import DeltaRequest
+
+logger = init_logger(__name__)
+
+
+@dataclass(order=True)
+class PrefetchJob:
+    """A queued delta load. Jobs with a lower priority value run first."""
+
+    priority: float
+    seq: int
+    delta_request: DeltaRequest = field(compare=False)
+    cancelled: bool = field(default=False, compare=False)
+    # set to ask an in-flight load to stop at its next checkpoint
+    discard_event: threading.Event = field(
+        default_factory=threading.Event, compare=False
+    )
+    # set once the job has left the queue for good (loaded, failed or dropped)
+    done_event: threading.Event = field(default_factory=threading.Event, compare=False)
+    loaded: bool = field(default=False, compare=False)
+
+    @property
+    def delta_int_id(self) -> int:
+        return self.delta_request.delta_int_id
+
+
+class DeltaPrefetcher:
+    """A priority queue of delta loads served by a pool of loader threads.
+
+    Workers sleep on a condition variable and are woken up as soon as a job is
+    submitted. Submitting a delta that is already queued with a better
+    priority supersedes the old job; `cancel` drops a queued job or asks an
+    in-flight one to discard its result.
+
+    Args:
+        load_fn: Loads a delta from disk, given the request, the pause event
+            and the job's discard event. Returns None if the load was
+            discarded or failed.
+        add_fn: Registers a loaded delta in the CPU cache, making room if
+            needed. Returns False if the delta could not be admitted.
+        is_cached_fn: Whether a delta id is already in the CPU cache.
+        num_workers: Number of loader threads.
+        pause_event: Cleared by the main thread while it loads a delta
+            synchronously, so that prefetching does not compete for I/O.
+    """
+
+    def __init__(
+        self,
+        load_fn: Callable,
+        add_fn: Callable,
+        is_cached_fn: Callable[[int], bool],
+        num_workers: int = 1,
+        pause_event: Optional[threading.Event] = None,
+    ):
+        if num_workers < 1:
+            raise ValueError(f"num_workers must be >= 1, got {num_workers}")
+        self._load_fn = load_fn
+        self._add_fn = add_fn
+        self._is_cached_fn = is_cached_fn
+        self.num_workers = num_workers
+        self.pause_event = pause_event or threading.Event()
+        self.pause_event.set()
+
+        self._cond = threading.Condition()
+        self._heap: List[PrefetchJob] = []
+        # delta id -> the live (not superseded) queued job
+        self._queued: Dict[int, PrefetchJob] = {}
+        # delta id -> the job currently being loaded
+        self._in_flight: Dict[int, PrefetchJob] = {}
+        self._counter = itertools.count()
+        self._threads: List[threading.Thread] = []
+        self._stopped = False
+        # loaded deltas that were discarded or not admitted to the cache
+        self.num_discarded = 0
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._worker, name=f"delta-prefetch-{i}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Started {self.num_workers} delta prefetching thread(s)")
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            for job in self._in_flight.values():
+                job.discard_event.set()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+
+    def __len__(self) -> int:
+        with self._cond:
+            return len(self._queued)
+
+    def queued_delta_ids(self) -> List[int]:
+        with self._cond:
+            return [job.delta_int_id for job in sorted(self._queued.values())]
+
+    def submit(self, delta_request: DeltaRequest, priority: Optional[float] = None) -> bool:
+        """Queues a delta load. Returns False if nothing needed to be queued."""
+        if priority is None:
+            priority = time.time()
+        delta_id = delta_request.delta_int_id
+        # never call back into the cache while holding our own lock, the cache
+        # calls into the prefetcher while holding its lock
+        if self._is_cached_fn(delta_id):
+            return False
+        with self._cond:
+            if delta_id in self._in_flight:
+                return False
+            queued = self._queued.get(delta_id)
+            if queued is not None:
+                if queued.priority <= priority:
+                    return False
+                # supersede the old entry, it is skipped when popped
+                queued.cancelled = True
+            job = PrefetchJob(priority, next(self._counter), delta_request)
+            heapq.heappush(self._heap, job)
+            self._queued[delta_id] = job
+            self._cond.notify()
+        logger.debug(
+            f"Adding delta {delta_id} to prefetching queue: {self.queued_delta_ids()}"
+        )
+        return True
+
+    def cancel(self, delta_id: int) -> Optional[PrefetchJob]:
+        """Drops the queued job of `delta_id`.
+
+        Returns the in-flight job for `delta_id` if there is one, so that the
+        caller can decide to wait for it (`done_event`) or discard it
+        (`discard_event`).
+        """
+        with self._cond:
+            queued = self._queued.pop(delta_id, None)
+            if queued is not None:
+                queued.cancelled = True
+                queued.done_event.set()
+            return self._in_flight.get(delta_id)
+
+    def _next_job(self) -> Optional[PrefetchJob]:
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0].cancelled:
+                    heapq.heappop(self._heap)
+                if self._stopped:
+                    return None
+                if self._heap:
+                    job = heapq.heappop(self._heap)
+                    del self._queued[job.delta_int_id]
+                    self._in_flight[job.delta_int_id] = job
+                    return job
+                self._cond.wait()
+
+    def _count_discarded(self):
+        with self._cond:
+            self.num_discarded += 1
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                if self._is_cached_fn(job.delta_int_id):
+                    # loaded by the main thread while the job was queued
+                    continue
+                self.pause_event.wait()
+                delta = self._load_fn(
+                    job.delta_request, self.pause_event, job.discard_event
+                )
+                if delta is None:
+                    logger.info(f"Failed to prefetch delta {job.delta_int_id}")
+                elif job.discard_event.is_set():
+                    logger.info(f"Discarding prefetched delta {job.delta_int_id}")
+                    self._count_discarded()
+                elif self._add_fn(delta):
+                    job.loaded = True
+                    logger.info(f"Prefetching delta {job.delta_int_id} done")
+                else:
+                    logger.info(
+                        f"No room to admit prefetched delta {job.delta_int_id}"
+                    )
+                    self._count_discarded()
+            except Exception as e:
+                logger.error(f"Prefetching delta {job.delta_int_id} failed: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight.pop(job.delta_int_id, None)
+                job.done_event.set()
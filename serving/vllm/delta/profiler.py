@@ -0,0 +1,197 @@
+"""Per-layer timing of the delta linear layers.
+
+Every `*WithDelta.apply_weights` runs the base GEMM and the deltas of the
+batch in one call. When profiling is enabled, the calls are wrapped between
+a pair of events, and optionally the base GEMM of the layer is timed on its
+own, so that the cost of the deltas is the difference of the two. Timings
+are keyed by layer and by the number of distinct deltas in the batch, and
+aggregated over `interval` steps before they are written out.
+
+Events are resolved once per step instead of after every layer. Without CUDA
+the events read the host clock, which keeps the wrappers testable on CPU.
+Timing the base GEMM adds a GEMM per layer to every profiled step, and the
+wrappers cannot be captured in CUDA graphs, so the profiler requires eager
+mode.
+"""
+import json
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+
+# created on the first flush, after the engine has reset the vllm collectors
+_layer_time_gauge = None
+
+
+class HostEvent:
+    """Stands in for a `torch.cuda.Event` on CPU tensors."""
+
+    def __init__(self):
+        self.time: Optional[float] = None
+
+    def record(self, stream=None) -> None:
+        self.time = time.perf_counter()
+
+    def elapsed_time(self, end: "HostEvent") -> float:
+        """Milliseconds until `end`, like `torch.cuda.Event.elapsed_time`."""
+        return (end.time - self.time) * 1000
+
+
+@dataclass
+class LayerTiming:
+    calls: int = 0
+    # seconds in the wrapped apply_weights, base GEMM and deltas together
+    delta_seconds: float = 0.0
+    # seconds in the base GEMM alone, if it was timed
+    base_seconds: float = 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "mean_delta_ms": self.delta_seconds / self.calls * 1000,
+            "mean_base_ms": self.base_seconds / self.calls * 1000,
+        }
+
+
+def _new_event(x: torch.Tensor):
+    if x.is_cuda:
+        return torch.cuda.Event(enable_timing=True)
+    return HostEvent()
+
+
+def _base_apply_fn(module: nn.Module) -> Optional[Callable]:
+    base_layer = getattr(module, "base_layer", None)
+    if base_layer is None or not hasattr(base_layer, "linear_method"):
+        return None
+    return lambda x: base_layer.linear_method.apply_weights(
+        base_layer.linear_weights, x
+    )
+
+
+class DeltaLayerProfiler:
+    """Times the delta linear layers of a model.
+
+    Args:
+        interval: number of steps to aggregate before writing the timings.
+        output_path: jsonl file the timings of every interval are appended to,
+            they are always exported to Prometheus as well.
+        profile_base: also time the base GEMM of every layer on its own.
+    """
+
+    def __init__(
+        self,
+        interval: int,
+        output_path: Optional[str] = None,
+        profile_base: bool = True,
+    ):
+        if interval < 1:
+            raise ValueError("interval must be >= 1")
+        self.interval = interval
+        self.output_path = output_path
+        self.profile_base = profile_base
+        self.num_deltas = 0
+        self.num_steps = 0
+        self.timings: Dict[Tuple[str, int], LayerTiming] = {}
+        # (key, kind, start, end) of the calls of the current step
+        self._pending: List[Tuple[Tuple[str, int], str, object, object]] = []
+
+    def wrap(self, modules: Dict[str, nn.Module]) -> int:
+        """Wraps `apply_weights` of every module that has one, returns the
+        number of wrapped modules."""
+        wrapped = 0
+        for module_name, module in modules.items():
+            if not hasattr(module, "apply_weights"):
+                continue
+            module.apply_weights = self._wrap(module_name, module)
+            wrapped += 1
+        return wrapped
+
+    def _wrap(self, module_name: str, module: nn.Module) -> Callable:
+        apply_weights = module.apply_weights
+        base_apply = _base_apply_fn(module) if self.profile_base else None
+
+        def profiled_apply_weights(x: torch.Tensor, *args, **kwargs):
+            key = (module_name, self.num_deltas)
+            start, end = _new_event(x), _new_event(x)
+            start.record()
+            output = apply_weights(x, *args, **kwargs)
+            end.record()
+            self._pending.append((key, "delta", start, end))
+            if base_apply is not None:
+                start, end = _new_event(x), _new_event(x)
+                start.record()
+                base_apply(x)
+                end.record()
+                self._pending.append((key, "base", start, end))
+            return output
+
+        return profiled_apply_weights
+
+    def set_num_deltas(self, num_deltas: int) -> None:
+        """Sets the number of distinct deltas in the batch of the step."""
+        self.num_deltas = num_deltas
+
+    def step(self) -> None:
+        """Resolves the timings of the finished step, and writes them out
+        every `interval` steps."""
+        if any(isinstance(start, torch.cuda.Event) for _, _, start, _ in self._pending):
+            torch.cuda.synchronize()
+        for key, kind, start, end in self._pending:
+            timing = self.timings.setdefault(key, LayerTiming())
+            seconds = start.elapsed_time(end) / 1000
+            if kind == "delta":
+                timing.calls += 1
+                timing.delta_seconds += seconds
+            else:
+                timing.base_seconds += seconds
+        self._pending = []
+        self.num_steps += 1
+        if self.num_steps % self.interval == 0:
+            self.flush()
+
+    def summary(self) -> List[dict]:
+        return [
+            {"layer": layer, "num_deltas": num_deltas, **timing.to_dict()}
+            for (layer, num_deltas), timing in sorted(self.timings.items())
+            if timing.calls > 0
+        ]
+
+    def reset(self) -> None:
+        """Drops all timings, e.g. of warm-up steps."""
+        self.num_steps = 0
+        self.timings = {}
+        self._pending = []
+
+    def flush(self) -> None:
+        summary = self.summary()
+        if summary:
+            if self.output_path is not None:
+                with open(self.output_path, "a") as f:
+                    f.write(json.dumps({"step": self.num_steps, "layers": summary}))
+                    f.write("\n")
+            self._export(summary)
+        self.timings = {}
+
+    def _export(self, summary: List[dict]) -> None:
+        global _layer_time_gauge
+        if _layer_time_gauge is None:
+            from prometheus_client import Gauge
+
+            _layer_time_gauge = Gauge(
+                name="vllm:delta_layer_time_seconds",
+                documentation="Mean time per call of a delta linear layer over "
+                "the last profiling interval, with (delta) and without (base) "
+                "the deltas.",
+                labelnames=["layer", "num_deltas", "kernel"],
+            )
+        for row in summary:
+            labels = {"layer": row["layer"], "num_deltas": str(row["num_deltas"])}
+            _layer_time_gauge.labels(kernel="delta", **labels).set(
+                row["mean_delta_ms"] / 1000
+            )
+            if self.profile_base:
+                _layer_time_gauge.labels(kernel="base", **labels).set(
+                    row["mean_base_ms"] / 1000
+                )
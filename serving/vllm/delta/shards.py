@@ -0,0 +1,135 @@
+"""Per-tensor-parallel-rank layout of compressed delta checkpoints.
+
+A monolithic checkpoint stores every rank's slice in
+`deltazip-compressed.safetensors` under keys of the form
+`{module}.{tp_rank}.{tensor}`, so each rank has to open (and page in the
+header of) the whole file. The rank-local layout splits it into one
+`rank.N.safetensors` per rank, described by a small json manifest:
+
+    {
+        "format": "deltazip-rank-shards",
+        "version": 1,
+        "tp_size": 2,
+        "source": "deltazip-compressed.safetensors",
+        "shards": {"0": "rank.0.safetensors", "1": "rank.1.safetensors"},
+        "bytes": {"0": 123, "1": 123}
+    }
+
+Keys inside a shard keep their rank infix, so the same loading code works
+for both layouts.
+"""
+import os
+import json
+import shutil
+from typing import Dict, Optional
+
+from safetensors.torch import save_file
+
+from .loader import MmapSafetensorsReader
+
+MONOLITHIC_FILENAME = "deltazip-compressed.safetensors"
+SHARD_MANIFEST_FILENAME = "deltazip-shards.json"
+SHARD_FORMAT = "deltazip-rank-shards"
+SHARD_FORMAT_VERSION = 1
+
+
+def shard_filename(tp_rank: int) -> str:
+    return f"rank.{tp_rank}.safetensors"
+
+
+def read_shard_manifest(path: str) -> Optional[dict]:
+    """Returns the shard manifest of the checkpoint at `path`, if any."""
+    manifest_path = os.path.join(path, SHARD_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, "r") as fp:
+        manifest = json.load(fp)
+    if manifest.get("format") != SHARD_FORMAT:
+        raise ValueError(f"{manifest_path} is not a {SHARD_FORMAT} manifest")
+    if manifest.get("version", 0) > SHARD_FORMAT_VERSION:
+        raise ValueError(
+            f"{manifest_path} has version {manifest['version']}, "
+            f"only <= {SHARD_FORMAT_VERSION} is supported"
+        )
+    return manifest
+
+
+def get_delta_tensor_filename(path: str, tp_rank: int, tp_size: int) -> str:
+    """Returns the file holding `tp_rank`'s tensors, relative to `path`.
+
+    Falls back to the monolithic file when the checkpoint has no manifest.
+    """
+    manifest = read_shard_manifest(path)
+    if manifest is None:
+        return MONOLITHIC_FILENAME
+    if manifest["tp_size"] != tp_size:
+        raise ValueError(
+            f"Delta at {path} is sharded for tp_size={manifest['tp_size']}, "
+            f"but the engine runs with tp_size={tp_size}"
+        )
+    return manifest["shards"][str(tp_rank)]
+
+
+def delta_rank_nbytes(path: str, tp_rank: int, tp_size: int) -> int:
+    """Bytes of tensor data `tp_rank` loads from the checkpoint at `path`.
+
+    Read from the manifest when sharded, otherwise estimated as an even
+    split of the monolithic file.
+    """
+    manifest = read_shard_manifest(path)
+    if manifest is not None and manifest["tp_size"] == tp_size:
+        return manifest["bytes"][str(tp_rank)]
+    return os.path.getsize(os.path.join(path, MONOLITHIC_FILENAME)) // tp_size
+
+
+def convert_to_rank_shards(
+    path: str,
+    output: Optional[str] = None,
+    remove_source: bool = False,
+) -> dict:
+    """Splits a monolithic checkpoint into per-rank shards plus a manifest.
+
+    Tensors are read through the file mapping one rank at a time, so host
+    memory stays bounded by the size of a single shard.
+    """
+    output = output or path
+    os.makedirs(output, exist_ok=True)
+    source = os.path.join(path, MONOLITHIC_FILENAME)
+    with MmapSafetensorsReader(source) as reader:
+        rank_keys: Dict[int, list] = {}
+        for key in reader.keys():
+            rank_keys.setdefault(int(key.rsplit(".", 2)[1]), []).append(key)
+        tp_size = len(rank_keys)
+        if sorted(rank_keys) != list(range(tp_size)):
+            raise ValueError(
+                f"{source} has tensors for ranks {sorted(rank_keys)}, "
+                f"expected 0..{tp_size - 1}"
+            )
+        manifest = {
+            "format": SHARD_FORMAT,
+            "version": SHARD_FORMAT_VERSION,
+            "tp_size": tp_size,
+            "source": MONOLITHIC_FILENAME,
+            "shards": {},
+            "bytes": {},
+        }
+        for rank in range(tp_size):
+            tensors = {key: reader.get_tensor(key) for key in rank_keys[rank]}
+            save_file(tensors, os.path.join(output, shard_filename(rank)))
+            manifest["shards"][str(rank)] = shard_filename(rank)
+            manifest["bytes"][str(rank)] = sum(
+                reader.infos[key].nbytes for key in rank_keys[rank]
+            )
+            del tensors
+    if output != path:
+        # configs (config.json, compress_config.json, ...) travel along
+        for filename in os.listdir(path):
+            if filename.endswith(".json") and filename != SHARD_MANIFEST_FILENAME:
+                shutil.copy(os.path.join(path, filename), output)
+    # the manifest is written last so that a partially converted directory is
+    # still loaded through the monolithic file
+    with open(os.path.join(output, SHARD_MANIFEST_FILENAME), "w") as fp:
+        json.dump(manifest, fp, indent=2)
+    if remove_source and output == path:
+        os.remove(source)
+    return manifest
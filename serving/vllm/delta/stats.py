@@ -0,0 +1,69 @@
+"""Counters of the delta caches of a worker, exported by the engine metrics."""
+import threading
+from collections import deque
+from dataclasses import dataclass, field, fields
+from typing import List
+
+# load durations kept between two collections, the oldest are dropped when the
+# stats are collected rarely or never (--disable-log-stats)
+MAX_LOAD_TIME_SAMPLES = 10000
+
+
+@dataclass
+class DeltaCacheStats:
+    """Delta cache counters since engine start, and the durations of the delta
+    loads since the stats were last collected."""
+
+    # a delta was in / had to be copied into a GPU slot
+    gpu_hits: int = 0
+    gpu_misses: int = 0
+    gpu_evictions: int = 0
+    # a delta was in / had to be read into the CPU cache
+    cpu_hits: int = 0
+    cpu_misses: int = 0
+    cpu_evictions: int = 0
+    # requests that found their delta loaded by the prefetcher, and prefetched
+    # deltas that were thrown away (discarded or not admitted)
+    prefetch_hits: int = 0
+    prefetch_discards: int = 0
+    # bytes read into the CPU cache
+    bytes_loaded: int = 0
+    # seconds per disk -> CPU load and per CPU -> GPU copy
+    disk_load_times: List[float] = field(default_factory=list)
+    activation_times: List[float] = field(default_factory=list)
+
+
+class DeltaCacheStatsRecorder:
+    """Thread-safe recording of `DeltaCacheStats`, the prefetching threads
+    record loads concurrently with the main thread.
+
+    Only the last `max_samples` load durations of each kind are kept until
+    the next `collect`.
+    """
+
+    def __init__(self, max_samples: int = MAX_LOAD_TIME_SAMPLES):
+        self._lock = threading.Lock()
+        self.max_samples = max_samples
+        self._stats = DeltaCacheStats()
+        self._reset_load_times()
+
+    def _reset_load_times(self) -> None:
+        self._stats.disk_load_times = deque(maxlen=self.max_samples)
+        self._stats.activation_times = deque(maxlen=self.max_samples)
+
+    def inc(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            setattr(self._stats, name, getattr(self._stats, name) + value)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            getattr(self._stats, name).append(seconds)
+
+    def collect(self) -> DeltaCacheStats:
+        """Returns a snapshot and starts new lists of load durations."""
+        with self._lock:
+            values = {f.name: getattr(self._stats, f.name) for f in fields(self._stats)}
+            values["disk_load_times"] = list(values["disk_load_times"])
+            values["activation_times"] = list(values["activation_times"])
+            self._reset_load_times()
+        return DeltaCacheStats(**values)
@@ -1,3 +1,4 @@
+import os
 from timeit import default_timer as timer
 from abc import ABC, abstractmethod
 from typing import Any, List, Optional, Set, Type, Dict
@@ -6,19 +7,25 @@ import time
 from .layers_marlin import DeltaMapping
 from .request import DeltaRequest
 from .config import DeltaConfig
+from .prefetch import DeltaPrefetcher
+from .stats import DeltaCacheStats, DeltaCacheStatsRecorder
+from .disk_cache import LocalDiskDeltaCache, delta_files_for_rank
 from vllm.logger import init_logger
 from .models import (
+    ByteBudgetDeltaModelManager,
     DeltaModel,
     DeltaModelManager,
     LRUCacheDeltaModelManager,
     create_delta_manager,
 )
 from vllm.sequence import SequenceGroup
+from vllm.model_executor.parallel_utils.parallel_state import (
+    get_tensor_model_parallel_rank,
+    get_tensor_model_parallel_world_size,
+)
 import threading
 
 logger = init_logger(__name__)
-LOG_TIME = False
-CHECK_QUEUE_INTERVAL = 1
 
 
 class AbstractWorkerManager(ABC):
@@ -87,8 +94,10 @@ class WorkerDeltaManager(AbstractWorkerManager):
     ):
         self._delta_manager: Optional[DeltaModelManager] = None
         self._delta_model_cls = delta_model_cls
+        self.disk_cache: Optional[LocalDiskDeltaCache] = None
         self.embedding_modules = embedding_modules
         self.embedding_padding_modules = embedding_padding_modules
+        self.stats = DeltaCacheStatsRecorder()
         super().__init__(
             max_num_seqs, max_num_batched_tokens, vocab_size, delta_config, device
         )
@@ -97,10 +106,30 @@ class WorkerDeltaManager(AbstractWorkerManager):
     def is_enabled(self) -> bool:
         return True
 
+    def _get_delta_manager_cls(self) -> Type:
+        if self.delta_config.cpu_delta_cache_bytes:
+            return ByteBudgetDeltaModelManager
+        return self._delta_manager_cls
+
+    def _init_disk_cache(self):
+        """Creates the local disk tier, once the TP rank is known."""
+        if not self.delta_config.disk_cache_dir or self.disk_cache is not None:
+            return
+        tp_rank = get_tensor_model_parallel_rank()
+        tp_size = get_tensor_model_parallel_world_size()
+        self.disk_cache = LocalDiskDeltaCache(
+            # ranks on the same node cache different files of a delta
+            os.path.join(self.delta_config.disk_cache_dir, f"rank-{tp_rank}"),
+            self.delta_config.disk_cache_bytes,
+            admission=self.delta_config.disk_cache_admission,
+            files_fn=lambda path: delta_files_for_rank(path, tp_rank, tp_size),
+        )
+
     def create_delta_manager(self, model: torch.nn.Module) -> Any:
+        self._init_disk_cache()
         delta_manager = create_delta_manager(
             model,
-            delta_manager_cls=self._delta_manager_cls,
+            delta_manager_cls=self._get_delta_manager_cls(),
             max_num_seqs=self.max_num_seqs,
             vocab_size=self.vocab_size,
             delta_config=self.delta_config,
@@ -118,6 +147,9 @@ class WorkerDeltaManager(AbstractWorkerManager):
         self._apply_deltas(delta_requests, sequence_groups)
         self._delta_manager.set_delta_mapping(delta_mapping)
 
+    def wait_delta_copies(self) -> None:
+        self._delta_manager.wait_delta_copies()
+
     def _apply_deltas(
         self, delta_requests: List[DeltaRequest], sequence_groups: List[SequenceGroup]
     ) -> None:
@@ -142,20 +174,52 @@ class WorkerDeltaManager(AbstractWorkerManager):
     def _load_delta(
         self, delta_request: DeltaRequest, prefetch_event=None, discard_event=None
     ) -> DeltaModel:
+        # the pinned cache copies the tensors into its slab anyway, so reading
+        # them through the file mapping avoids a second pinned copy
+        load_mode = "mmap_lazy" if self.delta_config.cpu_delta_cache_bytes else None
+        source = delta_request.delta_local_path
+        # the GPU and CPU tiers missed, try the local disk before remote storage
+        local_path = self.disk_cache.acquire(source) if self.disk_cache else None
+        start = timer()
         try:
             delta = self._delta_model_cls.from_checkpoint(
-                delta_request.delta_local_path,
+                local_path or source,
                 id=delta_request.delta_int_id,
                 prefetch_thread_event=prefetch_event,
                 discard_prefetching_event=discard_event,
+                load_mode=load_mode,
             )
         except Exception as e:
             logger.error(
-                f"Failed to load delta model from {delta_request.delta_local_path}: {e}"
+                f"Failed to load delta model from {local_path or source}: {e}"
             )
             return None
+        finally:
+            if local_path is not None:
+                self.disk_cache.release(source)
+        if delta is not None:
+            self.stats.observe("disk_load_times", timer() - start)
+            self.stats.inc("bytes_loaded", delta.nbytes)
         return delta
 
+    def collect_stats(self) -> DeltaCacheStats:
+        stats = self.stats.collect()
+        if self._delta_manager is not None:
+            stats.cpu_evictions = self._delta_manager.num_cpu_evictions
+            stats.gpu_evictions = self._delta_manager.num_gpu_evictions
+        return stats
+
+    def _record_activation(self, delta_id: int) -> bool:
+        """Activates `delta_id`, counting whether it was in a GPU slot."""
+        start = timer()
+        copied = self._delta_manager.activate_delta(delta_id)
+        if copied:
+            self.stats.inc("gpu_misses")
+            self.stats.observe("activation_times", timer() - start)
+        else:
+            self.stats.inc("gpu_hits")
+        return copied
+
     def add_dummy_delta(self, delta_request: DeltaRequest) -> bool:
         if delta_request.delta_int_id in self.list_deltas():
             return False
@@ -169,11 +233,17 @@ class WorkerDeltaManager(AbstractWorkerManager):
     ) -> bool:
         if delta_request.delta_int_id in self.list_deltas():
             return False
+        self.stats.inc("cpu_misses")
         delta = self._load_delta(delta_request)
+        if delta is None:
+            raise RuntimeError(
+                f"Loading delta {delta_request.delta_int_id} from "
+                f"{delta_request.delta_local_path} failed"
+            )
         for sg in sequence_groups:
             sg.maybe_set_cpu_loading_time(time.time())
         loaded = self._delta_manager.add_delta(delta)
-        self._delta_manager.activate_delta(delta.id)
+        self._record_activation(delta.id)
         return loaded
 
     def remove_delta(self, delta_id: int) -> bool:
@@ -190,9 +260,10 @@ class LRUCacheWorkerDeltaManager(WorkerDeltaManager):
     _delta_manager_cls = LRUCacheDeltaModelManager
 
     def create_delta_manager(self, model) -> Any:
+        self._init_disk_cache()
         delta_manager = create_delta_manager(
             model,
-            delta_manager_cls=self._delta_manager_cls,
+            delta_manager_cls=self._get_delta_manager_cls(),
             max_num_seqs=self.max_num_seqs,
             vocab_size=self.vocab_size,
             delta_config=self.delta_config,
@@ -220,11 +291,17 @@ class LRUCacheWorkerDeltaManager(WorkerDeltaManager):
         self, delta_request: DeltaRequest, sequence_groups: List[SequenceGroup]
     ) -> bool:
         if delta_request.delta_int_id not in self.list_deltas():
-            if len(self._delta_manager) + 1 > self._delta_manager.capacity:
-                self._delta_manager.remove_oldest_delta()
+            self.stats.inc("cpu_misses")
             delta = self._load_delta(delta_request)
+            if delta is None:
+                raise RuntimeError(
+                    f"Loading delta {delta_request.delta_int_id} from "
+                    f"{delta_request.delta_local_path} failed"
+                )
+            self._delta_manager.make_room(delta)
             loaded = self._delta_manager.add_delta(delta)
         else:
+            self.stats.inc("cpu_hits")
             loaded = self._delta_manager.get_delta(delta_request.delta_int_id)
         for sg in sequence_groups:
             sg.maybe_set_cpu_loading_time(time.time())
@@ -234,78 +311,47 @@ class LRUCacheWorkerDeltaManager(WorkerDeltaManager):
         return loaded
 
     def _activate_delta(self, delta_request: DeltaRequest):
-        global LOG_TIME
-        if not LOG_TIME:
-            logger.info(f"[{time.time()}] activating delta")
-        start = timer()
-        self._delta_manager.activate_delta(delta_request.delta_int_id)
-        end = timer()
-        if not LOG_TIME:
-            logger.info(f"[{time.time()}] CPU -> GPU time: {end - start:.4f}")
-            LOG_TIME = True
+        self._record_activation(delta_request.delta_int_id)
 
 
 class OverlapLRUCacheWorkerDeltaManager(WorkerDeltaManager):
+    """LRU cache manager that prefetches deltas into the CPU cache in the
+    background, overlapping disk I/O with inference."""
+
     _delta_manager_cls = LRUCacheDeltaModelManager
-    prefetching_thread_event = threading.Event()
-    discard_prefetching_event = threading.Event()
-    prefetching_jobqueue: List[DeltaRequest] = []
-    current_prefetching_request: DeltaRequest = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # guards the CPU/GPU caches of the delta manager, which are touched by
+        # both the main thread and the prefetching threads
+        self._lock = threading.Lock()
+        # prefetched deltas that no request has used yet
+        self._prefetched: Set[int] = set()
+        self.prefetcher = DeltaPrefetcher(
+            load_fn=self._load_delta,
+            add_fn=self._add_prefetched_delta,
+            is_cached_fn=lambda delta_id: delta_id in self.list_deltas(),
+            num_workers=self.delta_config.prefetch_workers,
+        )
 
     def create_delta_manager(self, model) -> Any:
-        def _load_delta_background():
-            while True:
-                if time.time() % 10 == 0:
-                    logger.info(
-                        f"# deltas in the queue: {len(self.prefetching_jobqueue)}"
-                    )
-                remaining_jobs = self.prefetching_jobqueue.copy()
-                for delta_request in remaining_jobs:
-                    if delta_request.delta_int_id not in self.list_deltas():
-                        if len(self._delta_manager) + 1 > self._delta_manager.capacity:
-                            return
-
-                        self.prefetching_thread_event.wait()
-                        self.current_prefetching_request = delta_request
-                        delta = self._load_delta(
-                            delta_request,
-                            prefetch_event=self.prefetching_thread_event,
-                            discard_event=self.discard_prefetching_event,
-                        )
-                        if delta is not None:
-                            loaded = self._delta_manager.add_delta(delta)
-                            logger.info(
-                                f"Prefetching delta {delta_request.delta_int_id} done"
-                            )
-                        else:
-                            logger.info(
-                                f"Failed to prefetch delta {delta_request.delta_int_id}"
-                            )
-                        self.current_prefetching_request = None
-
-                    if delta_request in self.prefetching_jobqueue:
-                        self.prefetching_jobqueue.remove(delta_request)
-
-                time.sleep(CHECK_QUEUE_INTERVAL)
-
-        thread = threading.Thread(target=_load_delta_background)
-        
-        self.prefetching_thread_event.set()
-        self.discard_prefetching_event.clear()
-
-        logger.info("Starting prefetching thread")
-        thread.start()
+        self._init_disk_cache()
         delta_manager = create_delta_manager(
             model,
-            delta_manager_cls=self._delta_manager_cls,
+            delta_manager_cls=self._get_delta_manager_cls(),
             max_num_seqs=self.max_num_seqs,
             vocab_size=self.vocab_size,
             delta_config=self.delta_config,
             max_num_batched_tokens=self.max_num_batched_tokens,
         )
         self._delta_manager: LRUCacheDeltaModelManager = delta_manager
+        self.prefetcher.start()
         return delta_manager.model
 
+    def list_deltas(self) -> Set[int]:
+        with self._lock:
+            return set(self._delta_manager.list_deltas())
+
     def _apply_deltas(
         self, delta_requests: List[DeltaRequest], sequence_groups: List[SequenceGroup]
     ) -> None:
@@ -321,56 +367,91 @@ class OverlapLRUCacheWorkerDeltaManager(WorkerDeltaManager):
         for delta in delta_maps.values():
             self.add_delta(delta, sequence_groups)
 
-    def prefetch_delta(self, delta_request: DeltaRequest):
-        if (
-            delta_request.delta_int_id not in self.list_deltas()
-            and delta_request not in self.prefetching_jobqueue
-        ):
-            self.prefetching_jobqueue.append(delta_request)
-
-            logger.info(
-                f"Adding delta {delta_request.delta_int_id} to prefetching queue: {[x.delta_int_id for x in self.prefetching_jobqueue]}"
-            )
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
+        """Queues `delta_request` for loading into the CPU cache. Deltas with
+        a lower priority value are loaded first, the default is FIFO."""
+        return self.prefetcher.submit(delta_request, priority=priority)
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
+        """Drops the queued load of `delta_id` and discards an in-flight one.
+        Returns True if the load was dropped before anything was read."""
+        queued = delta_id in self.prefetcher.queued_delta_ids()
+        in_flight = self.prefetcher.cancel(delta_id)
+        if in_flight is not None:
+            in_flight.discard_event.set()
+            return False
+        return queued
+
+    def _add_prefetched_delta(self, delta: DeltaModel) -> bool:
+        with self._lock:
+            if delta.id in self._delta_manager.list_deltas():
+                return True
+            # never evict a delta that is in use on the GPU to make room for
+            # one that has not been requested yet
+            if not self._delta_manager.make_room(delta, evict_active=False):
+                return False
+            self._delta_manager.add_delta(delta)
+            self._prefetched.add(delta.id)
+            return True
+
+    def collect_stats(self) -> DeltaCacheStats:
+        stats = super().collect_stats()
+        stats.prefetch_discards = self.prefetcher.num_discarded
+        return stats
 
     def add_delta(
         self, delta_request: DeltaRequest, sequence_groups: List[SequenceGroup]
     ) -> bool:
-        if delta_request.delta_int_id not in self.list_deltas():
-            if len(self._delta_manager) + 1 > self._delta_manager.capacity:
-                self._delta_manager.remove_oldest_delta()
-            # note: here we don't pass prefetching_thread_event to _load_delta
-            # because this is the main thread and has higher priority
+        delta_id = delta_request.delta_int_id
+        if delta_id in self.list_deltas():
+            self.stats.inc("cpu_hits")
+        else:
+            self.stats.inc("cpu_misses")
+            in_flight = self.prefetcher.cancel(delta_id)
+            if in_flight is not None:
+                # the delta is already half-way in, waiting is cheaper than
+                # starting over
+                logger.info(f"Waiting for in-flight prefetch of delta {delta_id}")
+                in_flight.done_event.wait()
+        delta = None
+        while True:
+            # the lookup (or insertion) and the activation are one critical
+            # section, a prefetching thread making room must not evict the
+            # delta in between
+            with self._lock:
+                if delta_id in self._delta_manager.list_deltas():
+                    loaded = self._delta_manager.get_delta(delta_id)
+                    if delta_id in self._prefetched:
+                        self._prefetched.discard(delta_id)
+                        self.stats.inc("prefetch_hits")
+                elif delta is not None:
+                    self._delta_manager.make_room(delta)
+                    loaded = self._delta_manager.add_delta(delta)
+                    self._prefetched.discard(delta_id)
+                    logger.info(f"Main thread loading delta {delta_id} done")
+                else:
+                    loaded = None
+                if loaded is not None:
+                    for sg in sequence_groups:
+                        sg.maybe_set_cpu_loading_time(time.time())
+                    self._record_activation(delta_id)
+                    break
             logger.warning(
-                f"Missed prefetch, fall back to loading delta {delta_request.delta_int_id} now"
+                f"Missed prefetch, fall back to loading delta {delta_id} now"
             )
-            self.prefetching_thread_event.clear()
-            if (
-                self.current_prefetching_request is not None
-                and delta_request.delta_int_id
-                == self.current_prefetching_request.delta_int_id
-            ):
-                logger.warning(
-                    f"Discarding prefetching delta {delta_request.delta_int_id}"
+            # pause prefetching while the main thread loads, it has priority
+            self.prefetcher.pause_event.clear()
+            try:
+                delta = self._load_delta(delta_request)
+            finally:
+                self.prefetcher.pause_event.set()
+            if delta is None:
+                raise RuntimeError(
+                    f"Loading delta {delta_id} from "
+                    f"{delta_request.delta_local_path} failed"
                 )
-                self.discard_prefetching_event.set()
-
-            if delta_request in self.prefetching_jobqueue:
-                self.prefetching_jobqueue.remove(delta_request)
-
-            delta = self._load_delta(delta_request)
-            self.prefetching_thread_event.set()
-            loaded = self._delta_manager.add_delta(delta)
-            logger.info(f"Main thread loading delta {delta_request.delta_int_id} done")
-            self.discard_prefetching_event.clear()
-        else:
-            loaded = self._delta_manager.get_delta(delta_request.delta_int_id)
-
-        for sg in sequence_groups:
-            sg.maybe_set_cpu_loading_time(time.time())
-        self._activate_delta(delta_request=delta_request)
         for sg in sequence_groups:
             sg.maybe_set_gpu_loading_time(time.time())
         return loaded
-
-    def _activate_delta(self, delta_request: DeltaRequest):
-        self._delta_manager.activate_delta(delta_request.delta_int_id)
\ No newline at end of file
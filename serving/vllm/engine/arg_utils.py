@@ -63,6 +63,17 @@ class EngineArgs:
     enable_delta: bool = False
     max_deltas: int = 1
     max_cpu_deltas: Optional[int] = 32
+    delta_prefetch_workers: int = 1
+    cpu_delta_cache_bytes: Optional[int] = None
+    predictive_prefetch: Optional[str] = None
+    predictive_prefetch_bytes: Optional[int] = None
+    popularity_half_life: float = 60.0
+    pipelined_delta_activation: bool = False
+    delta_disk_cache_dir: Optional[str] = None
+    delta_disk_cache_bytes: Optional[int] = None
+    delta_disk_cache_admission: str = "always"
+    profile_delta_layers: Optional[int] = None
+    profile_delta_layers_output: Optional[str] = None
     device: str = "auto"
     ray_workers_use_nsight: bool = False
     # Related to Vision-language models such as llava
@@ -73,6 +84,7 @@ class EngineArgs:
     scheduler_delay_factor: float = 0.0
     enable_prefetch: bool = False
     scheduler_policy: str = "fcfs"
+    scheduler_max_wait: float = 10.0
     max_swap_slots: int = 1
     max_cpu_models: int = 4
     enable_swap: bool = False
@@ -408,6 +420,101 @@ class EngineArgs:
                 "Defaults to max_num_seqs."
             ),
         )
+        parser.add_argument(
+            "--delta-prefetch-workers",
+            type=int,
+            default=EngineArgs.delta_prefetch_workers,
+            help="Number of threads prefetching Delta models into CPU memory.",
+        )
+        parser.add_argument(
+            "--cpu-delta-cache-bytes",
+            type=int,
+            default=EngineArgs.cpu_delta_cache_bytes,
+            help=(
+                "Size in bytes of a preallocated pinned CPU cache for Delta "
+                "models. If set, the CPU cache is bounded by bytes (on top of "
+                "--max-cpu-deltas) and evicts by GreedyDual-Size."
+            ),
+        )
+        parser.add_argument(
+            "--predictive-prefetch",
+            type=str,
+            default=EngineArgs.predictive_prefetch,
+            choices=["ewma", "markov"],
+            help=(
+                "Prefetch Delta models into CPU memory before they are "
+                "requested, ranked by a popularity model learned from the "
+                "arrivals: exponentially decayed frequency (ewma) or a Markov "
+                "chain over the request sequence (markov)."
+            ),
+        )
+        parser.add_argument(
+            "--predictive-prefetch-bytes",
+            type=int,
+            default=EngineArgs.predictive_prefetch_bytes,
+            help=(
+                "Bytes of predicted Delta models that may be prefetched at a "
+                "time. Defaults to --cpu-delta-cache-bytes."
+            ),
+        )
+        parser.add_argument(
+            "--popularity-half-life",
+            type=float,
+            default=EngineArgs.popularity_half_life,
+            help="Half-life in seconds of the ewma popularity model.",
+        )
+        parser.add_argument(
+            "--pipelined-delta-activation",
+            action="store_true",
+            default=EngineArgs.pipelined_delta_activation,
+            help=(
+                "Copy Delta models to the GPU layer by layer on a separate "
+                "stream, overlapping the copies with the forward pass."
+            ),
+        )
+        parser.add_argument(
+            "--delta-disk-cache-dir",
+            type=str,
+            default=EngineArgs.delta_disk_cache_dir,
+            help=(
+                "Local directory (e.g. on NVMe) caching Delta models read "
+                "from remote storage. Checked after the CPU cache."
+            ),
+        )
+        parser.add_argument(
+            "--delta-disk-cache-bytes",
+            type=int,
+            default=EngineArgs.delta_disk_cache_bytes,
+            help="Capacity in bytes of the local disk Delta cache.",
+        )
+        parser.add_argument(
+            "--delta-disk-cache-admission",
+            type=str,
+            default=EngineArgs.delta_disk_cache_admission,
+            choices=["always", "second-hit"],
+            help=(
+                "When a Delta model is copied to the local disk cache: on its "
+                "first miss (always) or on its second (second-hit)."
+            ),
+        )
+        parser.add_argument(
+            "--profile-delta-layers",
+            type=int,
+            default=EngineArgs.profile_delta_layers,
+            help=(
+                "Time every Delta layer with and without its deltas, "
+                "aggregated over this many steps. Requires --enforce-eager."
+            ),
+        )
+        parser.add_argument(
+            "--profile-delta-layers-output",
+            type=str,
+            default=EngineArgs.profile_delta_layers_output,
+            help=(
+                "jsonl file the Delta layer timings are appended to, in "
+                "addition to the metrics endpoint."
+            ),
+        )
         parser.add_argument(
             "--max-delta-bitwidth",
             type=int,
@@ -472,6 +579,14 @@ class EngineArgs:
             default=EngineArgs.scheduler_policy,
             help="The scheduling policy to use. ",
         )
+        parser.add_argument(
+            "--scheduler-max-wait",
+            type=float,
+            default=EngineArgs.scheduler_max_wait,
+            help="Maximum time in seconds a request waits before the "
+            "delta-affinity policy schedules it ahead of requests for "
+            "resident deltas.",
+        )
         parser.add_argument(
             "--max-swap-slots",
             type=int,
@@ -559,6 +674,7 @@ class EngineArgs:
             model_config.max_model_len,
             self.scheduler_delay_factor,
             self.scheduler_policy,
+            self.scheduler_max_wait,
         )
         lora_config = (
             LoRAConfig(
@@ -605,7 +721,26 @@ class EngineArgs:
             delta_config = DeltaConfig(
                 max_deltas=self.max_deltas,
                 max_cpu_deltas=self.max_cpu_deltas if self.max_cpu_deltas else None,
+                prefetch_workers=self.delta_prefetch_workers,
+                cpu_delta_cache_bytes=self.cpu_delta_cache_bytes,
+                predictive_prefetch=self.predictive_prefetch,
+                predictive_prefetch_bytes=self.predictive_prefetch_bytes,
+                popularity_half_life=self.popularity_half_life,
+                pipelined_activation=self.pipelined_delta_activation,
+                disk_cache_dir=self.delta_disk_cache_dir,
+                disk_cache_bytes=self.delta_disk_cache_bytes,
+                disk_cache_admission=self.delta_disk_cache_admission,
+                profile_layers_interval=self.profile_delta_layers,
+                profile_layers_output=self.profile_delta_layers_output,
             )
+            if (
+                delta_config.profile_layers_interval is not None
+                and not model_config.enforce_eager
+            ):
+                raise ValueError(
+                    "Profiling Delta layers cannot be captured in CUDA graphs, "
+                    "set --enforce-eager."
+                )
 
         return (
             model_config,
@@ -595,7 +595,8 @@ class AsyncLLMEngine:
         if arrival_time is None:
             arrival_time = time.time()
         if self._enable_prefetch:
-            self.engine.prefetch_delta(delta_request)
+            if delta_request is not None:
+                self.engine.prefetch_delta(delta_request)
         else:
             logger.info("Prefetching is disabled")
 
@@ -776,6 +777,13 @@ class AsyncLLMEngine:
         else:
             return self.engine.get_model_config()
 
+    async def get_load(self) -> Dict[str, object]:
+        """Get the queue depths and cached deltas of the vLLM engine."""
+        if self.engine_use_ray:
+            return await self.engine.get_load.remote()
+        else:
+            return self.engine.get_load()
+
     async def do_log_stats(self) -> None:
         if self.engine_use_ray:
             await self.engine.do_log_stats.remote()
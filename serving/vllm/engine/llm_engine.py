@@ -1,5 +1,5 @@
 import time
-from typing import Iterable, List, Optional, Tuple, Type, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Type, Union
 
 from transformers import PreTrainedTokenizer
 import vllm
@@ -20,11 +20,14 @@ from vllm.executor.executor_base import ExecutorBase
 from vllm.logger import init_logger
 from vllm.lora.request import LoRARequest
 from vllm.delta.config import DeltaConfig
+from vllm.delta.popularity import PredictivePrefetcher, get_popularity_model
 from vllm.delta.request import DeltaRequest
+from vllm.delta.shards import delta_rank_nbytes
 from vllm.outputs import RequestOutput
 from vllm.sampling_params import SamplingParams
 from vllm.sequence import (
     MultiModalData,
+    RequestMetrics,
     SamplerOutput,
     Sequence,
     SequenceGroup,
@@ -149,6 +152,7 @@ class LLMEngine:
         self.scheduler = Scheduler(
             scheduler_config, cache_config, lora_config, delta_config, swap_config
         )
+        self.predictive_prefetcher = self._init_predictive_prefetcher()
 
         # Metric Logging.
         if self.log_stats:
@@ -158,6 +162,38 @@ class LLMEngine:
             )
             self.stat_logger.info("cache_config", self.cache_config)
 
+    def _init_predictive_prefetcher(self) -> Optional[PredictivePrefetcher]:
+        if self.delta_config is None or self.delta_config.predictive_prefetch is None:
+            return None
+        kwargs = {}
+        if self.delta_config.predictive_prefetch == "ewma":
+            kwargs["half_life"] = self.delta_config.popularity_half_life
+        tp_size = self.parallel_config.tensor_parallel_size
+
+        def delta_nbytes(delta_request: DeltaRequest) -> int:
+            try:
+                return delta_rank_nbytes(delta_request.delta_local_path, 0, tp_size)
+            except OSError:
+                # not a local checkpoint, it does not count against the budget
+                return 0
+
+        logger.info(
+            f"Prefetching deltas by {self.delta_config.predictive_prefetch} "
+            f"popularity, budget {self.delta_config.predictive_prefetch_bytes} bytes"
+        )
+        return PredictivePrefetcher(
+            get_popularity_model(self.delta_config.predictive_prefetch, **kwargs),
+            prefetch_fn=self.prefetch_delta,
+            cancel_fn=self.cancel_prefetch,
+            size_fn=delta_nbytes,
+            budget_bytes=self.delta_config.predictive_prefetch_bytes,
+            # leave the slots of the active deltas to requested deltas
+            max_deltas=max(
+                self.delta_config.max_cpu_deltas - self.delta_config.max_deltas, 1
+            ),
+            is_cached_fn=lambda delta_int_id: delta_int_id in self.list_deltas(),
+        )
+
     def reload_model(self, model_name_or_path: str) -> None:
         self.reload_lock = True
         self.model_executor.reload_model(model_name_or_path)
@@ -386,6 +422,8 @@ class LLMEngine:
 
         # Add the sequence group to the scheduler.
         self.scheduler.add_seq_group(seq_group)
+        if self.predictive_prefetcher is not None and delta_request is not None:
+            self.predictive_prefetcher.observe(delta_request, now=arrival_time)
 
     def abort_request(self, request_id: Union[str, Iterable[str]]) -> None:
         """Aborts a request(s) with the given ID.
@@ -418,6 +456,19 @@ class LLMEngine:
         """Returns True if there are unfinished requests."""
         return self.scheduler.has_unfinished_seqs()
 
+    def get_load(self) -> Dict[str, object]:
+        """Gets the queue depths and the deltas in the CPU cache."""
+        return {
+            "num_running": len(self.scheduler.running),
+            "num_waiting": len(self.scheduler.waiting),
+            "num_swapped": len(self.scheduler.swapped),
+            "deltas": (
+                sorted(int(delta_id) for delta_id in self.list_deltas())
+                if self.delta_config
+                else []
+            ),
+        }
+
     def has_running_requests(self) -> bool:
         return self.scheduler.has_running_seqs()
 
@@ -776,6 +827,10 @@ class LLMEngine:
         time_to_first_tokens = []
         time_per_output_tokens = []
         time_e2e_requests = []
+        time_in_queue_requests = []
+        time_cpu_loading_requests = []
+        time_gpu_loading_requests = []
+        time_preempted_requests = []
         if scheduler_outputs is not None:
             prompt_run = scheduler_outputs.prompt_run
 
@@ -801,6 +856,13 @@ class LLMEngine:
                 # Time since arrival for all finished requests.
                 if seq_group.is_finished():
                     time_e2e_requests.append(now - seq_group.metrics.arrival_time)
+                    self._observe_load_phases(
+                        seq_group.metrics,
+                        time_in_queue_requests,
+                        time_cpu_loading_requests,
+                        time_gpu_loading_requests,
+                        time_preempted_requests,
+                    )
 
             time_to_first_tokens = time_last_iters if prompt_run else []
             time_per_output_tokens = [] if prompt_run else time_last_iters
@@ -818,8 +880,47 @@ class LLMEngine:
             time_to_first_tokens=time_to_first_tokens,
             time_per_output_tokens=time_per_output_tokens,
             time_e2e_requests=time_e2e_requests,
+            time_in_queue_requests=time_in_queue_requests,
+            time_cpu_loading_requests=time_cpu_loading_requests,
+            time_gpu_loading_requests=time_gpu_loading_requests,
+            time_preempted_requests=time_preempted_requests,
+            delta_cache=(
+                self.model_executor.collect_delta_stats()
+                if self.delta_config is not None
+                else None
+            ),
+            predictive_prefetch=(
+                self.predictive_prefetcher.stats
+                if self.predictive_prefetcher is not None
+                else None
+            ),
         )
 
+    @staticmethod
+    def _observe_load_phases(
+        metrics: RequestMetrics,
+        time_in_queue: List[float],
+        time_cpu_loading: List[float],
+        time_gpu_loading: List[float],
+        time_preempted: List[float],
+    ) -> None:
+        """Appends the load phases of a finished request."""
+        if metrics.first_scheduled_time is None:
+            return
+        time_in_queue.append(metrics.first_scheduled_time - metrics.arrival_time)
+        # requests of the base model have no loading times
+        start_loading = metrics.start_loading_time or metrics.first_scheduled_time
+        if metrics.cpu_loading_time is not None:
+            time_cpu_loading.append(metrics.cpu_loading_time - start_loading)
+            if metrics.gpu_loading_time is not None:
+                time_gpu_loading.append(
+                    metrics.gpu_loading_time - metrics.cpu_loading_time
+                )
+        for out_time, in_time in zip(
+            metrics.preempty_out_times or [], metrics.preempty_in_times or []
+        ):
+            time_preempted.append(in_time - out_time)
+
     def _check_stop(self, seq: Sequence, sampling_params: SamplingParams) -> None:
         """Stop the finished sequences."""
         # Check if the sequence has reached max_model_len.
@@ -880,8 +981,13 @@ class LLMEngine:
     def add_delta(self, delta_request: DeltaRequest) -> bool:
         return self.model_executor.add_delta(delta_request)
 
-    def prefetch_delta(self, delta_request: DeltaRequest) -> bool:
-        return self.model_executor.prefetch_delta(delta_request)
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
+        return self.model_executor.prefetch_delta(delta_request, priority=priority)
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
+        return self.model_executor.cancel_prefetch(delta_id)
 
     def remove_lora(self, lora_id: int) -> bool:
         return self.model_executor.remove_lora(lora_id)
@@ -1,6 +1,6 @@
 import time
-from dataclasses import dataclass
-from typing import Dict, List
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 
 import numpy as np
 from prometheus_client import (
@@ -12,6 +12,8 @@ from prometheus_client import (
     disable_created_metrics,
 )
 
+from vllm.delta.popularity import PredictivePrefetchStats
+from vllm.delta.stats import DeltaCacheStats
 from vllm.logger import init_logger
 
 logger = init_logger(__name__)
@@ -22,6 +24,64 @@ disable_created_metrics()
 # to extract the metrics definitions.
 
 
+DELTA_LOAD_BUCKETS = [
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+]
+
+# DeltaCacheStats counter -> (metric name, documentation)
+DELTA_CACHE_COUNTERS = {
+    "gpu_hits": (
+        "vllm:delta_gpu_hits_total",
+        "Number of delta activations that found the delta in a GPU slot.",
+    ),
+    "gpu_misses": (
+        "vllm:delta_gpu_misses_total",
+        "Number of delta activations that copied the delta into a GPU slot.",
+    ),
+    "gpu_evictions": (
+        "vllm:delta_gpu_evictions_total",
+        "Number of deltas evicted from a GPU slot.",
+    ),
+    "cpu_hits": (
+        "vllm:delta_cpu_hits_total",
+        "Number of delta requests that found the delta in the CPU cache.",
+    ),
+    "cpu_misses": (
+        "vllm:delta_cpu_misses_total",
+        "Number of delta requests whose delta was not in the CPU cache.",
+    ),
+    "cpu_evictions": (
+        "vllm:delta_cpu_evictions_total",
+        "Number of deltas evicted from the CPU cache.",
+    ),
+    "prefetch_hits": (
+        "vllm:delta_prefetch_hits_total",
+        "Number of delta requests served by a prefetched delta.",
+    ),
+    "prefetch_discards": (
+        "vllm:delta_prefetch_discards_total",
+        "Number of prefetched deltas discarded before they were cached.",
+    ),
+    "bytes_loaded": (
+        "vllm:delta_loaded_bytes_total",
+        "Bytes of deltas loaded into the CPU cache.",
+    ),
+}
+
+
 # begin-metrics-definitions
 class Metrics:
 
@@ -129,6 +189,81 @@ class Metrics:
             buckets=[1.0, 2.5, 5.0, 10.0, 15.0, 20.0, 30.0, 40.0, 50.0, 60.0],
         )
 
+        # Delta load phases
+        self.histogram_queue_time = Histogram(
+            name="vllm:request_queue_time_seconds",
+            documentation="Histogram of time from arrival to first scheduling "
+            "in seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+        self.histogram_delta_cpu_load_time = Histogram(
+            name="vllm:delta_cpu_load_seconds",
+            documentation="Histogram of time a request waited for its delta "
+            "to reach the CPU cache in seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+        self.histogram_delta_gpu_load_time = Histogram(
+            name="vllm:delta_gpu_load_seconds",
+            documentation="Histogram of time a request waited for its delta "
+            "to reach a GPU slot in seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+        self.histogram_preemption_time = Histogram(
+            name="vllm:request_preemption_seconds",
+            documentation="Histogram of time requests spent preempted in "
+            "seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+        self.histogram_delta_disk_load_time = Histogram(
+            name="vllm:delta_disk_load_seconds",
+            documentation="Histogram of time to read a delta into the CPU "
+            "cache in seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+        self.histogram_delta_activation_time = Histogram(
+            name="vllm:delta_activation_seconds",
+            documentation="Histogram of time to copy a delta into a GPU slot "
+            "in seconds.",
+            labelnames=labelnames,
+            buckets=DELTA_LOAD_BUCKETS,
+        )
+
+        # Delta caches
+        self.counters_delta_cache = {
+            field: Counter(name=name, documentation=doc, labelnames=labelnames)
+            for field, (name, doc) in DELTA_CACHE_COUNTERS.items()
+        }
+
+        # Predictive delta prefetching
+        self.gauge_delta_prefetch_hit_rate = Gauge(
+            name="vllm:delta_predictive_prefetch_hit_rate",
+            documentation="Fraction of settled predictive delta prefetches "
+            "that were requested before they were given up.",
+            labelnames=labelnames,
+        )
+        self.gauge_delta_prefetch_coverage = Gauge(
+            name="vllm:delta_predictive_prefetch_coverage",
+            documentation="Fraction of delta requests whose delta was "
+            "predictively prefetched.",
+            labelnames=labelnames,
+        )
+        self.gauge_delta_prefetch_bytes = Gauge(
+            name="vllm:delta_predictive_prefetch_bytes",
+            documentation="Bytes of deltas prefetched by prediction.",
+            labelnames=labelnames,
+        )
+        self.gauge_delta_prefetch_wasted_bytes = Gauge(
+            name="vllm:delta_predictive_prefetch_wasted_bytes",
+            documentation="Bytes of predictively prefetched deltas that were "
+            "given up without being requested.",
+            labelnames=labelnames,
+        )
+
         # Legacy metrics
         self.gauge_avg_prompt_throughput = Gauge(
             name="vllm:avg_prompt_throughput_toks_per_s",
@@ -166,6 +301,18 @@ class Stats:
     time_per_output_tokens: List[float]
     time_e2e_requests: List[float]
 
+    # Load phases of finished requests.
+    time_in_queue_requests: List[float] = field(default_factory=list)
+    time_cpu_loading_requests: List[float] = field(default_factory=list)
+    time_gpu_loading_requests: List[float] = field(default_factory=list)
+    time_preempted_requests: List[float] = field(default_factory=list)
+
+    # Delta cache counters of the driver worker, if deltas are enabled.
+    delta_cache: Optional[DeltaCacheStats] = None
+
+    # Cumulative predictive prefetching stats, if enabled.
+    predictive_prefetch: Optional[PredictivePrefetchStats] = None
+
 
 class StatLogger:
     """StatLogger is used LLMEngine to log to Promethus and Stdout."""
@@ -183,6 +330,9 @@ class StatLogger:
         self.labels = labels
         self.metrics = Metrics(labelnames=list(labels.keys()))
 
+        # Delta cache counters are cumulative, the last values exported.
+        self.last_delta_cache = DeltaCacheStats()
+
     def info(self, type: str, obj: object) -> None:
         if type == "cache_config":
             self.metrics.info_cache_config.info(obj.metrics_info())
@@ -234,6 +384,57 @@ class StatLogger:
                 e2e
             )
 
+        # Observe load phases of finished requests.
+        for histogram, times in [
+            (self.metrics.histogram_queue_time, stats.time_in_queue_requests),
+            (
+                self.metrics.histogram_delta_cpu_load_time,
+                stats.time_cpu_loading_requests,
+            ),
+            (
+                self.metrics.histogram_delta_gpu_load_time,
+                stats.time_gpu_loading_requests,
+            ),
+            (self.metrics.histogram_preemption_time, stats.time_preempted_requests),
+        ]:
+            for t in times:
+                histogram.labels(**self.labels).observe(t)
+
+        if stats.delta_cache is not None:
+            self._log_delta_cache(stats.delta_cache)
+
+        if stats.predictive_prefetch is not None:
+            prefetch = stats.predictive_prefetch
+            self.metrics.gauge_delta_prefetch_hit_rate.labels(**self.labels).set(
+                prefetch.hit_rate
+            )
+            self.metrics.gauge_delta_prefetch_coverage.labels(**self.labels).set(
+                prefetch.coverage
+            )
+            self.metrics.gauge_delta_prefetch_bytes.labels(**self.labels).set(
+                prefetch.bytes_prefetched
+            )
+            self.metrics.gauge_delta_prefetch_wasted_bytes.labels(**self.labels).set(
+                prefetch.wasted_bytes
+            )
+
+    def _log_delta_cache(self, delta_cache: DeltaCacheStats) -> None:
+        for t in delta_cache.disk_load_times:
+            self.metrics.histogram_delta_disk_load_time.labels(**self.labels).observe(
+                t
+            )
+        for t in delta_cache.activation_times:
+            self.metrics.histogram_delta_activation_time.labels(
+                **self.labels
+            ).observe(t)
+        for name, counter in self.metrics.counters_delta_cache.items():
+            increase = getattr(delta_cache, name) - getattr(
+                self.last_delta_cache, name
+            )
+            if increase > 0:
+                counter.labels(**self.labels).inc(increase)
+        self.last_delta_cache = delta_cache
+
     def _log_prometheus_interval(
         self, prompt_throughput: float, generation_throughput: float
     ) -> None:
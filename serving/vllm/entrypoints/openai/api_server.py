@@ -103,6 +103,20 @@ async def get_sysinfo():
     engine_info.update({"pid": os.getpid()})
     return JSONResponse(content=engine_info)
 
+@app.get("/load")
+async def get_load():
+    """Queue depths and cached deltas, polled by the controller for routing."""
+    load = await engine.get_load()
+    delta_names = {
+        delta.delta_int_id: delta.delta_name
+        for delta in openai_serving_completion.delta_requests
+    }
+    load["deltas"] = [
+        delta_names[delta_id] for delta_id in load["deltas"] if delta_id in delta_names
+    ]
+    return JSONResponse(content=load)
+
+
 @app.get("/kill")
 async def kill():
     os.kill(os.getpid(), signal.SIGTERM)
@@ -396,6 +396,8 @@ class CompletionStreamResponse(BaseModel):
     model: str
     choices: List[CompletionResponseStreamChoice]
     usage: Optional[UsageInfo] = Field(default=None)
+    # only set on the final chunk of a request
+    metrics: Optional[List[RequestMetrics]] = Field(default=None)
 
 
 class ChatMessage(BaseModel):
@@ -311,7 +311,7 @@ class OpenAIServingCompletion(OpenAIServing):
                         )
                     else:
                         final_usage = None
-                    response_json = CompletionStreamResponse(
+                    response = CompletionStreamResponse(
                         id=request_id,
                         created=created_time,
                         model=model_name,
@@ -325,7 +325,10 @@ class OpenAIServingCompletion(OpenAIServing):
                             )
                         ],
                         usage=final_usage,
-                    ).model_dump_json(exclude_unset=True)
+                    )
+                    if res.finished:
+                        response.metrics = [res.metrics]
+                    response_json = response.model_dump_json(exclude_unset=True)
                     yield f"data: {response_json}\n\n"
         except ValueError as e:
             # TODO: Use a vllm-specific Validation Error
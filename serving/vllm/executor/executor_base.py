@@ -12,6 +12,7 @@ from vllm.config import (
 )
 from vllm.lora.request import LoRARequest
 from vllm.delta.request import DeltaRequest
+from vllm.delta.stats import DeltaCacheStats
 from vllm.sequence import SamplerOutput, SequenceGroupMetadata, SequenceGroup
 
 
@@ -72,6 +73,11 @@ class ExecutorBase(ABC):
     def list_deltas(self) -> List[int]:
         raise NotImplementedError
 
+    def collect_delta_stats(self) -> Optional[DeltaCacheStats]:
+        """Returns the delta cache counters of the driver worker, None if
+        the executor does not serve deltas."""
+        return None
+
     @abstractmethod
     def check_health(self) -> None:
         """Checks if the executor is healthy. If not, it should raise an
@@ -17,6 +17,7 @@ from vllm.sequence import SamplerOutput, SequenceGroupMetadata, SequenceGroup
 from vllm.utils import get_distributed_init_method, get_ip, get_open_port, make_async
 from vllm.delta.config import DeltaConfig
 from vllm.delta.request import DeltaRequest
+from vllm.delta.stats import DeltaCacheStats
 from vllm.swap.config import SwapConfig
 from vllm.swap.request import SwapRequest
 
@@ -163,6 +164,9 @@ class GPUExecutor(ExecutorBase):
     def list_deltas(self) -> List[int]:
         return self.driver_worker.list_deltas()
 
+    def collect_delta_stats(self) -> Optional[DeltaCacheStats]:
+        return self.driver_worker.collect_delta_stats()
+
     def add_swap(self, swap_request: SwapRequest) -> bool:
         assert swap_request.swap_int_id > 0, "swap_id must be greater than 0."
         return self.driver_worker.add_swap(swap_request)
@@ -179,9 +183,15 @@ class GPUExecutor(ExecutorBase):
         # it's running.
         return
 
-    def prefetch_deltas(self, delta_request: DeltaRequest) -> bool:
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
         assert delta_request.delta_int_id > 0, "delta_id must be greater than 0."
-        return self.driver_worker.prefetch_deltas(delta_request)
+        return self.driver_worker.prefetch_delta(delta_request, priority=priority)
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
+        assert delta_id > 0, "delta_id must be greater than 0."
+        return self.driver_worker.cancel_prefetch(delta_id)
 
 
 class GPUExecutorAsync(GPUExecutor, ExecutorAsyncBase):
@@ -29,6 +29,7 @@ from vllm.utils import (
 )
 from vllm.delta.config import DeltaConfig
 from vllm.delta.request import DeltaRequest
+from vllm.delta.stats import DeltaCacheStats
 from vllm.swap.request import SwapRequest
 from vllm.swap.config import SwapConfig
 
@@ -347,15 +348,34 @@ class RayGPUExecutor(ExecutorBase):
         )
 
     def list_deltas(self) -> List[int]:
-        return self._run_workers("list_deltas")
+        # every worker holds its own shard, a delta is only usable once all of
+        # them have it
+        return sorted(set.intersection(*map(set, self._run_workers("list_deltas"))))
 
-    def prefetch_delta(self, delta_request: DeltaRequest) -> bool:
+    def collect_delta_stats(self) -> Optional[DeltaCacheStats]:
+        # every worker loads the same deltas, the driver's counts stand for all
+        return self.driver_worker.collect_delta_stats()
+
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
         if delta_request is not None:
             assert delta_request.delta_int_id > 0, "delta_id must be greater than 0."
-            return self._run_workers(
-                "prefetch_delta",
-                delta_request=delta_request,
+            # every worker loads its own shard, a load is queued if any worker
+            # queued one
+            return any(
+                self._run_workers(
+                    "prefetch_delta",
+                    delta_request=delta_request,
+                    priority=priority,
+                )
             )
+        return False
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
+        assert delta_id > 0, "delta_id must be greater than 0."
+        # nothing was read only if no worker had started loading its shard
+        return all(self._run_workers("cancel_prefetch", delta_id=delta_id))
 
     def add_swap(self, swap_request: SwapRequest) -> bool:
         assert swap_request.delta_int_id > 0, "delta_id must be greater than 0."
@@ -30,90 +30,12 @@ from vllm.model_executor.model_loader import (
     _set_default_torch_dtype,
 )
 from .utils import replace_submodule
+from vllm.delta.mapping import SlotTable, convert_mapping
 
 logger = init_logger(__name__)
 _GLOBAL_MODEL_ID = 0
 
 
-def convert_mapping(
-    mapping: ModelMapping,
-    model_index_to_id: List[Optional[int]],
-    max_models: int,
-    vocab_size: int,
-    extra_vocab_size: int,
-) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor, List[int]]:
-    """Converts ModelMapping to index tensors.
-
-    Args:
-        mapping: ModelMapping mapping rows in a batch to model ids.
-        delta_index_to_id: List mapping Delta ids to Delta indices.
-        max_deltas: Maximum number of Deltas.
-        vocab_size: Model vocab size.
-        extra_vocab_size: Extra vocab size each Delta can have.
-
-    Returns:
-        A tuple of tensors:
-            base_indices: Tensor of shape [batch_size] mapping batch rows to
-                Delta indices.
-            sampler_indices: Tensor of shape [batch_size] mapping requests to
-                Delta indices for sampler. For generation, this will be the
-                same as base_indicies. For prefill, this will map requests
-                to Delta indices.
-            sampler_indices_padded: Tensor of shape [batch_size] mapping
-                requests to Delta indices for sampler with padding.
-                Same as sampler_indicies, but -1 is replaced with
-                max_deltas.
-            embeddings_indices: Tensor of shape [2, batch_size] mapping
-                requests to embedding indices. First row is for embeddings
-                added by the Deltas, second row is for the Delta.emb
-                embeddings.
-            indices_len: List of lengths of the above tensors.
-    """
-    indices = list(mapping.index_mapping).copy()
-    embedding_indices = indices.copy()
-    model_indices = indices.copy()
-    prompt_mapping = [
-        model_index_to_id.index(x) if x > 0 else -1 for x in mapping.prompt_mapping
-    ]
-    swap_idx = None
-    for i in range(len(indices)):
-        # TODO index can be slow. optimize
-        swap_idx = model_index_to_id.index(indices[i]) if indices[i] > 0 else -1
-        embedding_indices[i] = swap_idx if indices[i] > 0 else 0
-        indices[i] = i
-        model_indices[i] = swap_idx
-
-    indices = torch.tensor(
-        [indices, model_indices, embedding_indices], dtype=torch.long, device="cuda"
-    )
-    prompt_mapping = torch.tensor(prompt_mapping, device="cuda", dtype=torch.long)
-    embeddings_indices = torch.stack(
-        [indices[2] * extra_vocab_size, indices[2] * (vocab_size + extra_vocab_size)]
-    )
-    embeddings_indices[embeddings_indices == -1] = max_models - 1
-    base_indices = indices[1]
-    sampler_indices = prompt_mapping
-    sampler_indices_padded = sampler_indices.clone()
-    sampler_indices_padded[sampler_indices_padded == -1] = max_models - 1
-    sampler_indices_padded = torch.arange(
-        0, len(sampler_indices_padded), device="cuda", dtype=torch.long
-    ) + (sampler_indices_padded * len(sampler_indices_padded))
-
-    indices_len = (
-        base_indices.shape[-1],
-        sampler_indices.shape[-1],
-        sampler_indices_padded.shape[-1],
-        embeddings_indices.shape[-1],
-    )
-
-    return (
-        base_indices,
-        sampler_indices,
-        sampler_indices_padded,
-        embeddings_indices,
-        indices_len,
-    )
-
 
 def get_model_id():
     global _GLOBAL_MODEL_ID
@@ -184,7 +106,7 @@ class SwapModelManager:
             self.capacity >= self.packed_swap_slots
         ), "Capacity must be greater than packed swap slots"
         self.max_num_batched_tokens = math.ceil(max_num_batched_tokens / 8) * 8
-        self.swap_index_to_id: List[Optional[int]] = [None] * self.packed_swap_slots
+        self.swap_index_to_id = SlotTable(self.packed_swap_slots)
         self.vocab_size = vocab_size
         self.base_indices = torch.empty(
             self.max_num_batched_tokens, dtype=torch.long, device="cuda"
@@ -293,7 +215,6 @@ class SwapModelManager:
         self.deactivate_swap(swap_id)
         return bool(self._registered_swaps.pop(swap_id, None))
 
-    # TODO see if this can be vectorized
     def _set_swap_mapping(self, mapping: ModelMapping) -> None:
         (
             base_indices,
@@ -320,9 +241,11 @@ class SwapModelManager:
         self.indices_len[:] = indices_len
 
     def set_swap_mapping(self, swap_mapping: ModelMapping) -> None:
-        if self._last_mapping != swap_mapping:
+        # the indices also depend on which slot each swap occupies
+        mapping_key = (swap_mapping, self.swap_index_to_id.version)
+        if self._last_mapping != mapping_key:
             self._set_swap_mapping(swap_mapping)
-        self._last_mapping = swap_mapping
+        self._last_mapping = mapping_key
 
     def list_swaps(self) -> Dict[int, SwapModel]:
         """List all registered SwapModels."""
@@ -334,7 +257,7 @@ class SwapModelManager:
     def remove_all_swaps(self) -> bool:
         """Remove all SwapModels from the manager."""
         self._registered_swaps.clear()
-        self.swap_index_to_id = [None] * self.packed_swap_slots
+        self.swap_index_to_id.reset()
         self._active_swaps.clear()
 
     def _create_swap_modules(self):
@@ -0,0 +1,33 @@
+from vllm.delta.shards import convert_to_rank_shards
+
+
+def main(args):
+    manifest = convert_to_rank_shards(
+        args.input, output=args.output, remove_source=args.remove_source
+    )
+    output = args.output or args.input
+    print(f"Sharding finished, wrote {manifest['tp_size']} rank files to {output}")
+    for rank, filename in manifest["shards"].items():
+        print(f"  rank {rank}: {filename} ({manifest['bytes'][rank]/1024/1024:.2f} MiB)")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Split deltazip-compressed.safetensors into per-rank shards"
+    )
+    parser.add_argument("--input", type=str, help="Delta checkpoint directory")
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Output directory, defaults to converting in place",
+    )
+    parser.add_argument(
+        "--remove-source",
+        action="store_true",
+        help="Remove the monolithic file after an in-place conversion",
+    )
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,161 @@
+"""
+Replays a workload against the scheduler and delta caches on a simulated
+clock, without GPUs, and writes results in the format of bench.py.
+
+Example:
+python -m vllm.tools.simulate --workload ../scripts/workload/azure.ar=0.5.jsonl --enable-delta --max-deltas 4 --max-cpu-deltas 8 --scheduler-policy delta-affinity --cost-model cost.json --output .artifact/benchmarks/simulated
+"""
+import os
+import re
+import json
+import uuid
+import argparse
+
+from vllm.config import CacheConfig, SchedulerConfig
+from vllm.core.simulator import LinearCostModel, Simulator
+from vllm.delta.config import DeltaConfig
+from vllm.engine.arg_utils import EngineArgs
+
+DEFAULT_MAX_MODEL_LEN = 4096
+
+
+def _natural_key(name: str):
+    return [int(x) if x.isdigit() else x for x in re.split(r"(\d+)", name)]
+
+
+def load_requests(path: str, base_model: str, tokenizer=None):
+    with open(path, "r") as f:
+        workload = [json.loads(line) for line in f]
+    requests = []
+    for i, job in enumerate(workload):
+        if "prompt_len" in job:
+            prompt_len = job["prompt_len"]
+        elif tokenizer is not None:
+            prompt_len = len(tokenizer.encode(job["prompt"]))
+        else:
+            # roughly one token per word
+            prompt_len = len(job["prompt"].split())
+        requests.append(
+            {
+                "request_id": str(job.get("id", i)),
+                "model": base_model if job["model"] == "base-model" else job["model"],
+                "prompt_len": prompt_len,
+                "max_tokens": job["max_tokens"],
+                "min_tokens": job.get("min_tokens", 0),
+                "arrival_time": job["timestamp"],
+            }
+        )
+    return requests
+
+
+def main(args):
+    engine_args = EngineArgs.from_cli_args(args)
+    tokenizer = None
+    if args.count_tokens:
+        from transformers import AutoTokenizer
+
+        tokenizer = AutoTokenizer.from_pretrained(engine_args.tokenizer)
+    requests = load_requests(args.workload, engine_args.model, tokenizer)
+    delta_names = sorted(
+        {r["model"] for r in requests if r["model"] != engine_args.model},
+        key=_natural_key,
+    )
+
+    max_model_len = engine_args.max_model_len or DEFAULT_MAX_MODEL_LEN
+    scheduler_config = SchedulerConfig(
+        engine_args.max_num_batched_tokens,
+        engine_args.max_num_seqs,
+        max_model_len,
+        engine_args.scheduler_delay_factor,
+        engine_args.scheduler_policy,
+        engine_args.scheduler_max_wait,
+    )
+    cache_config = CacheConfig(
+        engine_args.block_size,
+        engine_args.gpu_memory_utilization,
+        engine_args.swap_space,
+        engine_args.kv_cache_dtype,
+    )
+    cache_config.num_gpu_blocks = args.num_gpu_blocks
+    cache_config.num_cpu_blocks = args.num_cpu_blocks
+    delta_config = (
+        DeltaConfig(
+            max_deltas=engine_args.max_deltas,
+            max_cpu_deltas=engine_args.max_cpu_deltas,
+        )
+        if engine_args.enable_delta
+        else None
+    )
+    cost_model = (
+        LinearCostModel.from_json(args.cost_model)
+        if args.cost_model
+        else LinearCostModel()
+    )
+    simulator = Simulator(
+        scheduler_config,
+        cache_config,
+        delta_config,
+        cost_model,
+        delta_names,
+        base_model=engine_args.model,
+        enable_prefetch=engine_args.enable_prefetch,
+    )
+    simulator.run(requests)
+
+    # the same metadata as a live run, so that results aggregate alike
+    sys_info = engine_args.to_json()
+    sys_info.update(
+        {
+            "swap_modules": [],
+            "lora_modules": [],
+            "delta_modules": [
+                {"name": name, "local_path": name} for name in delta_names
+            ],
+            "pid": None,
+        }
+    )
+    workload_annotation = args.workload.split("/")[-1].split(".")[0]
+    meta = {
+        "workload": args.workload,
+        "endpoints": [],
+        "warmup_strategy": "none",
+        "annotations": f"{workload_annotation},tp_degree="
+        f"{engine_args.tensor_parallel_size},rp_degree=1",
+        "sys_info": sys_info,
+        "simulated": True,
+        "cost_model": vars(cost_model),
+        "delta_cache": simulator.deltas.stats,
+    }
+    os.makedirs(args.output, exist_ok=True)
+    output_file = os.path.join(args.output, f"{uuid.uuid4()}.jsonl")
+    with open(output_file, "w") as f:
+        f.write(json.dumps(meta))
+        f.write("\n")
+        for result in simulator.get_results():
+            f.write(json.dumps(result))
+            f.write("\n")
+    print(f"Results written to {output_file}", flush=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Simulate serving a workload without GPUs"
+    )
+    parser = EngineArgs.add_cli_args(parser)
+    parser.add_argument("--workload", type=str, required=True)
+    parser.add_argument("--output", type=str, default="outputs/")
+    parser.add_argument(
+        "--cost-model",
+        type=str,
+        default=None,
+        help="json file with LinearCostModel coefficients",
+    )
+    parser.add_argument("--num-gpu-blocks", type=int, default=2048)
+    parser.add_argument("--num-cpu-blocks", type=int, default=512)
+    parser.add_argument(
+        "--count-tokens",
+        action="store_true",
+        help="Count prompt tokens with the tokenizer instead of by words",
+    )
+    args = parser.parse_args()
+    main(args)
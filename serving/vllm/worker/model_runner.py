@@ -24,6 +24,8 @@ from vllm.lora.worker_manager import LRUCacheWorkerLoRAManager
 from vllm.delta.config import DeltaConfig
 from vllm.delta.layers_marlin import DeltaMapping
 from vllm.delta.request import DeltaRequest
+from vllm.delta.profiler import DeltaLayerProfiler
+from vllm.delta.stats import DeltaCacheStats
 from vllm.delta.worker_manager import OverlapLRUCacheWorkerDeltaManager
 
 from vllm.swap.request import SwapRequest
@@ -112,6 +114,7 @@ class ModelRunner:
         self.block_size = None  # Set after initial profiling.
         self.lora_manager = None
         self.delta_manager = None
+        self.layer_profiler: Optional[DeltaLayerProfiler] = None
         self.swap_manager = None
         self.graph_runners: Dict[int, CUDAGraphRunner] = {}
         self.graph_memory_pool = None  # Set during graph capture.
@@ -208,6 +211,15 @@ class ModelRunner:
                 self.model.embedding_padding_modules,
             )
             self.model = self.delta_manager.create_delta_manager(self.model)
+            if self.delta_config.profile_layers_interval is not None:
+                self.layer_profiler = DeltaLayerProfiler(
+                    self.delta_config.profile_layers_interval,
+                    self.delta_config.profile_layers_output,
+                )
+                num_wrapped = self.layer_profiler.wrap(
+                    self.model.delta_manager.modules
+                )
+                logger.info(f"Profiling {num_wrapped} Delta layers")
 
         if self.swap_config:
             assert (
@@ -913,9 +925,6 @@ class ModelRunner:
             multi_modal_input,
         )
 
-    def prefetch_delta(self, delta_request: DeltaRequest):
-        self.delta_manager.prefetch_delta(delta_request)
-
     @torch.inference_mode()
     def execute_model(
         self,
@@ -941,6 +950,10 @@ class ModelRunner:
             self.set_active_loras(lora_requests, lora_mapping)
         if self.delta_config:
             self.set_active_deltas(delta_requests, delta_mapping, sequence_groups)
+        if self.layer_profiler is not None:
+            self.layer_profiler.set_num_deltas(
+                len({r.delta_int_id for r in delta_requests})
+            )
         if self.swap_config:
             self.set_active_swaps(swap_requests, swap_mapping, sequence_groups)
 
@@ -948,6 +961,9 @@ class ModelRunner:
         if attn_metadata.use_cuda_graph:
             graph_batch_size = input_tokens.shape[0]
             model_executable = self.graph_runners[graph_batch_size]
+            if self.delta_config:
+                # graph replay skips the per-layer waits of pipelined copies
+                self.delta_manager.wait_delta_copies()
         else:
             model_executable = self.model
         execute_model_kwargs = {
@@ -962,6 +978,8 @@ class ModelRunner:
 
         # Compute the logits.
         logits = self.model.compute_logits(hidden_states, sampling_metadata)
+        if self.layer_profiler is not None:
+            self.layer_profiler.step()
 
         # Only perform sampling in the driver worker.
         if not sampling_metadata.perform_sampling:
@@ -1056,6 +1074,8 @@ class ModelRunner:
             torch.cuda.empty_cache()
         self.execute_model(seqs, kv_caches)
         torch.cuda.synchronize()
+        if self.layer_profiler is not None:
+            self.layer_profiler.reset()
         return
 
     def remove_all_loras(self) -> bool:
@@ -1126,10 +1146,17 @@ class ModelRunner:
             raise RuntimeError("Swap is not enabled.")
         return self.swap_manager.add_swap(swap_request)
 
-    def prefetch_delta(self, delta_request: DeltaRequest, destination="cpu") -> None:
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
+        if not self.delta_manager:
+            raise RuntimeError("Delta is not enabled.")
+        return self.delta_manager.prefetch_delta(delta_request, priority=priority)
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
         if not self.delta_manager:
             raise RuntimeError("Delta is not enabled.")
-        self.delta_manager.prefetch_delta(delta_request)
+        return self.delta_manager.cancel_prefetch(delta_id)
 
     def remove_lora(self, lora_id: int) -> bool:
         if not self.lora_manager:
@@ -1156,6 +1183,11 @@ class ModelRunner:
             raise RuntimeError("Delta is not enabled.")
         return self.delta_manager.list_deltas()
 
+    def collect_delta_stats(self) -> Optional[DeltaCacheStats]:
+        if not self.delta_manager:
+            return None
+        return self.delta_manager.collect_stats()
+
     def list_swaps(self) -> Set[int]:
         if not self.swap_manager:
             raise RuntimeError("Swap is not enabled.")
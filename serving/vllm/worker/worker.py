@@ -29,6 +29,7 @@ from vllm.worker.cache_engine import CacheEngine
 from vllm.worker.model_runner import ModelRunner
 from vllm.delta.config import DeltaConfig
 from vllm.delta.request import DeltaRequest
+from vllm.delta.stats import DeltaCacheStats
 from vllm.swap.config import SwapConfig
 from vllm.logger import logging
 
@@ -276,11 +277,19 @@ class Worker:
     def list_deltas(self) -> Set[int]:
         return self.model_runner.list_deltas()
 
+    def collect_delta_stats(self) -> Optional[DeltaCacheStats]:
+        return self.model_runner.collect_delta_stats()
+
     def list_loaded_deltas(self):
         return self.model_runner.list_loaded_deltas()
 
-    def prefetch_delta(self, delta_request: DeltaRequest):
-        return self.model_runner.prefetch_delta(delta_request)
+    def prefetch_delta(
+        self, delta_request: DeltaRequest, priority: Optional[float] = None
+    ) -> bool:
+        return self.model_runner.prefetch_delta(delta_request, priority=priority)
+
+    def cancel_prefetch(self, delta_id: int) -> bool:
+        return self.model_runner.cancel_prefetch(delta_id)
 
     @property
     def max_model_len(self) -> int: